@@ -0,0 +1,7 @@
+"""Benchmarks of pyspline.
+
+The modules `bench_*.py` follow the conventions of `asv` (airspeed velocity),
+see `asv.conf.json`. They can also be run offline, without `asv`, with
+`python -m benchmarks run`, see :mod:`benchmarks.runner`.
+
+"""
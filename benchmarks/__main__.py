@@ -0,0 +1,7 @@
+"""Run the benchmarks offline, see :mod:`benchmarks.runner`."""
+
+import sys
+
+from .runner import main
+
+sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Benchmarks of the array arithmetic
+----------------------------------
+
+The classes follow the conventions of `asv` (airspeed velocity). The file can
+also be run as a script to print the timings of the chained
+`rotated_h_transform` calls and of `glam_contract` on 2D, 3D and 4D grids.
+Note that the chained calls return a non-contiguous view, while
+`glam_contract` returns a C-contiguous array.
+
+"""
+
+import timeit
+
+import numpy as np
+
+from pyspline.arrays import (
+    GlamContraction,
+    glam_contract,
+    rotated_h_transform,
+)
+from pyspline.basis import basis_bsplines
+
+# Number of grid points and of basis functions for each dimension.
+GRIDS = {
+    2: ((500, 500), (43, 43)),
+    3: ((100, 100, 100), (23, 23, 23)),
+    4: ((30, 30, 30, 30), (13, 13, 13, 13)),
+}
+
+
+def _make_problem(dimension):
+    """Create the bases and the coefficients of a model on a grid."""
+    n_points, n_functions = GRIDS[dimension]
+    rng = np.random.default_rng(42)
+    basis_list = [
+        basis_bsplines(np.linspace(0, 1, n), m, 3)
+        for n, m in zip(n_points, n_functions)
+    ]
+    beta = rng.normal(size=n_functions)
+    data = rng.normal(size=n_points)
+    return basis_list, beta, data
+
+
+def _chained(matrices, tensor):
+    """Apply the matrices with a loop of rotated H-transforms."""
+    for mat in matrices:
+        tensor = rotated_h_transform(mat, tensor)
+    return tensor
+
+
+class GlamContract:
+    """Compare the chained H-transforms and the fused contraction."""
+
+    params = ([2, 3, 4], ["chained", "matmul", "einsum", "plan"])
+    param_names = ["dimension", "method"]
+
+    def setup(self, dimension, method):
+        self.basis_list, self.beta, self.data = _make_problem(dimension)
+        self.basis_t = [basis.T for basis in self.basis_list]
+        # The plans are created once and reused, as in an iterative solver.
+        self.plans = {
+            "predict": GlamContraction(self.basis_t, self.beta.shape),
+            "cross_product": GlamContraction(self.basis_list, self.data.shape),
+        }
+
+    def _contract(self, matrices, tensor, method, name):
+        if method == "chained":
+            return _chained(matrices, tensor)
+        if method == "plan":
+            return self.plans[name](tensor)
+        return glam_contract(matrices, tensor, method=method)
+
+    def time_predict(self, dimension, method):
+        """Evaluate the fitted surface, `B beta`."""
+        self._contract(self.basis_t, self.beta, method, "predict")
+
+    def time_cross_product(self, dimension, method):
+        """Compute the right-hand side of the normal equations, `B'y`."""
+        self._contract(self.basis_list, self.data, method, "cross_product")
+
+
+if __name__ == "__main__":
+    for dimension in GRIDS:
+        bench = GlamContract()
+        timings = {}
+        for method in GlamContract.params[1]:
+            bench.setup(dimension, method)
+            timings[method] = min(
+                timeit.repeat(
+                    lambda bench=bench, dimension=dimension, method=method: (
+                        bench.time_predict(dimension, method),
+                        bench.time_cross_product(dimension, method),
+                    ),
+                    number=5,
+                    repeat=5,
+                )
+            ) / 5
+        print(
+            f"{dimension}D: "
+            + ", ".join(
+                f"{method} {1000 * timing:.2f} ms "
+                f"(x{timings['chained'] / timing:.2f})"
+                for method, timing in timings.items()
+            )
+        )
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Benchmarks of the B-splines bases
+---------------------------------
+
+The classes follow the conventions of `asv` (airspeed velocity). The dense
+basis has `n_obs * n_functions` entries, while the sparse and compact bases
+have `n_obs * (degree + 1)` values whatever the number of functions.
+
+"""
+
+import numpy as np
+
+from pyspline.basis import basis_bsplines, tensor_product_dot
+
+from .common import N_FUNCTIONS, N_OBS, scattered, skip_if_too_large
+
+DEGREE = 3
+
+
+class BasisBsplines:
+    """Evaluation of a basis at scattered points."""
+
+    params = (N_OBS, N_FUNCTIONS, ["dense", "csr", "compact"])
+    param_names = ["n_obs", "n_functions", "format"]
+
+    def setup(self, n_obs, n_functions, format):
+        if format == "dense":
+            skip_if_too_large(8 * n_obs * n_functions)
+        else:
+            # The values, their indices and the temporaries of the recursion.
+            skip_if_too_large(4 * 8 * n_obs * (DEGREE + 1))
+        self.x = np.random.default_rng(42).uniform(0, 1, n_obs)
+
+    def time_basis_bsplines(self, n_obs, n_functions, format):
+        """Evaluate the basis."""
+        basis_bsplines(self.x, n_functions, DEGREE, 0, 1, format=format)
+
+
+class TensorProductDot:
+    """Evaluation of a tensor product spline at scattered points."""
+
+    params = (N_OBS, [1, 2, 3, 4])
+    param_names = ["n_obs", "dimension"]
+
+    def setup(self, n_obs, dimension):
+        n_values = (DEGREE + 1) ** dimension
+        skip_if_too_large(2 * 8 * min(n_obs, 8192) * n_values + 48 * n_obs)
+        X, _ = scattered(n_obs, dimension)
+        self.bases = [
+            basis_bsplines(column, 10, DEGREE, 0, 1, format="compact")
+            for column in X.T
+        ]
+        self.beta = np.random.default_rng(42).normal(size=(10,) * dimension)
+
+    def time_tensor_product_dot(self, n_obs, dimension):
+        """Evaluate the spline at each point."""
+        tensor_product_dot(self.bases, self.beta)
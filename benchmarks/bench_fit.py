@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Benchmarks of the fits
+----------------------
+
+The classes follow the conventions of `asv` (airspeed velocity). The
+one-dimensional fits use a compact basis, whose cross-products cost
+`O(n_obs * (degree + 1)**2)`, and the solvers cost `O(m * bandwidth**2)` for
+the banded solver and `O(m**3)` for the dense solver. The multi-dimensional
+fits are on complete grids of about `n_obs` points, except the scattered
+fits, whose system is banded with a bandwidth of `O(m**(1 - 1 / dimension))`.
+
+"""
+
+import numpy as np
+
+from pyspline.basis import basis_bsplines
+from pyspline.psplines_inner import (
+    fit_n_dimensional,
+    fit_n_dimensional_scattered,
+    fit_one_dimensional,
+)
+
+from .common import N_FUNCTIONS, N_OBS, scattered, skip_if_too_large
+
+DEGREE = 3
+
+
+class FitOneDimensional:
+    """Fit of a curve to scattered observations."""
+
+    params = (N_OBS, N_FUNCTIONS, ["banded", "dense"])
+    param_names = ["n_obs", "n_functions", "solver"]
+
+    def setup(self, n_obs, n_functions, solver):
+        skip_if_too_large(8 * 8 * n_obs * (DEGREE + 1))
+        X, self.y = scattered(n_obs, 1)
+        self.basis = basis_bsplines(
+            X[:, 0], n_functions, DEGREE, 0, 1, format="compact"
+        )
+
+    def time_fit(self, n_obs, n_functions, solver):
+        """Fit the coefficients, without diagnostics."""
+        fit_one_dimensional(
+            self.y, self.basis, solver=solver, compute_diagnostics="none"
+        )
+
+    def time_fit_edf(self, n_obs, n_functions, solver):
+        """Fit the coefficients and the effective dimension."""
+        fit_one_dimensional(
+            self.y, self.basis, solver=solver, compute_diagnostics="edf"
+        )
+
+
+class FitNDimensional:
+    """Fit of a surface to a grid of observations."""
+
+    params = (
+        [2, 3, 4],
+        [10_000, 1_000_000],
+        [10, 20, 40],
+        ["dense", "cg", "sandwich"],
+    )
+    param_names = ["dimension", "n_obs", "n_functions", "solver"]
+
+    def setup(self, dimension, n_obs, n_functions, solver):
+        n_points = int(round(n_obs ** (1 / dimension)))
+        n_coefs = n_functions**dimension
+        # The data, the weights and the temporaries of the contractions.
+        n_bytes = 8 * 8 * (n_points**dimension + n_coefs)
+        if solver == "dense":
+            # The normal equations, the penalty and the factorization.
+            n_bytes += 3 * 8 * n_coefs**2
+        skip_if_too_large(n_bytes)
+        rng = np.random.default_rng(42)
+        x = np.linspace(0, 1, n_points)
+        self.basis_list = [
+            basis_bsplines(x, n_functions, DEGREE) for _ in range(dimension)
+        ]
+        grid = np.sin(2 * np.pi * x)
+        data = grid
+        for _ in range(dimension - 1):
+            data = np.multiply.outer(data, grid)
+        self.data = data + rng.normal(0, 0.1, data.shape)
+        self.penalties = dimension * (1.0,)
+
+    def time_fit(self, dimension, n_obs, n_functions, solver):
+        """Fit the coefficients, without diagnostics."""
+        fit_n_dimensional(
+            self.data,
+            self.basis_list,
+            penalties=self.penalties,
+            solver=solver,
+            compute_diagnostics="none",
+        )
+
+
+class FitScattered:
+    """Fit of a surface to scattered observations with sparse algebra."""
+
+    params = ([2, 3], [10, 15, 19], ["none", "full"])
+    param_names = ["dimension", "n_functions", "compute_diagnostics"]
+
+    def setup(self, dimension, n_functions, compute_diagnostics):
+        # The fill-in of the sparse LU factorization dominates, at about
+        # 20 bytes per entry of the system once dense.
+        skip_if_too_large(20 * n_functions ** (2 * dimension))
+        X, self.y = scattered(20_000, dimension)
+        self.basis_list = [
+            basis_bsplines(x, n_functions, DEGREE, 0, 1, format="compact")
+            for x in X.T
+        ]
+        self.penalties = dimension * (1.0,)
+
+    def time_fit(self, dimension, n_functions, compute_diagnostics):
+        """Fit the coefficients and the diagnostics, if any."""
+        fit_n_dimensional_scattered(
+            self.y,
+            self.basis_list,
+            penalties=self.penalties,
+            compute_diagnostics=compute_diagnostics,
+        )
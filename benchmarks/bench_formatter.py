@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Benchmarks of the formatter
+---------------------------
+
+The classes follow the conventions of `asv` (airspeed velocity). Without
+`bins`, the observations are on a lattice, such that the grid of the unique
+values has about `n_obs` points whatever the dimension.
+
+"""
+
+from pyspline.formatter import format_X_y
+
+from .common import N_OBS, lattice, scattered, skip_if_too_large
+
+
+class FormatXY:
+    """Snapping of scattered observations onto a grid."""
+
+    params = (N_OBS, [2, 3, 4], [None, 32])
+    param_names = ["n_obs", "dimension", "bins"]
+
+    def setup(self, n_obs, dimension, bins):
+        # The observations, their sort and the grid.
+        n_grid = n_obs if bins is None else bins**dimension
+        skip_if_too_large(8 * (4 * n_obs * (dimension + 2) + 2 * n_grid))
+        if bins is None:
+            self.X, self.y = lattice(n_obs, dimension)
+        else:
+            self.X, self.y = scattered(n_obs, dimension)
+
+    def time_format_X_y(self, n_obs, dimension, bins):
+        """Put the observations on the grid."""
+        format_X_y(self.X, self.y, bins=bins)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Benchmarks of the import time
+-----------------------------
+
+The `timeraw_` functions follow the conventions of `asv` (airspeed velocity):
+the returned code is timed in a fresh interpreter. The file can also be run as
+a script to print the import times and to check that `pyspline.runtime`, which
+only scores saved models, stays within its budget.
+
+"""
+
+import subprocess
+import sys
+
+# The import time of `pyspline.runtime`, once NumPy is imported.
+RUNTIME_BUDGET = 0.1
+
+
+def timeraw_import_runtime():
+    """Import the inference runtime."""
+    return "import pyspline.runtime", "import numpy"
+
+
+def timeraw_import_psplines():
+    """Import the estimators, with scikit-learn and SciPy."""
+    return "import pyspline.psplines", "import numpy"
+
+
+def _import_time(module):
+    """Time the import of a module in a fresh interpreter."""
+    code = (
+        "import time\n"
+        "import numpy\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return float(output.stdout)
+
+
+if __name__ == "__main__":
+    timings = {}
+    for module in ("pyspline.runtime", "pyspline.psplines"):
+        timings[module] = min(_import_time(module) for _ in range(5))
+        print(f"import {module}: {1000 * timings[module]:.1f} ms")
+    if timings["pyspline.runtime"] > RUNTIME_BUDGET:
+        raise SystemExit(
+            f"The import of pyspline.runtime exceeds its budget of "
+            f"{1000 * RUNTIME_BUDGET:.0f} ms."
+        )
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Benchmarks of the predictions
+-----------------------------
+
+The classes follow the conventions of `asv` (airspeed velocity). The models
+are fitted once, and the predictions are evaluated at `n_obs` new points: at
+each point with `grid=False`, and on the grid of their unique values with
+`grid=True`, the points being on a lattice of about `n_obs` points.
+
+"""
+
+from pyspline.psplines import PSplines
+
+from .common import N_OBS, lattice, scattered, skip_if_too_large
+
+N_SEGMENTS = 20
+DEGREE = 3
+
+
+class Predict:
+    """Predictions of a fitted model."""
+
+    params = (N_OBS, [1, 2, 3, 4], [True, False])
+    param_names = ["n_obs", "dimension", "grid"]
+
+    def setup(self, n_obs, dimension, grid):
+        n_values = (DEGREE + 1) ** dimension
+        skip_if_too_large(8 * n_obs * (4 * dimension + min(n_values, 64)))
+        X, y = scattered(10_000, dimension)
+        self.model = PSplines(
+            penalty=dimension * (1.0,),
+            n_segments=dimension * (N_SEGMENTS,),
+            degree=dimension * (DEGREE,),
+            basis_format="compact",
+            compute_diagnostics="none",
+            bins=None if dimension == 1 else 16,
+        ).fit(X, y, domains=dimension * [(0, 1)] if dimension > 1 else (0, 1))
+        if grid:
+            self.X, _ = lattice(n_obs, dimension, seed=0)
+        else:
+            self.X, _ = scattered(n_obs, dimension, seed=0)
+
+    def time_predict(self, n_obs, dimension, grid):
+        """Predict the response variable values."""
+        self.model.predict(self.X, grid=grid)
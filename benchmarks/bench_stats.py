@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Benchmarks of the sharded sufficient statistics
+-----------------------------------------------
+
+The classes follow the conventions of `asv` (airspeed velocity). The file can
+also be run as a script to print the timings of `parallel_statistics` for an
+increasing number of shards, each shard running in its own process. The
+speed-up is bounded by the number of available cores; the merge of the
+statistics costs `O(n_basis * bandwidth)` per shard and is negligible.
+
+"""
+
+import functools
+import os
+import timeit
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+from pyspline.stats import parallel_statistics
+
+N_OBS = 2_000_000
+KWARGS = {
+    "n_segments": (100,),
+    "degree": (3,),
+    "domains": [(0, 1)],
+}
+
+
+def _make_problem():
+    """Create scattered observations of a one-dimensional curve."""
+    rng = np.random.default_rng(42)
+    x = rng.uniform(0, 1, (N_OBS, 1))
+    y = np.sin(2 * np.pi * x[:, 0]) + rng.normal(0, 0.1, N_OBS)
+    return x, y
+
+
+class ParallelStatistics:
+    """Scaling of the statistics with the number of shards."""
+
+    params = [1, 2, 4, 8]
+    param_names = ["n_shards"]
+
+    def setup(self, n_shards):
+        self.x, self.y = _make_problem()
+        # The pool is created once, as the workers of a long-running service.
+        self.executor = ProcessPoolExecutor(max_workers=n_shards)
+
+    def teardown(self, n_shards):
+        self.executor.shutdown()
+
+    def time_parallel_statistics(self, n_shards):
+        """Compute and merge the statistics of the shards."""
+        parallel_statistics(
+            self.x,
+            self.y,
+            n_shards=n_shards,
+            executor=self.executor,
+            **KWARGS,
+        )
+
+
+if __name__ == "__main__":
+    print(f"{os.cpu_count()} CPU(s), {N_OBS} observations")
+    bench = ParallelStatistics()
+    timings = {}
+    for n_shards in ParallelStatistics.params:
+        bench.setup(n_shards)
+        timings[n_shards] = min(
+            timeit.repeat(
+                functools.partial(bench.time_parallel_statistics, n_shards),
+                number=1,
+                repeat=3,
+            )
+        )
+        bench.teardown(n_shards)
+        print(
+            f"{n_shards} shard(s): {1000 * timings[n_shards]:.1f} ms "
+            f"(x{timings[1] / timings[n_shards]:.2f})"
+        )
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Helpers of the benchmarks
+-------------------------
+
+The parameters of the benchmarks span sizes that do not all fit in memory.
+The setups estimate the memory of each case and skip it, by raising
+`NotImplementedError` as `asv` expects, if it exceeds the limit given by the
+environment variable `PYSPLINE_BENCH_MEMORY`, in bytes.
+
+"""
+
+import os
+
+import numpy as np
+
+# The default memory limit of a case, in bytes.
+DEFAULT_MEMORY_LIMIT = 2e9
+
+N_OBS = [100, 10_000, 1_000_000, 10_000_000]
+N_FUNCTIONS = [10, 100, 1000]
+
+
+def memory_limit():
+    """Get the memory limit of a case, in bytes."""
+    return float(os.environ.get("PYSPLINE_BENCH_MEMORY", DEFAULT_MEMORY_LIMIT))
+
+
+def skip_if_too_large(n_bytes):
+    """Skip the case if its estimated memory exceeds the limit."""
+    if n_bytes > memory_limit():
+        raise NotImplementedError(
+            f"The case needs about {n_bytes / 1e6:.0f} MB, more than the "
+            f"limit of {memory_limit() / 1e6:.0f} MB."
+        )
+
+
+def scattered(n_obs, dimension, seed=42):
+    """Create scattered observations of a smooth surface in `[0, 1]^d`."""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 1, (n_obs, dimension))
+    y = np.prod(np.sin(2 * np.pi * X), axis=1) + rng.normal(0, 0.1, n_obs)
+    return X, y
+
+
+def lattice(n_obs, dimension, seed=42):
+    """Create observations whose values lie on a grid of about `n_obs` points.
+
+    Each column takes `ceil(n_obs ** (1 / dimension))` distinct values, such
+    that the grid of the unique values, see
+    :func:`~pyspline.formatter.format_X_y`, has about `n_obs` points.
+    """
+    rng = np.random.default_rng(seed)
+    n_levels = int(np.ceil(n_obs ** (1 / dimension)))
+    X = rng.integers(0, n_levels, (n_obs, dimension)) / max(n_levels - 1, 1)
+    y = np.prod(np.sin(2 * np.pi * X), axis=1) + rng.normal(0, 0.1, n_obs)
+    return X, y
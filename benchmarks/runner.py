@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Offline runner of the benchmarks
+--------------------------------
+
+The runner discovers the benchmarks of the modules `bench_*.py` with the
+conventions of `asv` (airspeed velocity): the classes and functions whose
+methods are prefixed by `time_`, `peakmem_` or `timeraw_`, with their `params`,
+`param_names`, `setup` and `teardown`. A setup that raises
+`NotImplementedError` skips the case. Each case is run once under
+`tracemalloc`, which records the peak of the memory allocated by Python and
+NumPy and warms the caches up, then `repeat` times for the wall time.
+
+The results are written as JSON, together with the commit and the versions,
+such that two runs can be compared::
+
+    python -m benchmarks run --output before.json
+    python -m benchmarks run --output after.json --bench "Fit"
+    python -m benchmarks compare before.json after.json
+
+"""
+
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+PREFIXES = ("time_", "peakmem_", "timeraw_")
+
+
+def _param_grid(benchmark):
+    """Get the combinations of the parameters of a benchmark."""
+    params = getattr(benchmark, "params", None)
+    names = list(getattr(benchmark, "param_names", []))
+    if params is None:
+        return [], [()]
+    params = list(params)
+    if len(names) <= 1 and not (
+        len(params) > 0 and isinstance(params[0], (list, tuple))
+    ):
+        params = [params]
+    if len(names) < len(params):
+        names += [f"param{idx}" for idx in range(len(names), len(params))]
+    return names, list(itertools.product(*params))
+
+
+def discover(pattern=None):
+    """Find the benchmarks of the package.
+
+    Parameters
+    ----------
+    pattern: str | None, default=None
+        A regular expression matched against the names of the benchmarks,
+        e.g. `"bench_fit.FitOneDimensional.time_fit"`.
+
+    Returns
+    -------
+    list[tuple[str, type | None, str]]
+        The name of each benchmark, its class, if any, and its method or
+        function name.
+
+    """
+    package = importlib.import_module(__package__ or "benchmarks")
+    benchmarks = []
+    for module_info in pkgutil.iter_modules(package.__path__):
+        if not module_info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(
+            f"{package.__name__}.{module_info.name}"
+        )
+        for name, value in vars(module).items():
+            if inspect.isclass(value) and value.__module__ == module.__name__:
+                for method in sorted(vars(value)):
+                    if method.startswith(PREFIXES):
+                        full_name = f"{module_info.name}.{name}.{method}"
+                        benchmarks.append((full_name, value, method))
+            elif inspect.isfunction(value) and name.startswith(PREFIXES):
+                benchmarks.append((f"{module_info.name}.{name}", module, name))
+    if pattern is not None:
+        benchmarks = [
+            benchmark
+            for benchmark in benchmarks
+            if re.search(pattern, benchmark[0])
+        ]
+    return benchmarks
+
+
+def _run_raw(code, setup, repeat):
+    """Time a `timeraw_` benchmark in fresh interpreters."""
+    script = (
+        "import time\n"
+        f"{setup}\n"
+        "start = time.perf_counter()\n"
+        f"{code}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    return [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", script],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+
+
+def run_case(owner, method, values, repeat):
+    """Run a case of a benchmark.
+
+    Parameters
+    ----------
+    owner: type | module
+        The class of the benchmark, instantiated for the case, or the module
+        of a benchmark function.
+    method: str
+        The name of the benchmark method or function.
+    values: tuple
+        The values of the parameters.
+    repeat: int
+        The number of timed runs.
+
+    Returns
+    -------
+    dict
+        The status of the case, `"ok"`, `"skipped"` or `"failed"`, and its
+        timings, in seconds, and peak memory, in bytes.
+
+    """
+    instance = owner() if inspect.isclass(owner) else owner
+    func = getattr(instance, method)
+    try:
+        if hasattr(instance, "setup"):
+            instance.setup(*values)
+    except NotImplementedError as error:
+        return {"status": "skipped", "reason": str(error)}
+    except Exception as error:  # noqa: BLE001
+        reason = f"setup: {type(error).__name__}: {error}"
+        return {"status": "failed", "reason": reason}
+    try:
+        if method.startswith("timeraw_"):
+            code = func(*values)
+            code, setup = code if isinstance(code, tuple) else (code, "")
+            timings = _run_raw(code, setup, repeat)
+            peak = None
+        else:
+            tracemalloc.start()
+            try:
+                func(*values)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            timings = []
+            for _ in range(repeat if method.startswith("time_") else 0):
+                start = time.perf_counter()
+                func(*values)
+                timings.append(time.perf_counter() - start)
+    except Exception as error:  # noqa: BLE001
+        reason = f"{type(error).__name__}: {error}"
+        return {"status": "failed", "reason": reason}
+    finally:
+        if hasattr(instance, "teardown"):
+            instance.teardown(*values)
+    result = {"status": "ok", "peak_bytes": peak}
+    if timings:
+        result.update(
+            {
+                "min": min(timings),
+                "median": statistics.median(timings),
+                "repeat": len(timings),
+            }
+        )
+    return result
+
+
+def _environment():
+    """Describe the commit and the environment of a run."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _format_case(result):
+    """Format the result of a case for the console."""
+    if result["status"] != "ok":
+        return f"{result['status']} ({result['reason']})"
+    parts = []
+    if "min" in result:
+        parts.append(f"{1000 * result['min']:.3f} ms")
+    if result["peak_bytes"] is not None:
+        parts.append(f"peak {result['peak_bytes'] / 1e6:.1f} MB")
+    return ", ".join(parts)
+
+
+def run(pattern=None, repeat=3, max_bytes=None, output=None):
+    """Run the benchmarks and write their results as JSON.
+
+    Parameters
+    ----------
+    pattern: str | None, default=None
+        A regular expression selecting the benchmarks, see :func:`discover`.
+    repeat: int, default=3
+        The number of timed runs of each case.
+    max_bytes: float | None, default=None
+        The memory limit of a case, see :mod:`benchmarks.common`.
+    output: str | None, default=None
+        The path of the JSON file. If not provided, the results are only
+        printed.
+
+    Returns
+    -------
+    dict
+        The environment and the results of the run.
+
+    """
+    if max_bytes is not None:
+        os.environ["PYSPLINE_BENCH_MEMORY"] = str(max_bytes)
+    results = []
+    for name, owner, method in discover(pattern):
+        names, grid = _param_grid(owner if inspect.isclass(owner) else None)
+        for values in grid:
+            params = dict(zip(names, values))
+            result = run_case(owner, method, values, repeat)
+            results.append({"name": name, "params": params, **result})
+            label = ", ".join(f"{key}={value}" for key, value in params.items())
+            print(f"{name}({label}): {_format_case(result)}", flush=True)
+    report = {"environment": _environment(), "results": results}
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2, default=str)
+    return report
+
+
+def _key(result):
+    """Identify a case across runs."""
+    return result["name"], json.dumps(result["params"], default=str)
+
+
+def compare(before, after, threshold=1.1):
+    """Compare the timings of two runs.
+
+    Parameters
+    ----------
+    before: str
+        The path of the JSON file of the reference run.
+    after: str
+        The path of the JSON file of the new run.
+    threshold: float, default=1.1
+        The ratio of the minimum times above which a case is reported as a
+        regression, and below the inverse of which as an improvement.
+
+    Returns
+    -------
+    list[tuple[str, str, float]]
+        The name, the parameters and the ratio of the regressions.
+
+    """
+    with open(before) as file:
+        reference = {
+            _key(result): result for result in json.load(file)["results"]
+        }
+    with open(after) as file:
+        results = json.load(file)["results"]
+    regressions = []
+    for result in results:
+        old = reference.get(_key(result))
+        if old is None or "min" not in old or "min" not in result:
+            continue
+        ratio = result["min"] / old["min"]
+        memory = ""
+        if old.get("peak_bytes") and result.get("peak_bytes"):
+            memory = f", memory x{result['peak_bytes'] / old['peak_bytes']:.2f}"
+        flag = ""
+        if ratio > threshold:
+            flag = " REGRESSION"
+            regressions.append((result["name"], _key(result)[1], ratio))
+        elif ratio < 1 / threshold:
+            flag = " improvement"
+        print(f"{result['name']} {_key(result)[1]}: x{ratio:.2f}{memory}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    """Run the command line interface."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__.split("\n\n")[1]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument(
+        "--bench", default=None, help="Regular expression on the names."
+    )
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument(
+        "--max-bytes",
+        type=float,
+        default=None,
+        help="Skip the cases that need more memory, in bytes.",
+    )
+    run_parser.add_argument("--output", default=None, help="JSON file.")
+    compare_parser = commands.add_parser(
+        "compare", help="Compare the results of two runs."
+    )
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=1.1)
+    compare_parser.add_argument(
+        "--fail",
+        action="store_true",
+        help="Exit with an error if a case regressed.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        run(args.bench, args.repeat, args.max_bytes, args.output)
+        return 0
+    regressions = compare(args.before, args.after, args.threshold)
+    return 1 if args.fail and regressions else 0
@@ -9,7 +9,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 
-from pyspline.psplines import PSplines
+from pyspline.basis import basis_bsplines
+from pyspline.selection import select_penalty
 
 
 # Get the data
@@ -18,39 +19,24 @@ times = data["times"].to_numpy()
 accel = data["accel"].to_numpy()
 
 
-# Loops for log(lambda) and order d
+# Effective dimensions for log(lambda) and order d
 lambdas = np.arange(-5, 5.1, 0.1)
 llambdas = 10**lambdas
 
-ED_1 = np.zeros_like(llambdas)
-for idx, lamb in enumerate(llambdas):
-    ps = PSplines(
-        penalty=(lamb,), n_segments=(20,), degree=(3,), order_penalty=1
-    )
-    ps.fit(
-        X=times.reshape(-1, 1), y=accel, domains=(np.min(times), np.max(times))
-    )
-    ED_1[idx] = ps.diagnostics_["eff_dimension"]
-
-ED_2 = np.zeros_like(llambdas)
-for idx, lamb in enumerate(llambdas):
-    ps = PSplines(
-        penalty=(lamb,), n_segments=(20,), degree=(3,), order_penalty=2
-    )
-    ps.fit(
-        X=times.reshape(-1, 1), y=accel, domains=(np.min(times), np.max(times))
-    )
-    ED_2[idx] = ps.diagnostics_["eff_dimension"]
-
-ED_3 = np.zeros_like(llambdas)
-for idx, lamb in enumerate(llambdas):
-    ps = PSplines(
-        penalty=(lamb,), n_segments=(20,), degree=(3,), order_penalty=3
-    )
-    ps.fit(
-        X=times.reshape(-1, 1), y=accel, domains=(np.min(times), np.max(times))
-    )
-    ED_3[idx] = ps.diagnostics_["eff_dimension"]
+basis = basis_bsplines(
+    argvals=times,
+    n_functions=20 + 3,
+    degree=3,
+    domain_min=np.min(times),
+    domain_max=np.max(times),
+    format="compact",
+)
+ED_1, ED_2, ED_3 = (
+    select_penalty(
+        data=accel, basis=basis, penalties=llambdas, order_penalty=order
+    )["eff_dimension"]
+    for order in (1, 2, 3)
+)
 
 
 # Build the graph
@@ -10,9 +10,13 @@ Array manipulation function
 import numpy as np
 import numpy.typing as npt
 
+from typing import Any
+
 
 def row_tensor(
-    x: npt.NDArray[np.float_], y: npt.NDArray[np.float_] | None = None
+    x: npt.NDArray[np.float_],
+    y: npt.NDArray[np.float_] | None = None,
+    out: npt.NDArray[np.float_] | None = None,
 ) -> npt.NDArray[np.float_]:
     """
     Compute the row-wise tensor product of two 2D arrays.
@@ -22,12 +26,20 @@ def row_tensor(
     of `x` and `y`. If `y` is not provided, it defaults to `x`. Note that `x`
     and `y` must have the same number of rows.
 
+    The product is computed by broadcasting, such that no intermediate array
+    of the size of the result is created. If `x` or `y` is a sparse array, only
+    the products of the non-zero entries are computed and a sparse array in
+    CSR format is returned, see :func:`sparse_row_tensor`.
+
     Parameters
     ----------
     x: npt.NDArray[np.float_]
         A 2D array of shape `(m, n)`.
     y: npt.NDArray[np.float_] | None, default=None
         A 2D array of shape `(m, q)`. If not provided, it defaults to `x`.
+    out: npt.NDArray[np.float_] | None, default=None
+        A C-contiguous array of shape `(m, n*q)` in which to store the result.
+        Not supported for sparse inputs.
 
     Returns
     -------
@@ -65,9 +77,82 @@ def row_tensor(
         y = x
     if x.shape[0] != y.shape[0]:
         raise ValueError("`x` and `y` must have the same number of rows.")
-    onex = np.ones((1, x.shape[1]))
-    oney = np.ones((1, y.shape[1]))
-    return np.kron(x, oney) * np.kron(onex, y)
+    if not isinstance(x, np.ndarray) or not isinstance(y, np.ndarray):
+        if out is not None:
+            raise ValueError("`out` is not supported for sparse arrays.")
+        return sparse_row_tensor(x, y)
+
+    shape = (x.shape[0], x.shape[1] * y.shape[1])
+    if out is None:
+        out = np.empty(shape, dtype=np.result_type(x, y, np.float_))
+    elif out.shape != shape or not out.flags.c_contiguous:
+        raise ValueError(
+            f"`out` must be a C-contiguous array of shape {shape}."
+        )
+    np.multiply(
+        x[:, :, np.newaxis],
+        y[:, np.newaxis, :],
+        out=out.reshape((x.shape[0], x.shape[1], y.shape[1])),
+    )
+    return out
+
+
+def sparse_row_tensor(x: Any, y: Any | None = None) -> Any:
+    """
+    Compute the row-wise tensor product of two sparse 2D arrays.
+
+    Only the products of the non-zero entries of the same row are computed.
+    For B-splines bases of degree `d`, each row of the result has
+    `(d + 1)**2` non-zero entries, whatever the number of basis functions.
+
+    Parameters
+    ----------
+    x: scipy.sparse.sparray
+        A sparse 2D array of shape `(m, n)`.
+    y: scipy.sparse.sparray | None, default=None
+        A sparse 2D array of shape `(m, q)`. If not provided, it defaults to
+        `x`.
+
+    Returns
+    -------
+    scipy.sparse.csr_array
+        A sparse 2D array of shape `(m, n*q)`.
+
+    """
+    from scipy import sparse
+
+    if y is None:
+        y = x
+    if x.shape[0] != y.shape[0]:
+        raise ValueError("`x` and `y` must have the same number of rows.")
+    x, y = sparse.csr_array(x), sparse.csr_array(y)
+    x.sort_indices()
+    y.sort_indices()
+
+    # Each non-zero entry of `x` is repeated for each non-zero entry of the
+    # same row of `y`.
+    x_counts, y_counts = np.diff(x.indptr), np.diff(y.indptr)
+    x_rows = np.repeat(np.arange(x.shape[0]), x_counts)
+    group_sizes = y_counts[x_rows]
+    x_idx = np.repeat(np.arange(len(x_rows)), group_sizes)
+    group_starts = np.cumsum(group_sizes) - group_sizes
+    y_idx = (
+        y.indptr[x_rows[x_idx]]
+        + np.arange(len(x_idx))
+        - np.repeat(group_starts, group_sizes)
+    )
+
+    indptr = np.zeros(x.shape[0] + 1, dtype=np.int64)
+    np.cumsum(x_counts * y_counts, out=indptr[1:])
+    return sparse.csr_array(
+        (
+            x.data[x_idx] * y.data[y_idx],
+            x.indices[x_idx].astype(np.int64) * y.shape[1]
+            + y.indices[y_idx],
+            indptr,
+        ),
+        shape=(x.shape[0], x.shape[1] * y.shape[1]),
+    )
 
 
 def h_transform(
@@ -212,6 +297,294 @@ def rotated_h_transform(
     return rotate(h_transform(x, y))
 
 
+def _contraction_start(
+    shape: tuple[int, ...], sizes: list[tuple[int, int]]
+) -> int:
+    """Find the first axis of the cyclic order of the contractions.
+
+    Contracting the axis `i`, of size `m_i`, with a matrix of shape `(n_i, m_i)`
+    costs `n_i * size(tensor)` multiplications and replaces `m_i` by `n_i`. The
+    axes are contracted in cyclic order, such that each contraction is a single
+    matrix product. Starting from another axis than the first one requires to
+    transpose the tensor, which is added to the cost.
+
+    """
+    n_axes = len(sizes)
+
+    def cost(start: int) -> float:
+        current = list(shape)
+        flops = 0.0 if start == 0 else 2.0 * float(np.prod(shape))
+        for step in range(n_axes):
+            axis = (start + step) % n_axes
+            flops += sizes[axis][0] * float(np.prod(current))
+            current[axis] = sizes[axis][0]
+        return flops
+
+    return min(range(n_axes), key=cost)
+
+
+class GlamContraction:
+    """
+    Plan of the multiplication of each of the first axes of a nD array.
+
+    The plan computes, for `k` matrices `X_1, ..., X_k` of shapes
+    `(n1, m1), ..., (nk, mk)` and a nD array `Y` of shape
+    `(m1, ..., mk, p1, ..., pl)`, the nD array `Z` of shape
+    `(n1, ..., nk, p1, ..., pl)` such that
+
+    `Z[a1, .., ak, ...] = sum(X_1[a1, b1] .. X_k[ak, bk] Y[b1, .., bk, ...])`,
+
+    where the sum is over `b1, ..., bk`. When `Y` has exactly `k` axes, this is
+    the result of the chain
+    `rotated_h_transform(X_k, ... rotated_h_transform(X_1, Y))`.
+
+    The order of the contractions is cyclic, starting from the axis that
+    minimizes the number of multiplications. Each contraction is a single
+    matrix product with the contracted axis first, followed by a rotation of
+    the axes into a C-contiguous array. The scratch buffers are allocated once,
+    when the plan is created, and reused for every call, such that a plan is
+    worth keeping when the same matrices are applied many times, e.g. in an
+    iterative solver.
+
+    Parameters
+    ----------
+    matrices: list[npt.NDArray[np.float_]]
+        A list of `k` 2D arrays of shape `(n1, m1), ..., (nk, mk)`. The arrays
+        can be sparse.
+    shape: tuple[int, ...]
+        The shape `(m1, ..., mk, p1, ..., pl)` of the nD arrays to multiply.
+    method: str, {"auto", "matmul", "einsum"}, default="auto"
+        The method used for the contractions. `"matmul"` uses matrix products
+        with BLAS. `"einsum"` uses a single call to :func:`numpy.einsum` with a
+        contraction path computed once, and is only available for dense
+        matrices. `"auto"` is `"matmul"`.
+    dtype: npt.DTypeLike, default=np.float_
+        The data type of the nD arrays to multiply.
+
+    Notes
+    -----
+    A plan is not thread-safe, as the scratch buffers are shared between the
+    calls.
+
+    References
+    ----------
+    .. [1] Currie, I. D., Durban, M., Eilers, P. H. C. (2006), Generalized
+        Linear Array Models with Applications to Multidimensional Smoothing.
+        Journal of the Royal Statistical Society. Series B (Statistical
+        Methodology) 68, pp.259--280.
+
+    """
+
+    def __init__(
+        self,
+        matrices: list[Any],
+        shape: tuple[int, ...],
+        method: str = "auto",
+        dtype: npt.DTypeLike = np.float_,
+    ) -> None:
+        """Initialize GlamContraction object."""
+        if method not in ("auto", "matmul", "einsum"):
+            raise ValueError(
+                "`method` must be 'auto', 'matmul' or 'einsum', "
+                f"got '{method}'."
+            )
+        n_axes = len(matrices)
+        if len(shape) < n_axes:
+            raise ValueError(
+                "`tensor` must have at least as many axes as there are "
+                "matrices."
+            )
+        for axis, mat in enumerate(matrices):
+            if mat.shape[1] != shape[axis]:
+                raise ValueError(
+                    f"The second dimension of the matrix {axis} must be equal"
+                    f" to the dimension {axis} of `tensor`."
+                )
+        is_dense = all(isinstance(mat, np.ndarray) for mat in matrices)
+        if method == "einsum" and not is_dense:
+            raise ValueError("`method='einsum'` requires dense matrices.")
+
+        self.matrices = matrices
+        self.shape = tuple(shape)
+        self.method = method
+        self.dtype = np.result_type(dtype, *[mat.dtype for mat in matrices])
+        self.out_shape = (
+            *[mat.shape[0] for mat in matrices],
+            *self.shape[n_axes:],
+        )
+
+        if method == "einsum":
+            letters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+            rows, cols = letters[:n_axes], letters[n_axes : 2 * n_axes]
+            rest = letters[2 * n_axes : n_axes + len(shape)]
+            self._subscripts = (
+                ",".join(f"{r}{c}" for r, c in zip(rows, cols))
+                + f",{cols}{rest}->{rows}{rest}"
+            )
+            self._path = np.einsum_path(
+                self._subscripts,
+                *matrices,
+                np.empty(shape, dtype=self.dtype),
+                optimize="optimal",
+            )[0]
+            return
+
+        sizes = [mat.shape for mat in matrices]
+        start = _contraction_start(self.shape, sizes) if n_axes else 0
+        self._order = [(start + step) % n_axes for step in range(n_axes)]
+        self._trailing = list(range(n_axes, len(shape)))
+        self._is_ordered = start == 0 and len(self._trailing) == 0
+
+        # A contraction that expands the axis is written directly in the
+        # rotated layout. A contraction that shrinks the axis, or uses a sparse
+        # matrix, is faster as a product followed by a rotation.
+        self._is_direct, self._steps, current = [], [], list(shape)
+        for axis in self._order:
+            current[axis] = sizes[axis][0]
+            self._steps.append(int(np.prod(current)))
+            self._is_direct.append(
+                isinstance(matrices[axis], np.ndarray)
+                and sizes[axis][0] >= sizes[axis][1]
+            )
+        n_buffered = n_axes - 1 if self._is_ordered else n_axes
+        self._buffers = [
+            np.empty(max(self._steps[:n_buffered], default=0), self.dtype)
+            for _ in range(min(2, n_buffered))
+        ]
+        self._products = np.empty(
+            max(
+                [n for n, d in zip(self._steps, self._is_direct) if not d],
+                default=0,
+            ),
+            self.dtype,
+        )
+
+    def __call__(
+        self,
+        tensor: npt.NDArray[np.float_],
+        out: npt.NDArray[np.float_] | None = None,
+    ) -> npt.NDArray[np.float_]:
+        """Multiply the first axes of `tensor` by the matrices.
+
+        Parameters
+        ----------
+        tensor: npt.NDArray[np.float_]
+            A nD array of shape `(m1, ..., mk, p1, ..., pl)`.
+        out: npt.NDArray[np.float_] | None, default=None
+            A C-contiguous array of shape `(n1, ..., nk, p1, ..., pl)` in which
+            to store the result.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            A nD array of shape `(n1, ..., nk, p1, ..., pl)`.
+
+        """
+        tensor = np.asarray(tensor)
+        if tensor.shape != self.shape:
+            raise ValueError(
+                f"`tensor` must be of shape {self.shape}, got {tensor.shape}."
+            )
+        if out is None:
+            out = np.empty(self.out_shape, dtype=self.dtype)
+        elif out.shape != self.out_shape or not out.flags.c_contiguous:
+            raise ValueError(
+                f"`out` must be a C-contiguous array of shape "
+                f"{self.out_shape}."
+            )
+        if self.method == "einsum":
+            return np.einsum(
+                self._subscripts,
+                *self.matrices,
+                tensor,
+                out=out,
+                optimize=self._path,
+            )
+        if len(self.matrices) == 0:
+            np.copyto(out, tensor)
+            return out
+
+        # The axes are stored in the order of the contractions. Each
+        # contraction consumes the first axis and the new one is moved at the
+        # end, such that the axes are `(p1, ..., pl, n1, ..., nk)` at the end.
+        result = np.ascontiguousarray(
+            tensor.transpose(self._order + self._trailing), dtype=self.dtype
+        )
+        for step, axis in enumerate(self._order):
+            mat = self.matrices[axis]
+            n_rows, n_cols = mat.shape
+            flat = result.reshape(n_cols, -1)
+            if step == len(self._order) - 1 and self._is_ordered:
+                result = out.reshape(-1, n_rows)
+            else:
+                result = self._buffers[step % 2][: self._steps[step]].reshape(
+                    -1, n_rows
+                )
+            if self._is_direct[step]:
+                np.matmul(flat.T, mat.T, out=result)
+                continue
+            product = self._products[: self._steps[step]].reshape(n_rows, -1)
+            if isinstance(mat, np.ndarray):
+                np.matmul(mat, flat, out=product)
+            else:
+                product[...] = mat @ flat
+            np.copyto(result, product.T)
+
+        if not self._is_ordered:
+            # Put the axes back in the order `(n1, ..., nk, p1, ..., pl)`.
+            n_trailing = len(self._trailing)
+            result = result.reshape(
+                [self.shape[axis] for axis in self._trailing]
+                + [self.matrices[axis].shape[0] for axis in self._order]
+            )
+            inverse = [n_trailing + int(ax) for ax in np.argsort(self._order)]
+            np.copyto(out, result.transpose(inverse + list(range(n_trailing))))
+        return out
+
+
+def glam_contract(
+    matrices: list[Any],
+    tensor: npt.NDArray[np.float_],
+    method: str = "auto",
+    out: npt.NDArray[np.float_] | None = None,
+) -> npt.NDArray[np.float_]:
+    """
+    Multiply each of the first axes of a nD array by a matrix.
+
+    This is a shortcut for `GlamContraction(matrices, tensor.shape)(tensor)`,
+    see :class:`GlamContraction`.
+
+    Parameters
+    ----------
+    matrices: list[npt.NDArray[np.float_]]
+        A list of `k` 2D arrays of shape `(n1, m1), ..., (nk, mk)`. The arrays
+        can be sparse.
+    tensor: npt.NDArray[np.float_]
+        A nD array of shape `(m1, ..., mk, p1, ..., pl)`.
+    method: str, {"auto", "matmul", "einsum"}, default="auto"
+        The method used for the contractions.
+    out: npt.NDArray[np.float_] | None, default=None
+        A C-contiguous array of shape `(n1, ..., nk, p1, ..., pl)` in which to
+        store the result.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        A nD array of shape `(n1, ..., nk, p1, ..., pl)`.
+
+    Examples
+    --------
+    >>> x = np.array([[1, 2, 3]])
+    >>> y = np.array([[1, 2], [3, 4], [5, 6]])
+    >>> glam_contract([x, np.eye(2)], y)
+    array([[22., 28.]])
+
+    """
+    tensor = np.asarray(tensor)
+    plan = GlamContraction(matrices, tensor.shape, method, tensor.dtype)
+    return plan(tensor, out=out)
+
+
 def create_permutation(p: int, k: int) -> npt.NDArray[np.float_]:
     """
     Create a permutation array for a given number of factors and levels.
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Banded matrices
+---------------
+
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+from typing import Any
+
+from scipy import sparse
+from scipy.linalg import cho_solve_banded, cholesky_banded, solve_triangular
+
+from .basis import CompactBasis
+
+
+def basis_bandwidth(basis: Any) -> int:
+    """Compute the bandwidth of the matrix `basis @ basis.T`.
+
+    The bandwidth is the largest distance between two non-zero basis functions
+    for the same observation.
+
+    Parameters
+    ----------
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        An array of shape `(n_basis, n_obs)` containing the basis matrix.
+
+    Returns
+    -------
+    int
+        The bandwidth of `basis @ basis.T`.
+
+    """
+    if isinstance(basis, CompactBasis):
+        return int(basis.values.shape[1] - 1)
+    if sparse.issparse(basis):
+        basis = basis.tocoo()
+        if basis.nnz == 0:
+            return 0
+        first = np.full(basis.shape[1], basis.shape[0])
+        last = np.full(basis.shape[1], -1)
+        np.minimum.at(first, basis.col, basis.row)
+        np.maximum.at(last, basis.col, basis.row)
+        return int(np.max(last - first, initial=0))
+    is_nonzero = basis != 0
+    first = np.argmax(is_nonzero, axis=0)
+    last = basis.shape[0] - 1 - np.argmax(is_nonzero[::-1], axis=0)
+    return int(np.max((last - first)[np.any(is_nonzero, axis=0)], initial=0))
+
+
+def to_banded(
+    mat: npt.NDArray[np.float_], bandwidth: int
+) -> npt.NDArray[np.float_]:
+    """Convert a symmetric matrix to upper banded storage.
+
+    The matrix is stored in the LAPACK upper form, such that
+    `banded[bandwidth + i - j, j] = mat[i, j]` for `i <= j`. This is the
+    format expected by :func:`scipy.linalg.cholesky_banded`.
+
+    Parameters
+    ----------
+    mat: npt.NDArray[np.float_]
+        A symmetric matrix of shape `(m, m)`.
+    bandwidth: int
+        The number of super-diagonals to store.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        An array of shape `(bandwidth + 1, m)`.
+
+    Examples
+    --------
+    >>> mat = np.array([[2., -1., 0.], [-1., 2., -1.], [0., -1., 2.]])
+    >>> to_banded(mat, 1)
+    array([
+        [ 0., -1., -1.],
+        [ 2.,  2.,  2.]
+    ])
+
+    """
+    banded = np.zeros((bandwidth + 1, mat.shape[0]))
+    for k in range(min(bandwidth + 1, mat.shape[0])):
+        banded[bandwidth - k, k:] = np.diagonal(mat, offset=k)
+    return banded
+
+
+def sparse_to_banded(mat: Any) -> npt.NDArray[np.float_]:
+    """Convert a symmetric sparse matrix to upper banded storage.
+
+    The bandwidth is the largest distance between a stored entry of the upper
+    triangle and the diagonal, such that the dense matrix is never formed.
+
+    Parameters
+    ----------
+    mat: scipy.sparse.sparray
+        A symmetric sparse matrix of shape `(m, m)`.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        An array of shape `(bandwidth + 1, m)`, see :func:`to_banded`.
+
+    """
+    upper = sparse.triu(mat, format="coo")
+    upper.sum_duplicates()
+    bandwidth = int(np.max(upper.col - upper.row, initial=0))
+    banded = np.zeros((bandwidth + 1, mat.shape[0]))
+    banded[bandwidth + upper.row - upper.col, upper.col] = upper.data
+    return banded
+
+
+def from_banded(banded: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
+    """Convert a symmetric matrix in upper banded storage to a dense matrix.
+
+    Parameters
+    ----------
+    banded: npt.NDArray[np.float_]
+        An array of shape `(bandwidth + 1, m)`, see :func:`to_banded`.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        A symmetric matrix of shape `(m, m)`.
+
+    """
+    bandwidth, n_basis = banded.shape[0] - 1, banded.shape[1]
+    mat = np.diag(banded[bandwidth])
+    for k in range(1, min(bandwidth + 1, n_basis)):
+        off_diagonal = np.diag(banded[bandwidth - k, k:], k=k)
+        mat = mat + off_diagonal + off_diagonal.T
+    return mat
+
+
+def banded_cross_products(
+    basis: Any,
+    data: npt.NDArray[np.float_],
+    sample_weights: npt.NDArray[np.float_],
+    bandwidth: int,
+) -> tuple[npt.NDArray[np.float_], npt.NDArray[np.float_]]:
+    """Compute `B'WB` in banded storage and `B'Wy`.
+
+    The weights matrix `W` is never formed. For a compact basis, the cost is
+    `O(n_obs * degree**2)`.
+
+    Parameters
+    ----------
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        An array of shape `(n_basis, n_obs)` containing the basis matrix.
+    data: npt.NDArray[np.float_]
+        An array of shape `(n_obs,)` or `(n_obs, n_outputs)` containing the
+        response variable values.
+    sample_weights: npt.NDArray[np.float_]
+        A one-dimensional array of shape `(n_obs,)` containing the weights for
+        each observation.
+    bandwidth: int
+        The number of super-diagonals to store. It must be larger than the
+        bandwidth of the basis, see :func:`basis_bandwidth`.
+
+    Returns
+    -------
+    tuple[npt.NDArray[np.float_], npt.NDArray[np.float_]]
+        The matrix `B'WB` in upper banded storage, of shape
+        `(bandwidth + 1, n_basis)`, and `B'Wy` of shape `(n_basis,)` or
+        `(n_basis, n_outputs)`.
+
+    """
+    n_basis = basis.shape[0]
+    bwb_band = np.zeros((bandwidth + 1, n_basis))
+    if isinstance(basis, CompactBasis):
+        n_values = basis.values.shape[1]
+        weighted_values = basis.values * sample_weights[:, np.newaxis]
+        for a in range(n_values):
+            for b in range(a, n_values):
+                bwb_band[bandwidth - b + a] += np.bincount(
+                    basis.starts + b,
+                    weights=weighted_values[:, a] * basis.values[:, b],
+                    minlength=n_basis,
+                )
+        if data.ndim > 1:
+            bwy_mat = basis.tosparse() @ (sample_weights[:, np.newaxis] * data)
+        else:
+            bwy_mat = np.bincount(
+                basis.indices.ravel(),
+                weights=(weighted_values * data[:, np.newaxis]).ravel(),
+                minlength=n_basis,
+            ).astype(np.float_)
+    elif sparse.issparse(basis):
+        weighted_basis = basis.multiply(sample_weights).tocsr()
+        bwb_mat = weighted_basis @ basis.T
+        for k in range(min(bandwidth + 1, n_basis)):
+            bwb_band[bandwidth - k, k:] = bwb_mat.diagonal(k)
+        bwy_mat = weighted_basis @ data
+    else:
+        weighted_basis = basis * sample_weights
+        for k in range(min(bandwidth + 1, n_basis)):
+            bwb_band[bandwidth - k, k:] = np.einsum(
+                "ij,ij->i", weighted_basis[: n_basis - k], basis[k:]
+            )
+        bwy_mat = weighted_basis @ data
+    return bwb_band, bwy_mat
+
+
+def banded_dot(
+    banded: npt.NDArray[np.float_], vec: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    """Multiply a symmetric matrix in upper banded storage by a vector.
+
+    Parameters
+    ----------
+    banded: npt.NDArray[np.float_]
+        A symmetric matrix in upper banded storage, of shape
+        `(bandwidth + 1, m)`, see :func:`to_banded`.
+    vec: npt.NDArray[np.float_]
+        An array of shape `(m,)` or `(m, k)`.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        The product, of the shape of `vec`.
+
+    """
+    bandwidth, n_basis = banded.shape[0] - 1, banded.shape[1]
+    vec = np.asarray(vec, dtype=np.float_)
+    band = banded.reshape(banded.shape + (1,) * (vec.ndim - 1))
+    result: npt.NDArray[np.float_] = band[bandwidth] * vec
+    for k in range(1, min(bandwidth + 1, n_basis)):
+        result[:-k] += band[bandwidth - k, k:] * vec[k:]
+        result[k:] += band[bandwidth - k, k:] * vec[:-k]
+    return result
+
+
+def cholesky_solve_banded(
+    banded: npt.NDArray[np.float_], rhs: npt.NDArray[np.float_]
+) -> tuple[npt.NDArray[np.float_], npt.NDArray[np.float_]]:
+    """Solve a symmetric positive definite banded system.
+
+    Parameters
+    ----------
+    banded: npt.NDArray[np.float_]
+        The matrix of the system in upper banded storage, of shape
+        `(bandwidth + 1, m)`.
+    rhs: npt.NDArray[np.float_]
+        The right-hand side of the system, of shape `(m,)` or `(m, k)`.
+
+    Returns
+    -------
+    tuple[npt.NDArray[np.float_], npt.NDArray[np.float_]]
+        The solution of the system and the upper Cholesky factor in banded
+        storage.
+
+    Raises
+    ------
+    numpy.linalg.LinAlgError
+        If the matrix is not positive definite.
+
+    """
+    chol = cholesky_banded(banded, lower=False)
+    return cho_solve_banded((chol, False), rhs), chol
+
+
+def band_entries(
+    banded: npt.NDArray[np.float_],
+    rows: npt.NDArray[np.int_],
+    cols: npt.NDArray[np.int_],
+) -> npt.NDArray[np.float_]:
+    """Get the entries `(rows, cols)` of a symmetric banded matrix.
+
+    Parameters
+    ----------
+    banded: npt.NDArray[np.float_]
+        A symmetric matrix in upper banded storage, of shape
+        `(bandwidth + 1, m)`, see :func:`to_banded`.
+    rows: npt.NDArray[np.int_]
+        The row indices of the entries.
+    cols: npt.NDArray[np.int_]
+        The column indices of the entries, broadcastable with `rows`. The
+        entries must lie within the band.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        The entries, of the broadcast shape of `rows` and `cols`.
+
+    """
+    bandwidth = banded.shape[0] - 1
+    low, high = np.minimum(rows, cols), np.maximum(rows, cols)
+    return banded[bandwidth + low - high, high]  # type: ignore
+
+
+def selected_inverse_banded(
+    chol: npt.NDArray[np.float_], block_size: int = 64
+) -> npt.NDArray[np.float_]:
+    """Compute the band of the inverse of a symmetric banded matrix.
+
+    Given the upper Cholesky factor `U` of a matrix `A = U'U`, the entries of
+    `A^{-1}` within the band of `A` are computed with the Takahashi recursions
+    (see [1]_), from the last block of `block_size` columns to the first one.
+    The inverse over a block and the `bandwidth` following columns is kept as
+    a dense window, such that each block is a matrix product with the window
+    rather than a gather from the band. The cost is `O(m * bandwidth**2)` and
+    the full inverse is never formed.
+
+    Parameters
+    ----------
+    chol: npt.NDArray[np.float_]
+        The upper Cholesky factor in upper banded storage, of shape
+        `(bandwidth + 1, m)`, as returned by :func:`cholesky_solve_banded`.
+    block_size: int, default=64
+        The number of columns computed at once.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        The band of the inverse in upper banded storage, of shape
+        `(bandwidth + 1, m)`.
+
+    References
+    ----------
+    .. [1] Hutchinson, M. F., de Hoog, F. R. (1985), Smoothing noisy data with
+        spline functions. Numerische Mathematik 47, pp.99--106.
+
+    """
+    bandwidth, n_basis = chol.shape[0] - 1, chol.shape[1]
+    # The factor is padded with an identity after the last column, whose
+    # inverse starts the window.
+    chol = np.hstack([chol, np.zeros((bandwidth + 1, bandwidth))])
+    chol[bandwidth, n_basis:] = 1
+    inv_band = np.zeros_like(chol)
+    inv_next = np.eye(bandwidth)
+    stop = n_basis
+    while stop > 0:
+        start = max(stop - block_size, 0)
+        size = stop - start
+        rows = np.arange(start, stop)[:, np.newaxis]
+        cols = np.arange(start, stop + bandwidth)[np.newaxis, :]
+        offsets = cols - rows
+        inside = (offsets >= 0) & (offsets <= bandwidth)
+        # The rows of `U` over the block and the window, as a dense matrix.
+        u_rows = np.where(
+            inside, chol[np.clip(bandwidth - offsets, 0, bandwidth), cols], 0
+        )
+        u_block, u_next = u_rows[:, :size], u_rows[:, size:]
+
+        # Entries between the block and the following columns.
+        inv_cross = -solve_triangular(u_block, u_next @ inv_next)
+        cross = u_next @ inv_cross.T
+
+        # Entries within the block, row by row.
+        inv_block = np.empty((size, size))
+        for i in range(size - 1, -1, -1):
+            u_ii, u_row = u_block[i, i], u_block[i, i + 1 :]
+            inv_row = -(cross[i, i + 1 :] + u_row @ inv_block[i + 1 :, i + 1 :])
+            inv_row /= u_ii
+            inv_block[i, i + 1 :], inv_block[i + 1 :, i] = inv_row, inv_row
+            inv_block[i, i] = (1 / u_ii - cross[i, i] - u_row @ inv_row) / u_ii
+
+        inv_rows = np.hstack([inv_block, inv_cross])
+        inv_band[
+            (bandwidth - offsets)[inside],
+            np.broadcast_to(cols, offsets.shape)[inside],
+        ] = inv_rows[inside]
+
+        # Slide the window to the first `bandwidth` columns of the block.
+        if size >= bandwidth:
+            inv_next = inv_block[:bandwidth, :bandwidth].copy()
+        else:
+            window = np.empty((bandwidth, bandwidth))
+            window[:size, :size] = inv_block
+            window[:size, size:] = inv_cross[:, : bandwidth - size]
+            window[size:, :size] = inv_cross[:, : bandwidth - size].T
+            window[size:, size:] = inv_next[
+                : bandwidth - size, : bandwidth - size
+            ]
+            inv_next = window
+        stop = start
+    return inv_band[:, :n_basis]
+
+
+def banded_quadratic_diagonal(
+    basis: Any, banded: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    """Compute the diagonal of `basis.T @ mat @ basis` for a banded `mat`.
+
+    Only the entries of `mat` within the bandwidth of the basis are used, such
+    that the band returned by :func:`selected_inverse_banded` is enough.
+
+    Parameters
+    ----------
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        An array of shape `(n_basis, n_obs)` containing the basis matrix.
+    banded: npt.NDArray[np.float_]
+        A symmetric matrix in upper banded storage, of shape
+        `(bandwidth + 1, n_basis)`. The bandwidth must be larger than the
+        bandwidth of the basis.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        A one-dimensional array of shape `(n_obs,)`.
+
+    """
+    if isinstance(basis, CompactBasis):
+        indices = basis.indices
+        blocks = band_entries(
+            banded, indices[:, :, np.newaxis], indices[:, np.newaxis, :]
+        )
+        return np.einsum(  # type: ignore
+            "ij,ijk,ik->i", basis.values, blocks, basis.values
+        )
+
+    bandwidth, n_basis = banded.shape[0] - 1, banded.shape[1]
+    if sparse.issparse(basis):
+        basis = basis.tocsr()
+    diagonal = np.zeros(basis.shape[1])
+    for k in range(min(bandwidth + 1, n_basis)):
+        weights = (1 if k == 0 else 2) * banded[bandwidth - k, k:]
+        if sparse.issparse(basis):
+            product = basis[: n_basis - k].multiply(basis[k:])
+            diagonal += np.asarray(product.T @ weights)
+        else:
+            diagonal += weights @ (basis[: n_basis - k] * basis[k:])
+    return diagonal
@@ -9,7 +9,7 @@ Basis functions
 import numpy as np
 import numpy.typing as npt
 
-from math import gamma
+from typing import Any, Literal, NamedTuple, overload
 
 
 def tpower(
@@ -38,13 +38,197 @@ def tpower(
     return res
 
 
+class CompactBasis(NamedTuple):
+    """Compact representation of a B-splines basis.
+
+    Each observation only has `degree + 1` non-zero B-splines, which are
+    consecutive. The basis is thus stored as the values of these B-splines and
+    the index of the first one.
+
+    Attributes
+    ----------
+    values: npt.NDArray[np.float_], shape=(n_obs, degree + 1)
+        The values of the non-zero B-splines for each observation.
+    starts: npt.NDArray[np.int_], shape=(n_obs,)
+        The index of the first non-zero B-splines for each observation.
+    n_functions: int
+        The number of B-splines in the basis.
+
+    """
+
+    values: npt.NDArray[np.float_]
+    starts: npt.NDArray[np.int_]
+    n_functions: int
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Shape of the equivalent dense basis, `(n_functions, n_obs)`."""
+        return self.n_functions, self.values.shape[0]
+
+    @property
+    def indices(self) -> npt.NDArray[np.int_]:
+        """Indices of the non-zero B-splines, shape `(n_obs, degree + 1)`."""
+        return self.starts[:, np.newaxis] + np.arange(self.values.shape[1])
+
+    def dot(self, coefs: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
+        """Compute the linear combination of the B-splines.
+
+        Parameters
+        ----------
+        coefs: npt.NDArray[np.float_], shape=(n_functions, ...)
+            The coefficients of the B-splines.
+
+        Returns
+        -------
+        npt.NDArray[np.float_], shape=(n_obs, ...)
+            The evaluation of the linear combination at each observation.
+
+        """
+        return np.einsum(  # type: ignore
+            "ij,ij...->i...", self.values, coefs[self.indices]
+        )
+
+    def toarray(self) -> npt.NDArray[np.float_]:
+        """Convert the basis to a dense array.
+
+        Returns
+        -------
+        npt.NDArray[np.float_], shape=(n_functions, n_obs)
+            The dense B-splines basis.
+
+        """
+        n_obs = self.values.shape[0]
+        basis = np.zeros((self.n_functions, n_obs))
+        basis[self.indices, np.arange(n_obs)[:, np.newaxis]] = self.values
+        return basis
+
+    def tosparse(self, format: str = "csr") -> Any:
+        """Convert the basis to a sparse matrix.
+
+        Parameters
+        ----------
+        format: str, default="csr"
+            The sparse format of the output, e.g. `"csr"` or `"csc"`.
+
+        Returns
+        -------
+        scipy.sparse.sparray, shape=(n_functions, n_obs)
+            The sparse B-splines basis.
+
+        """
+        from scipy import sparse
+
+        n_obs, n_values = self.values.shape
+        basis = sparse.coo_array(
+            (
+                self.values.ravel(),
+                (
+                    self.indices.ravel(),
+                    np.repeat(np.arange(n_obs), n_values),
+                ),
+            ),
+            shape=self.shape,
+        ).asformat(format)
+        basis.eliminate_zeros()
+        return basis
+
+
+def _local_bsplines(
+    argvals: npt.NDArray[np.float_],
+    n_functions: int,
+    degree: int,
+    domain_min: float,
+    domain_max: float,
+) -> CompactBasis:
+    """Evaluate the non-zero B-splines at each observation.
+
+    The B-splines are evaluated with the Cox-de Boor recursion (see [1]_,
+    Algorithm A2.2), vectorized over the observations. As the knots are evenly
+    spaced, the recursion only depends on the position of the observations
+    within their segment.
+
+    References
+    ----------
+    .. [1] Piegl, L., Tiller, W. (1997) The NURBS Book. Springer, Berlin.
+
+    """
+    argvals = np.asarray(argvals, dtype=np.float_).ravel()
+    n_segments = n_functions - degree
+    dx = (domain_max - domain_min) / n_segments
+
+    position = (argvals - domain_min) / dx
+    segments = np.floor(position)
+    u = position - segments
+    segments = segments.astype(np.int_)
+
+    values = np.zeros((len(argvals), degree + 1))
+    values[:, 0] = 1
+    for j in range(1, degree + 1):
+        saved = np.zeros_like(u)
+        for r in range(j):
+            temp = values[:, r] / j
+            values[:, r] = saved + (r + 1 - u) * temp
+            saved = (u + j - r - 1) * temp
+        values[:, j] = saved
+
+    # The B-splines `segments + r` that are not in the basis are discarded, and
+    # the remaining ones are shifted such that the indices are always valid.
+    starts = np.clip(segments, 0, n_segments - 1)
+    columns = np.arange(degree + 1) + (starts - segments)[:, np.newaxis]
+    is_valid = (columns >= 0) & (columns <= degree)
+    values = np.where(
+        is_valid,
+        np.take_along_axis(values, np.clip(columns, 0, degree), axis=1),
+        0,
+    )
+    return CompactBasis(values=values, starts=starts, n_functions=n_functions)
+
+
+@overload
+def basis_bsplines(
+    argvals: npt.NDArray[np.float_],
+    n_functions: int = ...,
+    degree: int = ...,
+    domain_min: float | None = ...,
+    domain_max: float | None = ...,
+    *,
+    format: Literal["dense"] = ...,
+) -> npt.NDArray[np.float_]: ...
+
+
+@overload
+def basis_bsplines(
+    argvals: npt.NDArray[np.float_],
+    n_functions: int = ...,
+    degree: int = ...,
+    domain_min: float | None = ...,
+    domain_max: float | None = ...,
+    *,
+    format: Literal["compact"],
+) -> CompactBasis: ...
+
+
+@overload
+def basis_bsplines(
+    argvals: npt.NDArray[np.float_],
+    n_functions: int = ...,
+    degree: int = ...,
+    domain_min: float | None = ...,
+    domain_max: float | None = ...,
+    *,
+    format: str,
+) -> Any: ...
+
+
 def basis_bsplines(
     argvals: npt.NDArray[np.float_],
     n_functions: int = 10,
     degree: int = 3,
     domain_min: float | None = None,
     domain_max: float | None = None,
-) -> npt.NDArray[np.float_]:
+    *,
+    format: str = "dense",
+) -> Any:
     """Define a B-splines basis of functions.
 
     Build a basis of :math:`n_functions` functions using B-splines basis on the
@@ -65,17 +249,23 @@ def basis_bsplines(
     domain_max: float, default=None
         Maximum number for hte argvals. If `None`, the value is set to
         `max(argvals)`.
+    format: str, {"dense", "csr", "csc", "compact"}, default="dense"
+        The format of the output. `"dense"` returns a dense array, `"csr"` and
+        `"csc"` return a `scipy.sparse` array and `"compact"` returns a
+        `CompactBasis` containing only the non-zero values.
 
     Returns
     -------
     npt.NDArray[np.float64], shape=(n_functions, len(argvals))
         An array containing the evaluation of `n_functions` functions of a
-        B-splines basis.
+        B-splines basis. The type of the output depends on `format`.
 
     Notes
     -----
     This function is adapted from the `bbase` function in the R package `JOPS`
     _[2]. It computes a proper B-splines basis function (see _[1], Section 8.1).
+    Only the `degree + 1` non-zero B-splines are evaluated for each value of
+    `argvals`, such that the cost is linear in the number of observations.
 
     Examples
     --------
@@ -89,6 +279,12 @@ def basis_bsplines(
         (2023) JOPS: Practical Smoothing with P-Splines.
 
     """
+    if format not in ("dense", "csr", "csc", "compact"):
+        raise ValueError(
+            f"`format` must be one of 'dense', 'csr', 'csc' or 'compact', got "
+            f"'{format}'."
+        )
+
     # Set parameters
     if domain_min is None:
         domain_min = min(argvals)
@@ -96,23 +292,192 @@ def basis_bsplines(
         domain_max = max(argvals)
 
     # Compute the B-splines
-    n_segments = n_functions - degree
-    dx = (domain_max - domain_min) / n_segments
-    knots = np.linspace(
-        domain_min - degree * dx,
-        domain_max + degree * dx,
-        num=int(n_segments + 2 * degree) + 1,
-        endpoint=True,
+    basis = _local_bsplines(
+        argvals, n_functions, degree, domain_min, domain_max
+    )
+    if format == "compact":
+        return basis
+    if format == "dense":
+        return basis.toarray()
+    return basis.tosparse(format)
+
+
+def _tensor_product_rows(
+    bases: list[CompactBasis], rows: Any
+) -> tuple[npt.NDArray[np.float_], npt.NDArray[np.intp]]:
+    """Compute the non-zero tensor-product B-splines of some observations.
+
+    Returns the values and the raveled indices, of shape
+    `(n_rows, prod(degree_i + 1))`, of the non-zero products of B-splines.
+    """
+    n_functions = tuple(basis.n_functions for basis in bases)
+    strides = np.cumprod((1,) + n_functions[:0:-1])[::-1]
+    n_rows = len(bases[0].starts[rows])
+    weights = np.ones((n_rows, 1))
+    indices = np.zeros((n_rows, 1), dtype=np.intp)
+    for basis, stride in zip(bases, strides):
+        values = basis.values[rows]
+        local = basis.starts[rows, np.newaxis] + np.arange(values.shape[1])
+        weights = (weights[:, :, np.newaxis] * values[:, np.newaxis]).reshape(
+            n_rows, -1
+        )
+        indices = (
+            indices[:, :, np.newaxis] + stride * local[:, np.newaxis]
+        ).reshape(n_rows, -1)
+    return weights, indices
+
+
+def tensor_product_dot(
+    bases: list[CompactBasis],
+    coefs: npt.NDArray[np.float_],
+    chunk_size: int = 8192,
+) -> npt.NDArray[np.float_]:
+    """Evaluate a tensor-product spline at scattered points.
+
+    The `k`-th observation is the point whose coordinates are the `k`-th
+    observations of each basis. Only the `prod(degree_i + 1)` non-zero
+    products of B-splines are computed for each point, such that neither the
+    Cartesian grid of the coordinates nor the dense row tensor of the bases is
+    formed. The points are processed by chunks of `chunk_size` to bound the
+    memory.
+
+    Parameters
+    ----------
+    bases: list[CompactBasis]
+        The compact bases of each dimension, with the same number of
+        observations.
+    coefs: npt.NDArray[np.float_], shape=(n_functions_1, ..., n_functions_d)
+        The coefficients of the tensor-product B-splines. Trailing axes, if
+        any, are kept in the output.
+    chunk_size: int, default=8192
+        The number of points processed at once.
+
+    Returns
+    -------
+    npt.NDArray[np.float_], shape=(n_obs, ...)
+        The evaluation of the spline at each point.
+
+    Examples
+    --------
+    >>> x = np.linspace(0, 1, 5)
+    >>> bases = [basis_bsplines(x, 4, 2, format="compact")] * 2
+    >>> tensor_product_dot(bases, np.ones((4, 4)))
+    array([1., 1., 1., 1., 1.])
+
+    """
+    n_functions = tuple(basis.n_functions for basis in bases)
+    n_obs = bases[0].values.shape[0]
+    if any(basis.values.shape[0] != n_obs for basis in bases):
+        raise ValueError("The bases must have the same number of observations.")
+    if coefs.shape[: len(bases)] != n_functions:
+        raise ValueError(
+            f"The shape of `coefs` must start with {n_functions}, got "
+            f"{coefs.shape}."
+        )
+    if chunk_size < 1:
+        raise ValueError(f"`chunk_size` must be positive, got {chunk_size}.")
+
+    trailing = coefs.shape[len(bases) :]
+    flat_coefs = coefs.reshape(int(np.prod(n_functions)), -1)
+    results = np.empty((n_obs, flat_coefs.shape[1]))
+    for start in range(0, n_obs, chunk_size):
+        rows = slice(start, start + chunk_size)
+        weights, indices = _tensor_product_rows(bases, rows)
+        np.einsum(
+            "ij,ijk->ik", weights, flat_coefs[indices], out=results[rows]
+        )
+    return results.reshape((n_obs,) + trailing)
+
+
+def tensor_product_gram(
+    bases: list[CompactBasis],
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    chunk_size: int = 8192,
+) -> Any:
+    """Compute the weighted Gram matrix of tensor-product B-splines.
+
+    The `k`-th observation is the point whose coordinates are the `k`-th
+    observations of each basis, as in :func:`tensor_product_dot`. The points
+    in the same cell of the grid of knots have the same `q = prod(degree_i +
+    1)` non-zero B-splines, such that their contribution to `B'WB` is a dense
+    `(q, q)` block, computed with a matrix product. The blocks are then
+    summed into a sparse matrix. The cost is `O(n_obs * q**2)` in BLAS,
+    instead of the same number of scalar products of a sparse product.
+
+    Parameters
+    ----------
+    bases: list[CompactBasis]
+        The compact bases of each dimension, with the same number of
+        observations.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        An array of shape `(n_obs,)` containing the weights for each
+        observation. If not provided, all observations are assumed to have
+        equal weight.
+    chunk_size: int, default=8192
+        The approximate number of points processed at once.
+
+    Returns
+    -------
+    scipy.sparse.csc_array
+        A sparse array of shape `(prod(n_functions_i), prod(n_functions_i))`.
+        The rows and columns are in the C order of the coefficients.
+
+    Examples
+    --------
+    >>> x = np.linspace(0, 1, 5)
+    >>> bases = [basis_bsplines(x, 4, 2, format="compact")] * 2
+    >>> tensor_product_gram(bases).sum()
+    5.0
+
+    """
+    from scipy import sparse
+
+    n_functions = tuple(basis.n_functions for basis in bases)
+    n_obs = bases[0].values.shape[0]
+    if any(basis.values.shape[0] != n_obs for basis in bases):
+        raise ValueError("The bases must have the same number of observations.")
+    if sample_weights is None:
+        sample_weights = np.ones(n_obs)
+    n_coefs = int(np.prod(n_functions))
+    if n_obs == 0:
+        return sparse.csc_array((n_coefs, n_coefs))
+
+    # Sort the observations by cell of the grid of knots.
+    cells = np.ravel_multi_index(
+        [basis.starts for basis in bases],
+        [basis.n_functions - basis.values.shape[1] + 1 for basis in bases],
     )
-    p_mat = tpower(argvals, knots, degree)
-    d_mat = np.diff(np.eye(p_mat.shape[1]), n=degree + 1, axis=0) / (
-        gamma(degree + 1) * np.power(dx, degree)
+    order = np.argsort(cells, kind="stable")
+    _, first = np.unique(cells[order], return_index=True)
+    last = np.append(first[1:], n_obs)
+
+    blocks, block_indices = [], []
+    start = 0
+    while start < len(first):
+        stop = max(
+            int(np.searchsorted(last, first[start] + chunk_size, "right")),
+            start + 1,
+        )
+        rows = order[first[start] : last[stop - 1]]
+        values, indices = _tensor_product_rows(bases, rows)
+        weighted = values * sample_weights[rows, np.newaxis]
+        for lower, upper in zip(
+            first[start:stop] - first[start], last[start:stop] - first[start]
+        ):
+            blocks.append(values[lower:upper].T @ weighted[lower:upper])
+            block_indices.append(indices[lower])
+        start = stop
+
+    block_indices_arr = np.array(block_indices)
+    _, q = block_indices_arr.shape
+    gram = sparse.coo_array(
+        (
+            np.array(blocks).ravel(),
+            (
+                np.repeat(block_indices_arr, q, axis=1).ravel(),
+                np.tile(block_indices_arr, (1, q)).ravel(),
+            ),
+        ),
+        shape=(n_coefs, n_coefs),
     )
-    basis_mat = np.power(-1, degree + 1) * p_mat @ d_mat.T
-
-    # Make B-splines exactly zero beyond their end knots
-    sk = knots[np.arange(basis_mat.shape[1]) + degree + 1]
-    mask = np.zeros((len(argvals), len(sk)))
-    for idx, val in enumerate(argvals):
-        mask[idx, :] = val < sk
-    return (basis_mat * mask).T  # type: ignore
+    return gram.tocsc()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Basis cache
+-----------
+
+"""
+
+import hashlib
+import threading
+
+import numpy as np
+import numpy.typing as npt
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from .basis import CompactBasis
+
+
+def basis_nbytes(basis: Any) -> int:
+    """Compute the memory footprint of a basis.
+
+    Parameters
+    ----------
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        An array of shape `(n_basis, n_obs)` containing the basis matrix.
+
+    Returns
+    -------
+    int
+        The number of bytes used by the arrays of the basis.
+
+    """
+    if isinstance(basis, CompactBasis):
+        return int(basis.values.nbytes + basis.starts.nbytes)
+    if isinstance(basis, np.ndarray):
+        return int(basis.nbytes)
+    return int(
+        sum(
+            getattr(basis, name).nbytes
+            for name in ("data", "indices", "indptr", "row", "col")
+            if hasattr(basis, name)
+        )
+    )
+
+
+def _freeze(basis: Any) -> Any:
+    """Make the arrays of a basis read-only, such that it can be shared."""
+    if isinstance(basis, CompactBasis):
+        arrays = [basis.values, basis.starts]
+    elif isinstance(basis, np.ndarray):
+        arrays = [basis]
+    else:
+        arrays = [basis.data]
+    for array in arrays:
+        array.flags.writeable = False
+    return basis
+
+
+def fingerprint(argvals: npt.NDArray[np.float_]) -> str:
+    """Compute a fingerprint of the evaluation points.
+
+    Parameters
+    ----------
+    argvals: npt.NDArray[np.float_]
+        An array containing the evaluation points.
+
+    Returns
+    -------
+    str
+        A digest of the shape, the dtype and the values of `argvals`.
+
+    """
+    argvals = np.ascontiguousarray(argvals)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{argvals.dtype.str}{argvals.shape}".encode())
+    digest.update(argvals.data)
+    return digest.hexdigest()
+
+
+class BasisCache:
+    """Bounded least recently used cache of evaluated bases.
+
+    The cache is thread-safe. The stored bases are made read-only, such that
+    they can be shared between calls. When the total size of the stored bases
+    exceeds `max_bytes`, the least recently used ones are evicted. A basis
+    larger than `max_bytes` is never stored.
+
+    Parameters
+    ----------
+    max_bytes: int
+        The maximum number of bytes of the stored bases.
+
+    Attributes
+    ----------
+    hits: int
+        The number of lookups that found a stored basis.
+    misses: int
+        The number of lookups that did not find a stored basis.
+    evictions: int
+        The number of bases evicted to free some space.
+    current_bytes: int
+        The number of bytes of the stored bases.
+
+    Examples
+    --------
+    >>> cache = BasisCache(max_bytes=2**20)
+    >>> basis = cache.get_or_compute("key", lambda: np.ones((3, 4)))
+    >>> cache.info()
+    {'hits': 0, 'misses': 1, 'evictions': 0, 'n_entries': 1,
+    'current_bytes': 96, 'max_bytes': 1048576}
+
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize BasisCache object."""
+        if max_bytes < 0:
+            raise ValueError(
+                f"`max_bytes` must be non-negative, got {max_bytes}."
+            )
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+
+    def __len__(self) -> int:
+        """Return the number of stored bases."""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check if a basis is stored, without updating the statistics."""
+        return key in self._entries
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Return the state to pickle, without the lock."""
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore the pickled state and create a new lock."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Get a stored basis.
+
+        Parameters
+        ----------
+        key: Hashable
+            The key of the basis.
+
+        Returns
+        -------
+        npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis | None
+            The stored basis, or `None` if it is not stored.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, basis: Any) -> Any:
+        """Store a basis and evict the least recently used ones if needed.
+
+        Parameters
+        ----------
+        key: Hashable
+            The key of the basis.
+        basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+            The basis to store. Its arrays are made read-only.
+
+        Returns
+        -------
+        npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+            The basis.
+
+        """
+        nbytes = basis_nbytes(basis)
+        if nbytes > self.max_bytes:
+            return basis
+        basis = _freeze(basis)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            while self.current_bytes + nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+            self._entries[key] = (basis, nbytes)
+            self.current_bytes += nbytes
+        return basis
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Get a stored basis, or compute and store it.
+
+        The lock is not held while the basis is computed, such that two
+        threads may compute the same basis concurrently. The result is the
+        same for both.
+
+        Parameters
+        ----------
+        key: Hashable
+            The key of the basis.
+        compute: Callable[[], Any]
+            A function without arguments that computes the basis.
+
+        Returns
+        -------
+        npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+            The basis.
+
+        """
+        basis = self.get(key)
+        if basis is None:
+            basis = self.put(key, compute())
+        return basis
+
+    def clear(self) -> None:
+        """Remove all the stored bases and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self) -> dict[str, int]:
+        """Get the statistics of the cache.
+
+        Returns
+        -------
+        dict[str, int]
+            The number of hits, misses and evictions, the number of stored
+            bases, their size in bytes and the maximum size.
+
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "n_entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
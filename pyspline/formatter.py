@@ -15,21 +15,34 @@ def format_X_y(
     X: npt.NDArray[np.float_],
     y: npt.NDArray[np.float_],
     weights: npt.NDArray[np.float_] | None = None,
+    bins: int | tuple[int, ...] | None = None,
 ) -> tuple[
     list[npt.NDArray[np.float_]], npt.NDArray[np.float_], npt.NDArray[np.float_]
 ]:
     """Input formatter for multidimensional estimator.
 
+    The scattered observations are put on the grid defined by the unique values
+    of each column of `X`, or by `bins` evenly spaced points in each dimension.
+    The observations that fall on the same grid point are replaced by their
+    weighted mean, with a weight equal to the sum of their weights, which gives
+    the same penalized least squares fit. The grid points without observation
+    have a weight of 0. The cost is `O(n_obs * log(n_obs))`.
+
     Parameters
     ----------
     X: npt.NDArray[np.float_], shape=(n_obs, n_dimension)
         An array containing the predictor variable values.
-    y: npt.NDArray[np.float_], shape=(n_obs,)
-        An array containing the response variable values.
+    y: npt.NDArray[np.float_], shape=(n_obs,) or (n_obs, n_outputs)
+        An array containing the response variable values. Each output is put
+        on the grid, along a trailing axis.
     weights: npt.NDArray[np.float_] | None, default=None
-        An array containing the sampled weights with the same shape as `y`. If
-        `None`, the weights are set to 1 for the observed values and 0
-        otherwise.
+        An array of shape `(n_obs,)` containing the sampled weights, shared by
+        all the outputs. If `None`, the weights are set to 1.
+    bins: int | tuple[int, ...] | None, default=None
+        The number of evenly spaced grid points in each dimension, between the
+        minimum and the maximum of each column of `X`. The observations are
+        snapped to the nearest grid point. If `None`, the grid is defined by
+        the unique values of each column of `X`.
 
     Returns
     -------
@@ -41,18 +54,48 @@ def format_X_y(
         A tuple containing the formatted X, y and an array of weights.
 
     """
-    new_X = [np.unique(column) for column in X.T]
-    X_matrices = np.meshgrid(*new_X, indexing="ij")
+    X = np.asarray(X)
+    y = np.asarray(y, dtype=np.float_)
+    if weights is None:
+        weights = np.ones(y.shape[:1])
+    weights = np.asarray(weights, dtype=np.float_)
+    if weights.shape != y.shape[:1]:
+        raise ValueError("`weights` must have the shape `(n_obs,)`.")
+    n_bins = None if bins is None else np.broadcast_to(bins, X.shape[1])
 
-    new_y = np.zeros_like(X_matrices[0])
-    for x, obs in zip(X, y):
-        indices = tuple(
-            np.flatnonzero(points == point)[0]
-            for point, points in zip(x, new_X)
-        )
-        new_y[indices] = obs
+    new_X, indices = [], []
+    for idx, column in enumerate(X.T):
+        if n_bins is None:
+            points, inverse = np.unique(column, return_inverse=True)
+        else:
+            points = np.linspace(np.min(column), np.max(column), n_bins[idx])
+            step = points[-1] - points[0]
+            step = step / (len(points) - 1) if step > 0 else 1.0
+            inverse = np.rint((column - points[0]) / step)
+            inverse = np.clip(inverse, 0, len(points) - 1).astype(np.intp)
+        new_X.append(points)
+        indices.append(inverse.ravel())
+    shape = tuple(len(points) for points in new_X)
 
-    if weights is None:
-        weights = np.ones_like(new_y)
-        weights[new_y == 0] = 0
-    return new_X, new_y, weights
+    # Accumulate the weighted sums on the grid.
+    flat_indices = np.ravel_multi_index(indices, shape)
+    sum_weights = np.bincount(
+        flat_indices, weights=weights, minlength=np.prod(shape)
+    ).astype(np.float_)
+    sum_y = np.stack(
+        [
+            np.bincount(
+                flat_indices, weights=weights * column, minlength=np.prod(shape)
+            )
+            for column in y.reshape(len(y), -1).T
+        ],
+        axis=-1,
+    )
+    new_y = np.zeros(sum_y.shape)
+    counts = sum_weights[:, np.newaxis]
+    np.divide(sum_y, counts, out=new_y, where=counts > 0)
+    return (
+        new_X,
+        new_y.reshape(shape + y.shape[1:]),
+        sum_weights.reshape(shape),
+    )
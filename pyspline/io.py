@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Model files
+-----------
+
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+import numpy.typing as npt
+
+from typing import Any
+
+FORMAT_VERSION = 1
+
+_METADATA = "metadata"
+
+# The size of the fixed part of the local file header of a ZIP member.
+_LOCAL_HEADER_SIZE = 30
+
+
+def _json_default(value: Any) -> Any:
+    """Convert the numpy values of the metadata for JSON."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable.")
+
+
+def save_arrays(
+    path: str | os.PathLike[str],
+    arrays: dict[str, npt.NDArray[Any]],
+    metadata: dict[str, Any],
+) -> None:
+    """Save arrays and their metadata to an uncompressed `.npz` file.
+
+    The members of the file are stored without compression, such that they
+    can be memory-mapped by :func:`load_arrays`. The metadata are saved as a
+    JSON string, such that the file is loaded without `pickle`.
+
+    Parameters
+    ----------
+    path: str | os.PathLike[str]
+        The path of the file. No extension is appended.
+    arrays: dict[str, npt.NDArray[Any]]
+        The arrays to save, by name. Object arrays are not supported.
+    metadata: dict[str, Any]
+        The metadata to save. They must be serializable to JSON, up to numpy
+        arrays and scalars, which are converted to lists and numbers.
+
+    """
+    if _METADATA in arrays:
+        raise ValueError(f"'{_METADATA}' is a reserved array name.")
+    members = {name: np.asarray(array) for name, array in arrays.items()}
+    if any(array.dtype.hasobject for array in members.values()):
+        raise ValueError("Object arrays can not be saved.")
+    metadata = dict(metadata, format_version=FORMAT_VERSION)
+    members[_METADATA] = np.array(
+        json.dumps(metadata, default=_json_default)
+    )
+    with open(path, "wb") as file:
+        np.savez(file, **members)
+
+
+def _memmap_member(
+    path: str | os.PathLike[str], file: Any, info: zipfile.ZipInfo
+) -> npt.NDArray[Any] | None:
+    """Memory-map a stored `.npy` member of a ZIP file.
+
+    Returns `None` if the member can not be memory-mapped, i.e. if it is
+    compressed, empty or zero-dimensional.
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    # The data of the member follow its local header, whose name and extra
+    # fields may differ from the central directory.
+    file.seek(info.header_offset)
+    header = file.read(_LOCAL_HEADER_SIZE)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    file.seek(
+        info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+    )
+    version = np.lib.format.read_magic(file)  # type: ignore
+    if version == (1, 0):
+        read_header = np.lib.format.read_array_header_1_0
+    else:
+        read_header = np.lib.format.read_array_header_2_0
+    shape, fortran_order, dtype = read_header(file)  # type: ignore
+    offset = file.tell()
+    if dtype.hasobject or len(shape) == 0 or int(np.prod(shape)) == 0:
+        return None
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        offset=offset,
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+def load_arrays(
+    path: str | os.PathLike[str],
+    mmap: bool = True,
+    names: list[str] | None = None,
+) -> tuple[dict[str, Any], dict[str, npt.NDArray[Any]]]:
+    """Load the arrays and the metadata saved by :func:`save_arrays`.
+
+    Parameters
+    ----------
+    path: str | os.PathLike[str]
+        The path of the file.
+    mmap: bool, default=True
+        If `True`, the arrays are read-only memory maps of the file, such that
+        they are read from the disk on their first use and shared between the
+        processes that load the same file. Otherwise, they are read in memory.
+    names: list[str] | None, default=None
+        The names of the arrays to load. If not provided, all the arrays are
+        loaded.
+
+    Returns
+    -------
+    tuple[dict[str, Any], dict[str, npt.NDArray[Any]]]
+        The metadata and the arrays, by name.
+
+    """
+    arrays: dict[str, npt.NDArray[Any]] = {}
+    with open(path, "rb") as raw, zipfile.ZipFile(raw) as archive:
+        infos = {
+            info.filename[: -len(".npy")]: info
+            for info in archive.infolist()
+            if info.filename.endswith(".npy")
+        }
+        if _METADATA not in infos:
+            raise ValueError(f"'{path}' is not a pyspline model file.")
+        with archive.open(infos.pop(_METADATA)) as file:
+            metadata = json.loads(
+                str(
+                    np.lib.format.read_array(  # type: ignore
+                        file, allow_pickle=False
+                    )
+                )
+            )
+        if metadata.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported format version "
+                f"{metadata.get('format_version')}, expected "
+                f"{FORMAT_VERSION}."
+            )
+        for name, info in infos.items():
+            if names is not None and name not in names:
+                continue
+            array = _memmap_member(path, raw, info) if mmap else None
+            if array is None:
+                with archive.open(info) as file:
+                    array = np.lib.format.read_array(  # type: ignore
+                        file, allow_pickle=False
+                    )
+            arrays[name] = array
+    return metadata, arrays
@@ -0,0 +1,532 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Difference penalties
+--------------------
+
+"""
+
+from __future__ import annotations
+
+import functools
+import string
+
+import numpy as np
+import numpy.typing as npt
+
+from math import comb
+from typing import Any, Sequence
+
+from .banded import from_banded
+
+_FORMATS = ("dense", "sparse", "banded")
+
+
+def _check_arguments(n_basis: int, order: int, format: str) -> None:
+    """Check the arguments of the penalty builders."""
+    if format not in _FORMATS:
+        raise ValueError(
+            f"`format` must be 'dense', 'sparse' or 'banded', got '{format}'."
+        )
+    if order < 0:
+        raise ValueError(f"`order` must be non-negative, got {order}.")
+
+
+def _freeze(mat: Any) -> Any:
+    """Make a memoized matrix read-only, such that it can be shared."""
+    array = mat if isinstance(mat, np.ndarray) else mat.data
+    array.flags.writeable = False
+    return mat
+
+
+def difference_coefficients(order: int) -> npt.NDArray[np.float_]:
+    """Compute the coefficients of the difference operator of a given order.
+
+    Parameters
+    ----------
+    order: int
+        The order of the differences.
+
+    Returns
+    -------
+    npt.NDArray[np.float_], shape=(order + 1,)
+        The coefficients `(-1)**(order - j) * comb(order, j)`, such that the
+        difference of order `order` of `beta` at `i` is
+        `sum_j coefs[j] * beta[i + j]`.
+
+    Examples
+    --------
+    >>> difference_coefficients(2)
+    array([ 1., -2.,  1.])
+
+    """
+    return np.array(
+        [(-1) ** (order - j) * comb(order, j) for j in range(order + 1)],
+        dtype=np.float_,
+    )
+
+
+@functools.lru_cache(maxsize=128)
+def difference_matrix(
+    n_basis: int, order: int = 2, format: str = "dense"
+) -> Any:
+    """Build the difference matrix `D` of a given order.
+
+    The matrix is built from its diagonals, without the dense identity of
+    `np.diff(np.eye(n_basis), n=order, axis=0)`. The results are memoized by
+    `(n_basis, order, format)` and are read-only.
+
+    Parameters
+    ----------
+    n_basis: int
+        The number of basis functions.
+    order: int, default=2
+        The order of the differences.
+    format: str, {"dense", "sparse"}, default="dense"
+        The format of the matrix. `"sparse"` returns a `scipy.sparse`
+        CSR array.
+
+    Returns
+    -------
+    npt.NDArray[np.float_] | scipy.sparse.csr_array
+        The difference matrix of shape `(n_basis - order, n_basis)`, with no
+        rows if `n_basis <= order`.
+
+    Examples
+    --------
+    >>> difference_matrix(4, 2)
+    array([[ 1., -2.,  1.,  0.],
+           [ 0.,  1., -2.,  1.]])
+
+    """
+    if format == "banded":
+        raise ValueError("`format` must be 'dense' or 'sparse', got 'banded'.")
+    _check_arguments(n_basis, order, format)
+    from scipy import sparse
+
+    coefs = difference_coefficients(order)
+    n_rows = max(n_basis - order, 0)
+    if n_rows == 0:
+        diff_mat = sparse.csr_array((0, n_basis))
+    else:
+        diff_mat = sparse.diags_array(
+            [np.full(n_rows, coef) for coef in coefs],
+            offsets=list(range(order + 1)),
+            shape=(n_rows, n_basis),
+            format="csr",
+        )
+    if format == "dense":
+        return _freeze(diff_mat.toarray())
+    return _freeze(diff_mat)
+
+
+def _penalty_band(
+    n_basis: int,
+    order: int,
+    weights: npt.NDArray[np.float_] | None = None,
+) -> npt.NDArray[np.float_]:
+    """Compute `D'WD` in upper banded storage, with `order` super-diagonals.
+
+    The entry `(i, i + k)` is `sum_r w[r] D[r, i] D[r, i + k]`, where the row
+    `r = i - j` of `D` has the coefficient `coefs[j]` at column `i`.
+    """
+    coefs = difference_coefficients(order)
+    n_rows = max(n_basis - order, 0)
+    if weights is None:
+        weights = np.ones(n_rows)
+    band = np.zeros((order + 1, n_basis))
+    for k in range(order + 1):
+        for j in range(order + 1 - k):
+            # The rows `r = i - j` of `D` with `0 <= r < n_rows`.
+            band[order - k, j + k : j + k + n_rows] += (
+                coefs[j] * coefs[j + k] * weights
+            )
+    return band
+
+
+@functools.lru_cache(maxsize=128)
+def penalty_matrix(
+    n_basis: int, order: int = 2, format: str = "dense"
+) -> Any:
+    """Build the difference penalty matrix `D'D` of a given order.
+
+    The matrix is banded, with `order` super-diagonals, and is built from its
+    diagonals without forming `D`. The results are memoized by
+    `(n_basis, order, format)` and are read-only: scale them with
+    `penalty * mat`, not in place.
+
+    Parameters
+    ----------
+    n_basis: int
+        The number of basis functions.
+    order: int, default=2
+        The order of the differences.
+    format: str, {"dense", "sparse", "banded"}, default="dense"
+        The format of the matrix. `"sparse"` returns a `scipy.sparse` CSC
+        array and `"banded"` the upper banded storage of shape
+        `(order + 1, n_basis)`, see :func:`~pyspline.banded.to_banded`.
+
+    Returns
+    -------
+    npt.NDArray[np.float_] | scipy.sparse.csc_array
+        The penalty matrix of shape `(n_basis, n_basis)`, or its band.
+
+    Examples
+    --------
+    >>> penalty_matrix(4, 1)
+    array([[ 1., -1.,  0.,  0.],
+           [-1.,  2., -1.,  0.],
+           [ 0., -1.,  2., -1.],
+           [ 0.,  0., -1.,  1.]])
+
+    """
+    _check_arguments(n_basis, order, format)
+    return _freeze(_band_to_format(_penalty_band(n_basis, order), format))
+
+
+def _band_to_format(band: npt.NDArray[np.float_], format: str) -> Any:
+    """Convert an upper banded symmetric matrix to the given format."""
+    if format == "banded":
+        return band
+    if format == "dense":
+        return from_banded(band)
+    from scipy import sparse
+
+    bandwidth, n_basis = band.shape[0] - 1, band.shape[1]
+    # The diagonals beyond the matrix, if `n_basis <= bandwidth`, are empty.
+    n_diagonals = min(bandwidth, n_basis - 1)
+    diagonals = [band[bandwidth - k, k:] for k in range(1, n_diagonals + 1)]
+    return sparse.diags_array(
+        diagonals[::-1] + [band[bandwidth]] + diagonals,
+        offsets=list(range(-n_diagonals, n_diagonals + 1)),
+        shape=(n_basis, n_basis),
+        format="csc",
+    )
+
+
+def combined_penalty(
+    n_basis: int,
+    terms: Sequence[tuple[float, int]],
+    format: str = "dense",
+    weights: Sequence[npt.NDArray[np.float_] | None] | None = None,
+) -> Any:
+    """Build a sum of weighted difference penalties of several orders.
+
+    The penalty is `sum_k penalty_k * D_k' W_k D_k`, where `D_k` is the
+    difference matrix of order `order_k` and `W_k` is the diagonal matrix of
+    the weights of its rows. The sum is accumulated in banded storage, with
+    the largest order as bandwidth, such that no dense intermediate is
+    formed. It is not memoized, as the weights are arrays.
+
+    Parameters
+    ----------
+    n_basis: int
+        The number of basis functions.
+    terms: Sequence[tuple[float, int]]
+        The pairs `(penalty, order)` of the terms of the sum.
+    format: str, {"dense", "sparse", "banded"}, default="dense"
+        The format of the matrix, see :func:`penalty_matrix`.
+    weights: Sequence[npt.NDArray[np.float_] | None] | None, default=None
+        For each term, an array of shape `(n_basis - order,)` containing the
+        weights of the differences, or `None` for unit weights.
+
+    Returns
+    -------
+    npt.NDArray[np.float_] | scipy.sparse.csc_array
+        The penalty matrix of shape `(n_basis, n_basis)`, or its band of shape
+        `(max(order_k) + 1, n_basis)`.
+
+    Examples
+    --------
+    >>> combined_penalty(4, [(1.0, 1), (0.5, 2)], format="banded")
+    array([[ 0. ,  0. ,  0.5,  0.5],
+           [ 0. , -2. , -3. , -2. ],
+           [ 1.5,  4.5,  4.5,  1.5]])
+
+    """
+    if len(terms) == 0:
+        raise ValueError("`terms` must contain at least one term.")
+    if weights is None:
+        weights = [None] * len(terms)
+    if len(weights) != len(terms):
+        raise ValueError(
+            "`weights` must have the same length as `terms`, got "
+            f"{len(weights)} and {len(terms)}."
+        )
+    bandwidth = max(order for _, order in terms)
+    band = np.zeros((bandwidth + 1, n_basis))
+    for (penalty, order), term_weights in zip(terms, weights):
+        _check_arguments(n_basis, order, format)
+        if term_weights is not None:
+            term_weights = np.asarray(term_weights, dtype=np.float_)
+            n_rows = max(n_basis - order, 0)
+            if term_weights.shape != (n_rows,):
+                raise ValueError(
+                    f"The weights of the term of order {order} must have the "
+                    f"shape {(n_rows,)}, got {term_weights.shape}."
+                )
+        band[bandwidth - order :] += penalty * _penalty_band(
+            n_basis, order, term_weights
+        )
+    return _band_to_format(band, format)
+
+
+class KroneckerSumPenalty:
+    """Penalty of a tensor product P-splines model, stored by its factors.
+
+    The penalty is the Kronecker sum
+    `sum_j penalties[j] * I x ... x P_j x ... x I` of `(m_j, m_j)` factors
+    `P_j`, whose dense matrix has `(m1 * ... * mk)**2` entries. Only the
+    factors are stored, and the products are applied along the axes of the
+    coefficients, reshaped to `(m1, ..., mk)`. The coefficients are raveled in
+    C order, as for :func:`numpy.kron`.
+
+    Parameters
+    ----------
+    factors: Sequence[npt.NDArray[np.float_]]
+        The penalty matrix `P_j` of each dimension, of shape `(m_j, m_j)`.
+    penalties: Sequence[float] | None, default=None
+        The penalty parameter of each dimension. If not provided, they are all
+        equal to 1.
+
+    Examples
+    --------
+    >>> penalty = KroneckerSumPenalty.from_difference((3, 2), 1, (1.0, 2.0))
+    >>> penalty.shape
+    (6, 6)
+    >>> penalty.diag()
+    array([3., 3., 4., 4., 3., 3.])
+
+    """
+
+    def __init__(
+        self,
+        factors: Sequence[npt.NDArray[np.float_]],
+        penalties: Sequence[float] | None = None,
+    ) -> None:
+        """Initialize KroneckerSumPenalty object."""
+        self.factors = [
+            np.asarray(factor, dtype=np.float_) for factor in factors
+        ]
+        if any(
+            factor.ndim != 2 or factor.shape[0] != factor.shape[1]
+            for factor in self.factors
+        ):
+            raise ValueError("The factors must be square matrices.")
+        if penalties is None:
+            penalties = len(self.factors) * (1.0,)
+        if len(penalties) != len(self.factors):
+            raise ValueError(
+                "`penalties` must have the same length as `factors`, got "
+                f"{len(penalties)} and {len(self.factors)}."
+            )
+        self.penalties = tuple(float(penalty) for penalty in penalties)
+
+    @classmethod
+    def from_difference(
+        cls,
+        n_basis: Sequence[int],
+        order_penalty: int = 2,
+        penalties: Sequence[float] | None = None,
+    ) -> KroneckerSumPenalty:
+        """Build the difference penalty of a tensor product basis.
+
+        Parameters
+        ----------
+        n_basis: Sequence[int]
+            The number of basis functions in each dimension.
+        order_penalty: int, default=2
+            The order of the differences, see :func:`penalty_matrix`.
+        penalties: Sequence[float] | None, default=None
+            The penalty parameter of each dimension.
+
+        Returns
+        -------
+        KroneckerSumPenalty
+            The penalty, whose factors are the memoized `D'D`.
+
+        """
+        factors = [penalty_matrix(n, order_penalty) for n in n_basis]
+        return cls(factors, penalties)
+
+    @property
+    def n_basis(self) -> tuple[int, ...]:
+        """Number of basis functions in each dimension."""
+        return tuple(factor.shape[0] for factor in self.factors)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Shape of the penalty matrix."""
+        n_coefs = int(np.prod(self.n_basis))
+        return (n_coefs, n_coefs)
+
+    def with_penalties(self, penalties: Sequence[float]) -> KroneckerSumPenalty:
+        """Get the penalty with other parameters, sharing the factors."""
+        return KroneckerSumPenalty(self.factors, penalties)
+
+    def term(self, axis: int) -> KroneckerSumPenalty:
+        """Get the unscaled term `I x ... x P_axis x ... x I` of the sum."""
+        penalties = np.zeros(len(self.factors))
+        penalties[axis] = 1
+        return self.with_penalties(tuple(penalties))
+
+    def _as_tensor(
+        self, coefs: npt.NDArray[np.float_]
+    ) -> npt.NDArray[np.float_]:
+        """Reshape raveled coefficients to `(m1, ..., mk, ...)`."""
+        coefs = np.asarray(coefs, dtype=np.float_)
+        n_dimension = len(self.n_basis)
+        if coefs.shape[:n_dimension] == self.n_basis:
+            return coefs
+        if coefs.shape[0] != self.shape[0]:
+            raise ValueError(
+                f"The coefficients must have the shape {self.n_basis} or "
+                f"{self.shape[:1]}, up to trailing axes, got {coefs.shape}."
+            )
+        return coefs.reshape(self.n_basis + coefs.shape[1:])
+
+    def matvec(self, coefs: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
+        """Multiply the coefficients by the penalty matrix.
+
+        Parameters
+        ----------
+        coefs: npt.NDArray[np.float_]
+            The coefficients, of shape `(m1, ..., mk)` or `(m1 * ... * mk,)`,
+            with trailing outputs axes if any.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            The product, of the same shape as `coefs`.
+
+        """
+        tensor = self._as_tensor(coefs)
+        result = np.zeros_like(tensor)
+        for axis, (penalty, factor) in enumerate(
+            zip(self.penalties, self.factors)
+        ):
+            if penalty != 0:
+                product = np.tensordot(factor, tensor, axes=(1, axis))
+                result += penalty * np.moveaxis(product, 0, axis)
+        return result.reshape(np.shape(coefs))
+
+    def diag(self) -> npt.NDArray[np.float_]:
+        """Compute the diagonal of the penalty matrix, of shape `(n_coefs,)`."""
+        diagonal = np.zeros(self.n_basis)
+        for axis, (penalty, factor) in enumerate(
+            zip(self.penalties, self.factors)
+        ):
+            shape = [1] * len(self.n_basis)
+            shape[axis] = self.n_basis[axis]
+            diagonal += penalty * np.diag(factor).reshape(shape)
+        return diagonal.ravel()
+
+    def quadratic_form(
+        self, coefs: npt.NDArray[np.float_]
+    ) -> npt.NDArray[np.float_]:
+        """Compute the quadratic form `coefs' P coefs`.
+
+        Parameters
+        ----------
+        coefs: npt.NDArray[np.float_]
+            The coefficients, see :meth:`matvec`.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            The quadratic form, with one value for each trailing output if
+            any.
+
+        """
+        tensor = self._as_tensor(coefs)
+        axes = tuple(range(len(self.n_basis)))
+        return np.sum(tensor * self.matvec(tensor), axis=axes)  # type: ignore
+
+    def trace_dot(self, mat: npt.NDArray[np.float_]) -> float:
+        """Compute `sum(mat * P)`, i.e. `trace(P @ mat)` for a symmetric `mat`.
+
+        The sum runs over the diagonals of `mat` along the axes that the
+        identity factors of each term leave unchanged, such that `P` is never
+        formed.
+
+        Parameters
+        ----------
+        mat: npt.NDArray[np.float_], shape=(n_coefs, n_coefs)
+            A square matrix, e.g. the inverse of the penalized normal
+            equations.
+
+        Returns
+        -------
+        float
+            The sum of the elementwise product of `mat` and `P`.
+
+        """
+        n_dimension = len(self.n_basis)
+        tensor = np.asarray(mat).reshape(self.n_basis + self.n_basis)
+        rows = string.ascii_letters[:n_dimension]
+        other = string.ascii_letters[n_dimension]
+        result = 0.0
+        for axis, (penalty, factor) in enumerate(
+            zip(self.penalties, self.factors)
+        ):
+            if penalty != 0:
+                cols = rows[:axis] + other + rows[axis + 1 :]
+                block = np.einsum(f"{rows}{cols}->{rows[axis]}{other}", tensor)
+                result += penalty * float(np.sum(factor * block))
+        return result
+
+    def tosparse(self, format: str = "csc") -> Any:
+        """Convert the penalty to a sparse array.
+
+        Parameters
+        ----------
+        format: str, default="csc"
+            The format of the `scipy.sparse` array.
+
+        Returns
+        -------
+        scipy.sparse.sparray
+            The penalty matrix, of shape `(n_coefs, n_coefs)`. The number of
+            non-zero entries is `O(n_coefs * (2 * order_penalty + 1) * k)` for
+            difference penalties.
+
+        """
+        from scipy import sparse
+
+        n_basis = self.n_basis
+        result = sparse.csc_array(self.shape)
+        for axis, (penalty, factor) in enumerate(
+            zip(self.penalties, self.factors)
+        ):
+            if penalty != 0:
+                term = sparse.kron(
+                    sparse.identity(
+                        int(np.prod(n_basis[:axis])), format="csc"
+                    ),
+                    sparse.kron(
+                        sparse.csc_array(factor),
+                        sparse.identity(
+                            int(np.prod(n_basis[axis + 1 :])), format="csc"
+                        ),
+                    ),
+                    format="csc",
+                )
+                result = result + penalty * term
+        return result.asformat(format)
+
+    def toarray(self) -> npt.NDArray[np.float_]:
+        """Convert the penalty to a dense array, for dense solvers."""
+        return self.tosparse().toarray()  # type: ignore
+
+    def aslinearoperator(self) -> Any:
+        """Wrap the penalty as a `scipy.sparse.linalg.LinearOperator`."""
+        from scipy.sparse.linalg import LinearOperator
+
+        return LinearOperator(
+            self.shape,
+            matvec=self.matvec,
+            rmatvec=self.matvec,
+            matmat=self.matvec,
+            dtype=np.float_,
+        )
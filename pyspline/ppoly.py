@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Piecewise polynomials
+---------------------
+
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import numpy.typing as npt
+
+
+def _local_polynomials(degree: int) -> npt.NDArray[np.float_]:
+    """Compute the polynomials of the B-splines within a segment.
+
+    With evenly spaced knots, the `degree + 1` B-splines that are non-zero on
+    a segment are, up to a shift, the same polynomials of the position `u` in
+    the segment. They are computed with the Cox-de Boor recursion applied to
+    the coefficients of the polynomials, see
+    :func:`~pyspline.basis.basis_bsplines`.
+
+    Parameters
+    ----------
+    degree: int
+        The degree of the B-splines.
+
+    Returns
+    -------
+    npt.NDArray[np.float_], shape=(degree + 1, degree + 1)
+        The coefficients of the polynomials, in increasing powers of `u`. The
+        row `r` is the B-spline `segment + r`.
+
+    """
+    # The row `r` contains the coefficients of the polynomial of `values[:, r]`
+    # in `basis._local_bsplines`, and the products by `a + b * u` shift them.
+    local = np.zeros((degree + 1, degree + 1))
+    local[0, 0] = 1
+    for j in range(1, degree + 1):
+        saved = np.zeros(degree + 1)
+        for r in range(j):
+            temp = local[r] / j
+            local[r] = saved + (r + 1) * temp
+            local[r, 1:] -= temp[:-1]
+            saved = (j - r - 1) * temp
+            saved[1:] += temp[:-1]
+        local[j] = saved
+    return local
+
+
+class PPoly:
+    """Piecewise polynomial on evenly spaced breakpoints.
+
+    The domain `[domain_min, domain_max]` is split into `n_segments` segments
+    of the same width. On the segment `s`, the polynomial is written in
+    increasing powers of the position `u = (x - domain_min) / width - s`, with
+    `0 <= u <= 1`. The segment of a point is found arithmetically, without
+    search, and the polynomial is evaluated with Horner's rule. The cost is
+    thus `O(n_points * degree)`.
+
+    Parameters
+    ----------
+    coefs: npt.NDArray[np.float_], shape=(n_segments, degree + 1, ...)
+        The coefficients of the polynomial of each segment, in increasing
+        powers of `u`. Trailing axes, if any, are kept in the output.
+    domain_min: float
+        The lower bound of the domain.
+    domain_max: float
+        The upper bound of the domain.
+    extrapolate: bool, default=True
+        If `True`, the points outside of the domain are evaluated with the
+        polynomial of the first or last segment. Otherwise, they are `nan`.
+
+    Examples
+    --------
+    >>> ppoly = PPoly(np.array([[0.0, 1.0], [1.0, -1.0]]), 0.0, 2.0)
+    >>> ppoly(np.array([0.5, 1.0, 1.5]))
+    array([0.5, 1. , 0.5])
+
+    """
+
+    def __init__(
+        self,
+        coefs: npt.NDArray[np.float_],
+        domain_min: float,
+        domain_max: float,
+        extrapolate: bool = True,
+    ) -> None:
+        """Initialize PPoly object."""
+        coefs = np.asarray(coefs, dtype=np.float_)
+        if coefs.ndim < 2:
+            raise ValueError(
+                f"`coefs` must have at least two dimensions, got {coefs.ndim}."
+            )
+        if not domain_min < domain_max:
+            raise ValueError(
+                f"`domain_min` must be smaller than `domain_max`, got "
+                f"{domain_min} and {domain_max}."
+            )
+        self.coefs = coefs
+        self.domain_min = float(domain_min)
+        self.domain_max = float(domain_max)
+        self.extrapolate = extrapolate
+
+    @property
+    def n_segments(self) -> int:
+        """Number of segments."""
+        return int(self.coefs.shape[0])
+
+    @property
+    def degree(self) -> int:
+        """Degree of the polynomials."""
+        return int(self.coefs.shape[1] - 1)
+
+    @property
+    def width(self) -> float:
+        """Width of the segments."""
+        return (self.domain_max - self.domain_min) / self.n_segments
+
+    @property
+    def breakpoints(self) -> npt.NDArray[np.float_]:
+        """Breakpoints of the segments, shape `(n_segments + 1,)`."""
+        return np.linspace(
+            self.domain_min, self.domain_max, self.n_segments + 1
+        )
+
+    def __call__(
+        self, x: npt.NDArray[np.float_], nu: int = 0
+    ) -> npt.NDArray[np.float_]:
+        """Evaluate the piecewise polynomial.
+
+        Parameters
+        ----------
+        x: npt.NDArray[np.float_]
+            The points at which the polynomial is evaluated.
+        nu: int, default=0
+            The order of the derivative to evaluate.
+
+        Returns
+        -------
+        npt.NDArray[np.float_], shape=x.shape + coefs.shape[2:]
+            The values of the polynomial, or of its derivative.
+
+        """
+        if nu > 0:
+            return self.derivative(nu)(x)
+        x = np.asarray(x, dtype=np.float_)
+        position = (x.ravel() - self.domain_min) / self.width
+        segments = np.clip(np.floor(position), 0, self.n_segments - 1)
+        u = position - segments
+        coefs = self.coefs[segments.astype(np.intp)]
+        u = u.reshape(u.shape + (1,) * (coefs.ndim - 2))
+
+        results = coefs[:, -1].copy()
+        for k in range(self.degree - 1, -1, -1):
+            results *= u
+            results += coefs[:, k]
+        if not self.extrapolate:
+            is_outside = (x.ravel() < self.domain_min) | (
+                x.ravel() > self.domain_max
+            )
+            results[is_outside] = np.nan
+        return results.reshape(x.shape + self.coefs.shape[2:])  # type: ignore
+
+    def derivative(self, nu: int = 1) -> PPoly:
+        """Compute the derivative of the piecewise polynomial.
+
+        Parameters
+        ----------
+        nu: int, default=1
+            The order of the derivative.
+
+        Returns
+        -------
+        PPoly
+            The derivative, of degree `max(degree - nu, 0)`.
+
+        """
+        coefs = self.coefs
+        for _ in range(nu):
+            if coefs.shape[1] == 1:
+                coefs = np.zeros_like(coefs)
+                break
+            powers = np.arange(1, coefs.shape[1])
+            powers = powers.reshape((-1,) + (1,) * (coefs.ndim - 2))
+            coefs = coefs[:, 1:] * powers / self.width
+        return PPoly(coefs, self.domain_min, self.domain_max, self.extrapolate)
+
+    def antiderivative(self, nu: int = 1) -> PPoly:
+        """Compute the antiderivative of the piecewise polynomial.
+
+        The antiderivative is continuous and is zero at `domain_min`.
+
+        Parameters
+        ----------
+        nu: int, default=1
+            The order of the antiderivative.
+
+        Returns
+        -------
+        PPoly
+            The antiderivative, of degree `degree + nu`.
+
+        """
+        coefs = self.coefs
+        for _ in range(nu):
+            powers = np.arange(1, coefs.shape[1] + 1)
+            powers = powers.reshape((-1,) + (1,) * (coefs.ndim - 2))
+            integral = np.zeros(
+                (coefs.shape[0], coefs.shape[1] + 1) + coefs.shape[2:]
+            )
+            integral[:, 1:] = coefs * self.width / powers
+            # The value at the start of a segment is the sum of the integrals
+            # over the previous segments.
+            totals = np.sum(integral, axis=1)
+            integral[1:, 0] = np.cumsum(totals[:-1], axis=0)
+            coefs = integral
+        return PPoly(coefs, self.domain_min, self.domain_max, self.extrapolate)
+
+    def integrate(self, a: float, b: float) -> npt.NDArray[np.float_]:
+        """Compute the integral of the piecewise polynomial from `a` to `b`.
+
+        Parameters
+        ----------
+        a: float
+            The lower bound of the integral.
+        b: float
+            The upper bound of the integral.
+
+        Returns
+        -------
+        npt.NDArray[np.float_], shape=coefs.shape[2:]
+            The integral.
+
+        """
+        antiderivative = self.antiderivative()
+        bounds = antiderivative(np.array([a, b]))
+        return bounds[1] - bounds[0]  # type: ignore
+
+
+def bsplines_to_ppoly(
+    coefs: npt.NDArray[np.float_],
+    degree: int,
+    domain_min: float,
+    domain_max: float,
+    extrapolate: bool = True,
+) -> PPoly:
+    """Convert a linear combination of B-splines to a piecewise polynomial.
+
+    On the segment `s`, the linear combination is
+    `sum_r coefs[s + r] * N_r(u)`, where `N_r` are the polynomials of the
+    B-splines within a segment. These polynomials are the same for all the
+    segments, as the knots are evenly spaced, such that the conversion is a
+    single product of the sliding windows of the coefficients.
+
+    Parameters
+    ----------
+    coefs: npt.NDArray[np.float_], shape=(n_functions, ...)
+        The coefficients of the B-splines, see
+        :func:`~pyspline.basis.basis_bsplines`.
+    degree: int
+        The degree of the B-splines.
+    domain_min: float
+        The lower bound of the domain of the basis.
+    domain_max: float
+        The upper bound of the domain of the basis.
+    extrapolate: bool, default=True
+        See :class:`PPoly`.
+
+    Returns
+    -------
+    PPoly
+        The piecewise polynomial with `n_functions - degree` segments. It is
+        equal to the linear combination of the B-splines on the domain.
+
+    """
+    coefs = np.asarray(coefs, dtype=np.float_)
+    if coefs.shape[0] <= degree:
+        raise ValueError(
+            f"The number of coefficients must be larger than the degree, got "
+            f"{coefs.shape[0]} and {degree}."
+        )
+    windows = np.lib.stride_tricks.sliding_window_view(
+        coefs, degree + 1, axis=0
+    )
+    ppoly_coefs = np.tensordot(windows, _local_polynomials(degree), axes=1)
+    ppoly_coefs = np.moveaxis(ppoly_coefs, -1, 1)
+    return PPoly(ppoly_coefs, domain_min, domain_max, extrapolate)
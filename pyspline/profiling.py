@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Profiling
+---------
+
+The stages of the fits and the predictions are delimited by :func:`stage`.
+They are only recorded within :func:`profile`, or when an estimator is
+created with `profile=True`, and otherwise cost a context variable lookup.
+
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import time
+import tracemalloc
+
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+_PROFILER: ContextVar[Profiler | None] = ContextVar(
+    "pyspline_profiler", default=None
+)
+
+
+class Profiler:
+    """Recorder of the stages of the fits and the predictions.
+
+    Each stage gives a record, a dictionary with the keys:
+    - `stage`: the path of the stage, the names of the enclosing stages joined
+    by `/`, e.g. `"fit/solve/factorize"`.
+    - `depth`: the number of enclosing stages.
+    - `wall_time`: the wall time of the stage, in seconds.
+    - `allocated_bytes`: the net memory allocated by the stage, in bytes.
+    - `peak_bytes`: the peak memory allocated by the stage over the memory
+    allocated at its start, in bytes.
+    - `sizes`: the shapes of the matrices of the stage, by name.
+
+    The memory is measured by :mod:`tracemalloc`, which traces the
+    allocations of Python and NumPy. If it is not tracing, the memory
+    entries are `None`.
+
+    Parameters
+    ----------
+    callback: Callable[[dict[str, Any]], None] | None, default=None
+        A function called with each record, when its stage ends.
+    logger: logging.Logger | None, default=None
+        A logger to which each record is logged, with the record as the
+        `profile` attribute of the log record.
+    level: int, default=logging.DEBUG
+        The level of the logged records.
+    parent: Profiler | None, default=None
+        An enclosing profiler, to which the records are also forwarded.
+
+    Attributes
+    ----------
+    records: list[dict[str, Any]]
+        The records, in the order in which the stages end.
+
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[dict[str, Any]], None] | None = None,
+        logger: logging.Logger | None = None,
+        level: int = logging.DEBUG,
+        parent: Profiler | None = None,
+    ) -> None:
+        """Initialize Profiler object."""
+        self.callback = callback
+        self.logger = logger
+        self.level = level
+        self.parent = parent
+        self.records: list[dict[str, Any]] = []
+        # The open stages are shared with the enclosing profilers, such that
+        # the paths and the memory peaks are consistent.
+        self._stack: list[dict[str, Any]] = (
+            parent._stack if parent is not None else []
+        )
+
+    def _enter(self, name: str, sizes: dict[str, Any]) -> dict[str, Any]:
+        """Open a stage."""
+        path = "/".join([frame["name"] for frame in self._stack] + [name])
+        frame: dict[str, Any] = {"name": name, "path": path, "sizes": sizes}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack and "peak" in self._stack[-1]:
+                parent = self._stack[-1]
+                parent["peak"] = max(parent["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["start"], frame["peak"] = current, current
+        self._stack.append(frame)
+        frame["time"] = time.perf_counter()
+        return frame
+
+    def _exit(self, frame: dict[str, Any]) -> None:
+        """Close a stage and emit its record."""
+        wall_time = time.perf_counter() - frame["time"]
+        self._stack.pop()
+        allocated_bytes, peak_bytes = None, None
+        if "start" in frame and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(frame["peak"], peak)
+            if self._stack and "peak" in self._stack[-1]:
+                parent = self._stack[-1]
+                parent["peak"] = max(parent["peak"], peak)
+            tracemalloc.reset_peak()
+            allocated_bytes = current - frame["start"]
+            peak_bytes = peak - frame["start"]
+        self._emit(
+            {
+                "stage": frame["path"],
+                "depth": len(self._stack),
+                "wall_time": wall_time,
+                "allocated_bytes": allocated_bytes,
+                "peak_bytes": peak_bytes,
+                "sizes": frame["sizes"],
+            }
+        )
+
+    def _emit(self, record: dict[str, Any]) -> None:
+        """Store a record and forward it."""
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+        if self.logger is not None:
+            self.logger.log(
+                self.level,
+                "%s: %.6f s, %s bytes peak, sizes %s",
+                record["stage"],
+                record["wall_time"],
+                record["peak_bytes"],
+                record["sizes"],
+                extra={"profile": record},
+            )
+        if self.parent is not None:
+            self.parent._emit(record)
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        """Aggregate the records by stage.
+
+        Returns
+        -------
+        dict[str, dict[str, Any]]
+            For each stage path, in the order in which the stages first end,
+            the number of `calls`, the total `wall_time` and
+            `allocated_bytes`, the maximum `peak_bytes` and the `sizes` of the
+            last call.
+
+        """
+        summary: dict[str, dict[str, Any]] = {}
+        for record in self.records:
+            entry = summary.get(record["stage"])
+            if entry is None:
+                summary[record["stage"]] = {
+                    "calls": 1,
+                    "wall_time": record["wall_time"],
+                    "allocated_bytes": record["allocated_bytes"],
+                    "peak_bytes": record["peak_bytes"],
+                    "sizes": record["sizes"],
+                }
+                continue
+            entry["calls"] += 1
+            entry["wall_time"] += record["wall_time"]
+            entry["sizes"] = record["sizes"]
+            if record["peak_bytes"] is not None:
+                entry["allocated_bytes"] = (
+                    entry["allocated_bytes"] or 0
+                ) + record["allocated_bytes"]
+                entry["peak_bytes"] = max(
+                    entry["peak_bytes"] or 0, record["peak_bytes"]
+                )
+        return summary
+
+
+@contextlib.contextmanager
+def profile(
+    callback: Callable[[dict[str, Any]], None] | None = None,
+    logger: logging.Logger | None = None,
+    level: int = logging.DEBUG,
+    memory: bool = True,
+) -> Iterator[Profiler]:
+    """Record the stages run within the context.
+
+    The profilers nest: the records of an inner profiler, e.g. of an
+    estimator created with `profile=True`, are forwarded to the enclosing
+    ones. The context is local to the thread, or to the task.
+
+    Parameters
+    ----------
+    callback: Callable[[dict[str, Any]], None] | None, default=None
+        A function called with each record, see :class:`Profiler`.
+    logger: logging.Logger | None, default=None
+        A logger to which each record is logged.
+    level: int, default=logging.DEBUG
+        The level of the logged records.
+    memory: bool, default=True
+        If `True`, :mod:`tracemalloc` is started if it is not tracing, and
+        stopped at the end of the context. Tracing slows the allocations
+        down, and its peak is reset at each stage.
+
+    Yields
+    ------
+    Profiler
+        The profiler, whose records are available within and after the
+        context.
+
+    Examples
+    --------
+    >>> with profile() as profiler:
+    ...     with stage("fit", basis=(13, 100)):
+    ...         pass
+    >>> profiler.records[0]["stage"], profiler.records[0]["sizes"]
+    ('fit', {'basis': (13, 100)})
+
+    """
+    parent = _PROFILER.get()
+    profiler = Profiler(callback, logger, level, parent=parent)
+    start_tracing = memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    token = _PROFILER.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _PROFILER.reset(token)
+        if start_tracing:
+            tracemalloc.stop()
+
+
+class Stage:
+    """Delimit a stage of a computation.
+
+    The stage is a context manager rather than a generator, such that it
+    costs about a microsecond when no profiler is active. It is created with
+    :func:`stage`.
+
+    Parameters
+    ----------
+    name: str
+        The name of the stage.
+    **sizes: Any
+        The shapes of the matrices of the stage, by name.
+
+    Examples
+    --------
+    The sizes returned by the context can be completed within it, once the
+    matrices are computed. They are discarded if no profiler is active.
+
+    >>> with stage("basis") as sizes:
+    ...     sizes["basis"] = (13, 100)
+
+    """
+
+    __slots__ = ("name", "sizes", "_profiler", "_frame")
+
+    def __init__(self, name: str, **sizes: Any) -> None:
+        """Initialize Stage object."""
+        self.name = name
+        self.sizes = sizes
+
+    def __enter__(self) -> dict[str, Any]:
+        """Open the stage in the active profiler, if any."""
+        self._profiler = _PROFILER.get()
+        if self._profiler is not None:
+            self._frame = self._profiler._enter(self.name, self.sizes)
+        return self.sizes
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the stage and emit its record."""
+        if self._profiler is not None:
+            self._profiler._exit(self._frame)
+
+
+def stage(name: str, **sizes: Any) -> Stage:
+    """Delimit a stage of a computation, see :class:`Stage`.
+
+    Parameters
+    ----------
+    name: str
+        The name of the stage.
+    **sizes: Any
+        The shapes of the matrices of the stage, by name.
+
+    Returns
+    -------
+    Stage
+        The context manager of the stage.
+
+    """
+    return Stage(name, **sizes)
@@ -8,10 +8,14 @@ P-Splines
 
 from __future__ import annotations
 
+import contextlib
+import os
+
 import numpy as np
 import numpy.typing as npt
 
-from typing import Tuple
+from concurrent.futures import Executor
+from typing import Any, Iterator, Tuple
 
 from sklearn.base import BaseEstimator, RegressorMixin
 from sklearn.utils.validation import (
@@ -21,10 +25,72 @@ from sklearn.utils.validation import (
     _check_sample_weight,
 )
 
-from .arrays import rotated_h_transform
-from .basis import basis_bsplines
+from .arrays import glam_contract
+from .banded import banded_quadratic_diagonal
+from .basis import CompactBasis, basis_bsplines, tensor_product_dot
+from .cache import BasisCache, fingerprint
 from .formatter import format_X_y
-from .psplines_inner import fit_one_dimensional, fit_n_dimensional
+from .io import load_arrays, save_arrays
+from .ppoly import PPoly, bsplines_to_ppoly
+from .profiling import profile, stage
+from .psplines_inner import (
+    diagonal_quadratic_form,
+    fit_one_dimensional,
+    fit_n_dimensional,
+    fit_n_dimensional_scattered,
+    n_dimensional_diagnostics,
+    one_dimensional_diagnostics,
+)
+from .selection import select_penalty, select_penalties_schall
+from .stats import SplineStats, parallel_statistics, spline_statistics
+
+
+_DIAGNOSTICS = (
+    "hat_matrix",
+    "eff_dimension",
+    "roughness",
+    "residuals_std",
+    "se_eta",
+    "inv_mat",
+    "inv_band",
+)
+
+
+def _domains_list(
+    domains: list[tuple[np.float_]] | tuple[np.float_], dimension: int
+) -> list[tuple[float, float]]:
+    """Convert the domains of the basis to a list of `(min, max)` tuples."""
+    if dimension == 1 and np.ndim(domains) == 1:
+        domains = [domains]  # type: ignore
+    if np.shape(domains) != (dimension, 2):
+        raise ValueError(
+            f"`domains` must contain a `(min, max)` tuple for each of the "
+            f"{dimension} dimensions."
+        )
+    return [
+        (float(domain_min), float(domain_max))
+        for domain_min, domain_max in np.asarray(domains)
+    ]
+
+
+def _diagnostics_name(key: str) -> str:
+    """Get the name of the array of a diagnostic in a model file."""
+    return f"diagnostics.{key}"
+
+
+def _load_diagnostics(
+    path: str | os.PathLike[str], mmap: bool
+) -> dict[str, Any]:
+    """Load the diagnostics saved in a model file, see `PSplines.save`."""
+    names = [_diagnostics_name(key) for key in _DIAGNOSTICS]
+    _, arrays = load_arrays(path, mmap=mmap, names=names)
+    diagnostics = {}
+    for key, name in zip(_DIAGNOSTICS, names):
+        if name in arrays:
+            value = arrays[name]
+            # The scalars are saved as zero-dimensional arrays.
+            diagnostics[key] = value[()] if value.ndim == 0 else value
+    return diagnostics
 
 
 class PSplines(BaseEstimator, RegressorMixin):  # type: ignore
@@ -40,6 +106,65 @@ class PSplines(BaseEstimator, RegressorMixin):  # type: ignore
         The number of the degree of the basis.
     order_penalty: int, default=2
         The number of the order of the difference penalty.
+    basis_format: str, {"dense", "csr", "csc", "compact"}, default="dense"
+        The format of the B-splines basis, see
+        :func:`~pyspline.basis.basis_bsplines`. Sparse and compact formats
+        reduce the memory footprint for large number of observations.
+    solver: str, {"auto", "dense", "banded", "cg", "sandwich", "sparse"}, \
+        default="auto"
+        The solver of the penalized least squares problem. For one-dimensional
+        fits, see :func:`~pyspline.psplines_inner.fit_one_dimensional`,
+        `"auto"` uses the banded solver when the bandwidth of the system,
+        `max(degree, order_penalty)`, is small compared to the number of
+        B-splines, and the dense solver otherwise. For multi-dimensional fits,
+        see :func:`~pyspline.psplines_inner.fit_n_dimensional`, `"auto"` uses
+        the matrix-free conjugate gradient when the number of coefficients is
+        larger than 4096 and `compute_diagnostics="none"`, and the dense
+        solver otherwise. The conjugate gradient does not compute any
+        diagnostics, even on the first access of `diagnostics_`. With
+        `"sparse"`, the observations are not put on a grid and the sparse
+        normal equations are solved, see
+        :func:`~pyspline.psplines_inner.fit_n_dimensional_scattered`; the
+        fitted values and the hat matrix are then given for each observation.
+        It suits scattered observations whose grid of unique values would be
+        mostly empty. For multi-dimensional fits, `"sandwich"` fits the
+        sandwich smoother on complete grids, with a different penalty that
+        allows exact and fast fits of large grids. For one-dimensional fits,
+        the sandwich smoother is the ordinary P-spline, and `"sandwich"` is
+        dispatched as `"auto"`, to the banded or the dense solver.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="full"
+        The diagnostics computed during the fit, see
+        :func:`~pyspline.psplines_inner.one_dimensional_diagnostics`. With
+        `"none"`, the fit only computes the coefficients, from a single
+        Cholesky decomposition. The full diagnostics are computed on the first
+        access of `diagnostics_` and cached.
+    bins: int | Tuple[int, ...] | None, default=None
+        For multi-dimensional fits, the number of evenly spaced grid points in
+        each dimension onto which scattered observations are snapped, see
+        :func:`~pyspline.formatter.format_X_y`. If `None`, the grid is defined
+        by the unique values of each predictor.
+    cache_size: int | None, default=None
+        The maximum size, in bytes, of the cache of the B-splines bases
+        evaluated by `predict`, `errors` and `derivative`, see
+        :class:`~pyspline.cache.BasisCache`. The bases are keyed on a
+        fingerprint of the evaluation points, the number of B-splines, the
+        degree, the domain and the format, such that repeated queries on the
+        same points reduce to a product with the coefficients. If `None`, the
+        bases are not cached.
+    profile: bool, default=False
+        If `True`, the wall time, the memory and the sizes of the matrices of
+        each stage of `fit`, `predict` and `errors` are recorded, see
+        :func:`~pyspline.profiling.profile`. The stages are also recorded
+        without this option within :func:`~pyspline.profiling.profile`,
+        which forwards them to a callback or a logger.
+
+    Attributes
+    ----------
+    fit_profile_: dict[str, dict[str, Any]]
+        If `profile=True`, the stages of the last call of `fit`, by path, see
+        :meth:`~pyspline.profiling.Profiler.summary`. `predict_profile_` and
+        `errors_profile_` are those of the last calls of `predict` and
+        `errors`.
 
     Notes
     -----
@@ -70,12 +195,24 @@ class PSplines(BaseEstimator, RegressorMixin):  # type: ignore
         n_segments: Tuple[int] = (10,),
         degree: Tuple[int] = (3,),
         order_penalty: int = 2,
+        basis_format: str = "dense",
+        solver: str = "auto",
+        compute_diagnostics: str = "full",
+        bins: int | Tuple[int, ...] | None = None,
+        cache_size: int | None = None,
+        profile: bool = False,
     ):
         """Initialize PSplines object."""
         self.penalty = penalty
         self.n_segments = n_segments
         self.degree = degree
         self.order_penalty = order_penalty
+        self.basis_format = basis_format
+        self.solver = solver
+        self.compute_diagnostics = compute_diagnostics
+        self.bins = bins
+        self.cache_size = cache_size
+        self.profile = profile
 
     def fit(
         self,
@@ -93,8 +230,11 @@ class PSplines(BaseEstimator, RegressorMixin):  # type: ignore
         ----------
         X: npt.NDArray[np.float_], shape=(n_obs, n_dimension)
             An array containing the predictor variable values.
-        y: npt.NDArray[np.float_], shape=(n_obs,)
-            An array containing the response variable values.
+        y: npt.NDArray[np.float_], shape=(n_obs,) or (n_obs, n_outputs)
+            An array containing the response variable values. Several outputs
+            are fitted at once, with a single factorization of the penalized
+            system, and `beta_hat_`, `y_hat_` and the per-output diagnostics
+            then have a trailing outputs axis.
         sample_weights: npt.NDArray[np.float64] | None, default=None
             An array of shape `(n_obs,)` containing the weights for each
             observation. If not provided, all observations are assumed to have
@@ -108,117 +248,522 @@ class PSplines(BaseEstimator, RegressorMixin):  # type: ignore
             Returns self.
 
         """
-        X, y = check_X_y(X, y)
-        dimension = X.shape[1]
+        with self._profile("fit"):
+            return self._fit(X, y, sample_weights, domains, self.penalty)
 
-        if sample_weights is not None:
-            sample_weights = _check_sample_weight(
-                sample_weights, X, dtype=X.dtype
-            )
+    @contextlib.contextmanager
+    def _profile(self, method: str) -> Iterator[None]:
+        """Record the stages of a method, in `{method}_profile_` if enabled."""
+        if not self.profile:
+            with stage(method):
+                yield
+            return
+        with profile() as profiler, stage(method):
+            yield
+        setattr(self, f"{method}_profile_", profiler.summary())
+
+    def _fit(
+        self,
+        X: npt.NDArray[np.float_],
+        y: npt.NDArray[np.float_],
+        sample_weights: npt.NDArray[np.float_] | None,
+        domains: list[tuple[np.float_]] | tuple[np.float_] | None,
+        penalty: Tuple[float, ...],
+    ) -> PSplines:
+        """Fit a P-splines model with the given penalties."""
+        # A fit discards the chunks accumulated by `partial_fit`.
+        self._partial_statistics: SplineStats | None = None
+        self._partial_domains: list[tuple[float, float]] | None = None
+        with stage("validate"):
+            X, y = check_X_y(X, y, multi_output=True, y_numeric=True)
+            if sample_weights is not None:
+                sample_weights = _check_sample_weight(
+                    sample_weights, X, dtype=X.dtype
+                )
+        dimension = X.shape[1]
 
         if dimension == 1:
+            n_functions = self.n_segments[0] + self.degree[0]
+            solver = self.solver
+            if solver in ("auto", "sandwich"):
+                bandwidth = max(self.degree[0], self.order_penalty)
+                solver = "banded" if 2 * bandwidth < n_functions else "dense"
             if domains is None:
                 domains = (np.min(X), np.max(X))
-            basis = basis_bsplines(
-                argvals=X.squeeze(),
-                n_functions=self.n_segments[0] + self.degree[0],
-                degree=self.degree[0],
-                domain_min=domains[0],
-                domain_max=domains[1],
-            )
-            results = fit_one_dimensional(
-                data=y,
-                basis=basis,
-                sample_weights=sample_weights,
-                penalty=self.penalty,
-                order_penalty=self.order_penalty,
-            )
+            with stage("basis") as sizes:
+                basis = basis_bsplines(
+                    argvals=X.squeeze(),
+                    n_functions=n_functions,
+                    degree=self.degree[0],
+                    domain_min=domains[0],
+                    domain_max=domains[1],
+                    format=self.basis_format,
+                )
+                sizes["basis"] = basis.shape
+            with stage("solve", solver=solver):
+                results = fit_one_dimensional(
+                    data=y,
+                    basis=basis,
+                    sample_weights=sample_weights,
+                    penalty=penalty,
+                    order_penalty=self.order_penalty,
+                    solver=solver,
+                    compute_diagnostics=self.compute_diagnostics,
+                )
         else:
-            # Modify y in order to have the right shape to fit in the array algo
-            X, y, sample_weights = format_X_y(X, y, sample_weights)
+            solver = self.solver
+            if solver != "sparse":
+                # Modify y in order to have the right shape to fit in the
+                # array algo
+                with stage("format", X=X.shape) as sizes:
+                    X, y, sample_weights = format_X_y(
+                        X, y, sample_weights, bins=self.bins
+                    )
+                    sizes["y"] = y.shape
+            else:
+                X = X.T
             if domains is None:
                 domains = [(np.min(xx), np.max(xx)) for xx in X]
 
-            basis = [
-                basis_bsplines(
-                    argvals=argvals,
-                    n_functions=n_segments + degree,
-                    degree=degree,
-                    domain_min=domain[0],
-                    domain_max=domain[1],
-                )
-                for argvals, n_segments, degree, domain in zip(
-                    X, self.n_segments, self.degree, domains
-                )
-            ]
-            results = fit_n_dimensional(
-                data=y,
-                basis_list=basis,
-                sample_weights=sample_weights,
-                penalties=self.penalty,
-                order_penalty=self.order_penalty,
-            )
+            with stage("basis") as sizes:
+                basis = [
+                    basis_bsplines(
+                        argvals=argvals,
+                        n_functions=n_segments + degree,
+                        degree=degree,
+                        domain_min=domain[0],
+                        domain_max=domain[1],
+                        format=self.basis_format,
+                    )
+                    for argvals, n_segments, degree, domain in zip(
+                        X, self.n_segments, self.degree, domains
+                    )
+                ]
+                sizes["bases"] = [mat.shape for mat in basis]
+            if solver == "sparse":
+                with stage("solve", solver=solver):
+                    results = fit_n_dimensional_scattered(
+                        data=y,
+                        basis_list=basis,
+                        sample_weights=sample_weights,
+                        penalties=penalty,
+                        order_penalty=self.order_penalty,
+                        compute_diagnostics=self.compute_diagnostics,
+                    )
+            else:
+                if solver == "auto":
+                    # The conjugate gradient computes no diagnostics.
+                    n_coefs = np.prod([mat.shape[0] for mat in basis])
+                    is_large = n_coefs > 4096
+                    solver = (
+                        "cg"
+                        if is_large and self.compute_diagnostics == "none"
+                        else "dense"
+                    )
+                with stage("solve", solver=solver):
+                    results = fit_n_dimensional(
+                        data=y,
+                        basis_list=basis,
+                        sample_weights=sample_weights,
+                        penalties=penalty,
+                        order_penalty=self.order_penalty,
+                        solver=solver,
+                        compute_diagnostics=self.compute_diagnostics,
+                    )
 
         # Export results
+        assert domains is not None
         self.is_fitted_ = True
         self.dimension_ = dimension
         self.basis_ = basis
-        self.domains_ = domains if isinstance(domains, list) else [domains]
+        self.domains_: list[tuple[float, float]] = _domains_list(
+            domains, dimension
+        )
         self.y_hat_ = results.get("y_hat", None)
         self.beta_hat_ = results.get("beta_hat", None)
-        self.diagnostics_ = {
-            "hat_matrix": results.get("hat_matrix", None),
-            "eff_dimension": results.get("eff_dimension", None),
-            "roughness": results.get("roughness", None),
-            "residuals_std": results.get("residuals_std", None),
-            "se_eta": results.get("se_eta", None),
-            "inv_mat": results.get("inv_mat", None),
+        self._diagnostics = {
+            key: results.get(key, None) for key in _DIAGNOSTICS
         }
+        self._diagnostics_inputs = None
+        self._diagnostics_source: tuple[Any, ...] | None = None
+        if self.compute_diagnostics != "full":
+            if sample_weights is None:
+                sample_weights = np.ones(y.shape[0])
+            self._diagnostics_inputs = (y, basis, sample_weights, results)
         return self
 
-    def predict(self, X: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
-        """Predict the response variable values.
+    def partial_fit(
+        self,
+        X: npt.NDArray[np.float_],
+        y: npt.NDArray[np.float_],
+        sample_weights: npt.NDArray[np.float_] | None = None,
+        domains: list[tuple[np.float_]] | tuple[np.float_] | None = None,
+    ) -> PSplines:
+        """Accumulate the sufficient statistics of a chunk of data.
 
-        The method predicts the response variable values for the given predictor
-        variable values using the fitted P-splines model. If `X` is not
-        provided, the method returns the fitted values.
+        The statistics of the chunk, see :class:`~pyspline.stats.SplineStats`,
+        are added to the ones of the previous chunks, such that the memory
+        does not depend on the number of observations: `B'WB` is stored in
+        banded storage for one-dimensional data and as a dense matrix of
+        shape `(m1 * ... * mk, m1 * ... * mk)` for scattered
+        multi-dimensional data. The model is fitted by :meth:`finalize`.
 
         Parameters
         ----------
-        X: npt.NDArray[np.float_]
+        X: npt.NDArray[np.float_], shape=(n_obs, n_dimension)
+            An array containing the predictor variable values of the chunk.
+        y: npt.NDArray[np.float_], shape=(n_obs,) or (n_obs, n_outputs)
+            An array containing the response variable values of the chunk.
+        sample_weights: npt.NDArray[np.float64] | None, default=None
+            An array of shape `(n_obs,)` containing the weights for each
+            observation of the chunk.
+        domains: list[tuple[np.float_]] | tuple[np.float_] | None, default=None
+            The domains of the B-splines basis. They must be provided on the
+            first call, as the data are not known in advance, and can not
+            change.
+
+        Returns
+        -------
+        self: PSplines
+            Returns self.
+
+        """
+        X, y = check_X_y(X, y, multi_output=True, y_numeric=True)
+        if sample_weights is not None:
+            sample_weights = _check_sample_weight(
+                sample_weights, X, dtype=X.dtype
+            )
+
+        statistics = getattr(self, "_partial_statistics", None)
+        if statistics is None:
+            if domains is None:
+                raise ValueError(
+                    "`domains` must be provided on the first call of "
+                    "`partial_fit`."
+                )
+            partial_domains = _domains_list(domains, X.shape[1])
+        else:
+            assert self._partial_domains is not None
+            partial_domains = self._partial_domains
+            if (
+                domains is not None
+                and _domains_list(domains, X.shape[1]) != partial_domains
+            ):
+                raise ValueError(
+                    "`domains` can not change between calls of "
+                    "`partial_fit`."
+                )
+
+        chunk = spline_statistics(
+            X,
+            y,
+            sample_weights,
+            n_segments=self.n_segments,
+            degree=self.degree,
+            domains=partial_domains,
+            order_penalty=self.order_penalty,
+        )
+        if statistics is not None:
+            chunk = statistics + chunk
+        self._partial_statistics = chunk
+        self._partial_domains = partial_domains
+        return self
+
+    def fit_parallel(
+        self,
+        X: npt.NDArray[np.float_],
+        y: npt.NDArray[np.float_],
+        sample_weights: npt.NDArray[np.float_] | None = None,
+        domains: list[tuple[np.float_]] | tuple[np.float_] | None = None,
+        n_shards: int | None = None,
+        executor: Executor | None = None,
+    ) -> PSplines:
+        """Fit the model with the statistics computed on several processes.
+
+        The observations are split into shards, whose statistics are computed
+        in parallel and merged, see :func:`~pyspline.stats.parallel_statistics`,
+        before a single solve with :meth:`finalize`. The observations are
+        scattered, they are not put on a grid.
+
+        Parameters
+        ----------
+        X: npt.NDArray[np.float_], shape=(n_obs, n_dimension)
             An array containing the predictor variable values.
+        y: npt.NDArray[np.float_], shape=(n_obs,) or (n_obs, n_outputs)
+            An array containing the response variable values.
+        sample_weights: npt.NDArray[np.float64] | None, default=None
+            An array of shape `(n_obs,)` containing the weights for each
+            observation.
+        domains: list[tuple[np.float_]] | tuple[np.float_] | None, default=None
+            The domains of the B-splines basis. If not provided, they are the
+            ranges of the columns of `X`.
+        n_shards: int | None, default=None
+            The number of shards. If not provided, it is the number of CPUs.
+        executor: concurrent.futures.Executor | None, default=None
+            The executor running the shards. If not provided, a process pool
+            is created.
 
         Returns
         -------
-        npt.NDArray[np.float_]
-            An array containing the estimated response variable values.
+        self: PSplines
+            Returns self.
+
+        """
+        X, y = check_X_y(X, y, multi_output=True, y_numeric=True)
+        if sample_weights is not None:
+            sample_weights = _check_sample_weight(
+                sample_weights, X, dtype=X.dtype
+            )
+        self._partial_statistics = None
+        self._partial_domains = None
+        if domains is None:
+            self._partial_domains = [
+                (float(np.min(column)), float(np.max(column)))
+                for column in X.T
+            ]
+        else:
+            self._partial_domains = _domains_list(domains, X.shape[1])
+        self._partial_statistics = parallel_statistics(
+            X,
+            y,
+            sample_weights,
+            n_segments=self.n_segments,
+            degree=self.degree,
+            domains=self._partial_domains,
+            order_penalty=self.order_penalty,
+            n_shards=n_shards,
+            executor=executor,
+        )
+        return self.finalize()
+
+    def finalize(self) -> PSplines:
+        """Fit the model from the statistics accumulated by `partial_fit`.
+
+        The coefficients are the same as the ones of `fit` on all the chunks,
+        for one-dimensional data, or on the scattered observations, for
+        multi-dimensional data. The data are not kept, such that `y_hat_`,
+        `basis_`, the hat matrix and the standard errors on the observations
+        are not available. The other diagnostics are always computed, as their
+        cost does not depend on the number of observations. More chunks can be
+        added with :meth:`partial_fit` and the model fitted again.
+
+        Returns
+        -------
+        self: PSplines
+            Returns self.
+
+        """
+        statistics = getattr(self, "_partial_statistics", None)
+        if statistics is None:
+            raise ValueError("`partial_fit` must be called before `finalize`.")
+
+        results = statistics.solve(
+            penalties=self.penalty,
+            order_penalty=self.order_penalty,
+            compute_diagnostics="edf",
+        )
+
+        # Export results
+        self.is_fitted_ = True
+        self.dimension_ = len(statistics.n_basis)
+        self.basis_ = None
+        assert self._partial_domains is not None
+        self.domains_ = self._partial_domains
+        self.y_hat_ = None
+        self.beta_hat_ = results["beta_hat"]
+        self._diagnostics = {
+            key: results.get(key, None) for key in _DIAGNOSTICS
+        }
+        self._diagnostics_inputs = None
+        self._diagnostics_source = None
+        return self
+
+    @property
+    def diagnostics_(self) -> dict[str, Any]:
+        """The diagnostics of the fit.
+
+        The diagnostics that were not computed during the fit, see
+        `compute_diagnostics`, are computed on the first access and cached.
 
         """
-        X = check_array(X, accept_sparse=True)
         check_is_fitted(self, "is_fitted_")
+        source = getattr(self, "_diagnostics_source", None)
+        if source is not None:
+            self._diagnostics.update(_load_diagnostics(*source))
+            self._diagnostics_source = None
+        if self._diagnostics_inputs is not None:
+            data, basis, sample_weights, results = self._diagnostics_inputs
+            with stage("diagnostics"):
+                if self.dimension_ == 1:
+                    diagnostics = one_dimensional_diagnostics(
+                        data,
+                        basis,
+                        sample_weights,
+                        results,
+                        order_penalty=self.order_penalty,
+                    )
+                else:
+                    diagnostics = n_dimensional_diagnostics(
+                        data, sample_weights, results
+                    )
+            self._diagnostics.update(diagnostics)
+            self._diagnostics_inputs = None
+        return self._diagnostics
+
+    def _evaluate_basis(
+        self,
+        argvals: npt.NDArray[np.float_],
+        n_functions: int,
+        degree: int,
+        domain: tuple[float, float],
+        format: str | None = None,
+    ) -> Any:
+        """Evaluate a B-splines basis, using the cache if enabled."""
+        if format is None:
+            format = self.basis_format
 
-        # Build the B-splines basis
-        new_X = [np.unique(column) for column in X.T]
-        basis = [
-            basis_bsplines(
+        def compute() -> Any:
+            return basis_bsplines(
                 argvals=argvals,
-                n_functions=n_segments + degree,
+                n_functions=n_functions,
                 degree=degree,
                 domain_min=domain[0],
                 domain_max=domain[1],
+                format=format,
             )
-            for argvals, n_segments, degree, domain in zip(
-                new_X, self.n_segments, self.degree, self.domains_
-            )
-        ]
 
-        if self.dimension_ == 1:
-            y_pred = self.beta_hat_ @ basis[0]
-        else:
-            y_pred = rotated_h_transform(basis[0].T, self.beta_hat_)
-            for idx in np.arange(1, len(basis)):
-                y_pred = rotated_h_transform(basis[idx].T, y_pred)
-        return y_pred
+        if self.cache_size is None:
+            return compute()
+        cache = getattr(self, "_basis_cache", None)
+        if cache is None or cache.max_bytes != self.cache_size:
+            cache = BasisCache(max_bytes=self.cache_size)
+            self._basis_cache = cache
+        key = (
+            fingerprint(argvals),
+            n_functions,
+            degree,
+            float(domain[0]),
+            float(domain[1]),
+            format,
+        )
+        return cache.get_or_compute(key, compute)
+
+    def clear_cache(self) -> None:
+        """Remove all the cached bases and reset the cache statistics."""
+        cache = getattr(self, "_basis_cache", None)
+        if cache is not None:
+            cache.clear()
+
+    def cache_info(self) -> dict[str, int]:
+        """Get the statistics of the basis cache.
+
+        Returns
+        -------
+        dict[str, int]
+            The statistics of the cache, see
+            :meth:`~pyspline.cache.BasisCache.info`. All of them are zero if
+            no basis has been cached.
+
+        """
+        cache = getattr(self, "_basis_cache", None)
+        if cache is None:
+            cache = BasisCache(max_bytes=self.cache_size or 0)
+        return cache.info()
+
+    def predict(
+        self,
+        X: npt.NDArray[np.float_],
+        grid: bool = True,
+        chunk_size: int = 8192,
+    ) -> npt.NDArray[np.float_]:
+        """Predict the response variable values.
+
+        The method predicts the response variable values for the given predictor
+        variable values using the fitted P-splines model. If `X` is not
+        provided, the method returns the fitted values.
+
+        Parameters
+        ----------
+        X: npt.NDArray[np.float_]
+            An array containing the predictor variable values.
+        grid: bool, default=True
+            If `True`, the predictions are computed on the grid defined by the
+            sorted unique values of each column of `X`. If `False`, the
+            predictions are computed at each row of `X`, see
+            :func:`~pyspline.basis.tensor_product_dot`. The cost is then
+            `O(n_obs * prod(degree + 1))` and the grid is never formed.
+        chunk_size: int, default=8192
+            If `grid=False`, the number of rows processed at once.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            An array containing the estimated response variable values. If
+            `grid=True`, its shape is the number of unique values of each
+            column of `X`. Otherwise, its shape is `(n_obs,)`.
+
+        """
+        with self._profile("predict"):
+            X = check_array(X, accept_sparse=True)
+            check_is_fitted(self, "is_fitted_")
+            assert self.beta_hat_ is not None
+
+            if not grid:
+                if X.shape[1] != self.dimension_:
+                    raise ValueError(
+                        f"`X` must have {self.dimension_} columns, got "
+                        f"{X.shape[1]}."
+                    )
+                with stage("basis") as sizes:
+                    basis = [
+                        self._evaluate_basis(
+                            argvals=column,
+                            n_functions=n_segments + degree,
+                            degree=degree,
+                            domain=domain,
+                            format="compact",
+                        )
+                        for column, n_segments, degree, domain in zip(
+                            X.T, self.n_segments, self.degree, self.domains_
+                        )
+                    ]
+                    sizes["bases"] = [mat.shape for mat in basis]
+                with stage("contract", X=X.shape):
+                    return tensor_product_dot(
+                        basis, self.beta_hat_, chunk_size
+                    )
+
+            # Build the B-splines basis
+            with stage("basis") as sizes:
+                basis = [
+                    self._evaluate_basis(
+                        argvals=np.unique(column),
+                        n_functions=n_segments + degree,
+                        degree=degree,
+                        domain=domain,
+                    )
+                    for column, n_segments, degree, domain in zip(
+                        X.T, self.n_segments, self.degree, self.domains_
+                    )
+                ]
+                sizes["bases"] = [mat.shape for mat in basis]
+
+            with stage("contract") as sizes:
+                if self.dimension_ == 1:
+                    if isinstance(basis[0], CompactBasis):
+                        y_pred = basis[0].dot(self.beta_hat_)
+                    else:
+                        y_pred = basis[0].T @ self.beta_hat_
+                else:
+                    basis = [
+                        mat.tosparse() if isinstance(mat, CompactBasis) else mat
+                        for mat in basis
+                    ]
+                    y_pred = glam_contract(
+                        [mat.T for mat in basis], self.beta_hat_
+                    )
+                sizes["y_pred"] = y_pred.shape
+            return y_pred
 
     def errors(self, X: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
         """Estimate the standard errors of the fitted values.
@@ -234,30 +779,44 @@ class PSplines(BaseEstimator, RegressorMixin):  # type: ignore
             An array containing standard errors of the fitted values.
 
         """
-        X = check_array(X, accept_sparse=True)
-        check_is_fitted(self, "is_fitted_")
+        with self._profile("errors"):
+            X = check_array(X, accept_sparse=True)
+            check_is_fitted(self, "is_fitted_")
 
-        if self.dimension_ > 1:
-            raise NotImplementedError("Not implemented for dimension > 1.")
+            if self.dimension_ > 1:
+                raise NotImplementedError(
+                    "Not implemented for dimension > 1."
+                )
 
-        # Build the B-splines basis
-        new_X = [np.unique(column) for column in X.T]
-        basis = [
-            basis_bsplines(
-                argvals=argvals,
-                n_functions=n_segments + degree,
-                degree=degree,
-                domain_min=domain[0],
-                domain_max=domain[1],
-            )
-            for argvals, n_segments, degree, domain in zip(
-                new_X, self.n_segments, self.degree, self.domains_
-            )
-        ]
+            # Build the B-splines basis
+            with stage("basis") as sizes:
+                basis = [
+                    self._evaluate_basis(
+                        argvals=np.unique(column),
+                        n_functions=n_segments + degree,
+                        degree=degree,
+                        domain=domain,
+                    )
+                    for column, n_segments, degree, domain in zip(
+                        X.T, self.n_segments, self.degree, self.domains_
+                    )
+                ]
+                sizes["basis"] = basis[0].shape
 
-        temp = np.diag(basis[0].T @ self.diagnostics_["inv_mat"] @ basis[0])
-        se_eta = np.sqrt(self.diagnostics_["residuals_std"] ** 2 * temp)
-        return se_eta
+            diagnostics = self.diagnostics_
+            with stage("quadratic_form", basis=basis[0].shape):
+                if diagnostics["inv_band"] is not None:
+                    temp = banded_quadratic_diagonal(
+                        basis[0], diagnostics["inv_band"]
+                    )
+                else:
+                    temp = diagonal_quadratic_form(
+                        basis[0], diagnostics["inv_mat"]
+                    )
+            se_eta = np.sqrt(
+                np.multiply.outer(temp, diagnostics["residuals_std"] ** 2)
+            )
+            return se_eta
 
     def derivative(self, X: npt.NDArray[np.float_], order_derivative: int = 1):
         """Estimate the derivative of the data.
@@ -277,16 +836,340 @@ class PSplines(BaseEstimator, RegressorMixin):  # type: ignore
             raise NotImplementedError("Not implemented for dimension > 1.")
 
         n_functions = self.n_segments[0] + self.degree[0] - order_derivative
-        basis = basis_bsplines(
+        basis = self._evaluate_basis(
             argvals=X.squeeze(),
             n_functions=n_functions,
             degree=self.degree[0] - order_derivative,
-            domain_min=self.domains_[0][0],
-            domain_max=self.domains_[0][1],
+            domain=self.domains_[0],
         )
+        assert self.beta_hat_ is not None
         beta_hat = (
-            np.diff(self.beta_hat_, n=order_derivative)
+            np.diff(self.beta_hat_, n=order_derivative, axis=0)
             / ((self.domains_[0][1] - self.domains_[0][0]) / self.n_segments[0])
             ** order_derivative
         )
+        if isinstance(basis, CompactBasis):
+            return basis.dot(beta_hat)
         return basis.T @ beta_hat
+
+    def to_ppoly(self, extrapolate: bool = True) -> PPoly:
+        """Convert the fitted model to a piecewise polynomial.
+
+        The piecewise polynomial is equal to the fitted model on the domain.
+        It is evaluated without building the B-splines basis, and its
+        derivatives and antiderivatives are computed from its coefficients,
+        see :class:`~pyspline.ppoly.PPoly`.
+
+        Parameters
+        ----------
+        extrapolate: bool, default=True
+            If `True`, the points outside of the domain are evaluated with the
+            polynomial of the first or last segment. Otherwise, they are
+            `nan`.
+
+        Returns
+        -------
+        PPoly
+            The piecewise polynomial.
+
+        """
+        check_is_fitted(self, "is_fitted_")
+
+        if self.dimension_ > 1:
+            raise NotImplementedError("Not implemented for dimension > 1.")
+
+        assert self.beta_hat_ is not None
+        return bsplines_to_ppoly(
+            self.beta_hat_,
+            degree=self.degree[0],
+            domain_min=self.domains_[0][0],
+            domain_max=self.domains_[0][1],
+            extrapolate=extrapolate,
+        )
+
+    def save(
+        self, path: str | os.PathLike[str], diagnostics: bool = False
+    ) -> None:
+        """Save the fitted model to a file.
+
+        Only the parameters, the domains and the coefficients are saved, such
+        that the file does not depend on the number of observations. The
+        knots are defined by `n_segments`, `degree` and the domains. The file
+        is an uncompressed `.npz` archive, see
+        :func:`~pyspline.io.save_arrays`, which is loaded without `pickle`.
+
+        Parameters
+        ----------
+        path: str | os.PathLike[str]
+            The path of the file. No extension is appended.
+        diagnostics: bool, default=False
+            If `True`, the diagnostics that are available are also saved, see
+            `diagnostics_`. The hat matrix and `inv_mat` may be large.
+
+        """
+        check_is_fitted(self, "is_fitted_")
+        arrays = {"beta_hat": np.asarray(self.beta_hat_)}
+        if diagnostics:
+            for key, value in self.diagnostics_.items():
+                if value is not None:
+                    arrays[_diagnostics_name(key)] = np.asarray(value)
+        metadata = {
+            "class": type(self).__name__,
+            "params": self.get_params(),
+            "dimension": self.dimension_,
+            "domains": _domains_list(
+                self.domains_, self.dimension_  # type: ignore
+            ),
+        }
+        if hasattr(self, "penalty_"):
+            metadata["penalty_"] = self.penalty_
+        save_arrays(path, arrays, metadata)
+
+    @classmethod
+    def load(
+        cls,
+        path: str | os.PathLike[str],
+        mmap: bool = True,
+        diagnostics: bool = False,
+    ) -> PSplines:
+        """Load a model saved by :meth:`save`.
+
+        The model predicts as the saved one, but `basis_` and `y_hat_` are
+        not available. The diagnostics are loaded from the file on the first
+        access of `diagnostics_`, if they have been saved.
+
+        Parameters
+        ----------
+        path: str | os.PathLike[str]
+            The path of the file.
+        mmap: bool, default=True
+            If `True`, the coefficients and the diagnostics are read-only
+            memory maps of the file, see :func:`~pyspline.io.load_arrays`, such
+            that many models are opened without reading their coefficients.
+        diagnostics: bool, default=False
+            If `True`, the diagnostics are loaded with the coefficients rather
+            than on their first access.
+
+        Returns
+        -------
+        PSplines
+            The fitted model, of the saved class.
+
+        """
+        metadata, arrays = load_arrays(path, mmap=mmap, names=["beta_hat"])
+        classes = {klass.__name__: klass for klass in (PSplines, PSplinesCV)}
+        klass = classes.get(metadata["class"])
+        if klass is None or not issubclass(klass, cls):
+            raise ValueError(
+                f"'{path}' contains a {metadata['class']} model, which is not "
+                f"a {cls.__name__}."
+            )
+        # The tuples of the parameters are saved as JSON lists.
+        params: dict[str, Any] = {
+            key: tuple(value) if isinstance(value, list) else value
+            for key, value in metadata["params"].items()
+        }
+        model = klass(**params)
+        model.is_fitted_ = True
+        model.dimension_ = metadata["dimension"]
+        model.basis_ = None
+        model.domains_ = [tuple(domain) for domain in metadata["domains"]]
+        model.y_hat_ = None
+        model.beta_hat_ = arrays["beta_hat"]
+        if "penalty_" in metadata:
+            model.penalty_ = tuple(metadata["penalty_"])
+        model._diagnostics = {key: None for key in _DIAGNOSTICS}
+        model._diagnostics_inputs = None
+        model._diagnostics_source = (path, mmap)
+        if diagnostics:
+            model._diagnostics.update(_load_diagnostics(path, mmap))
+            model._diagnostics_source = None
+        return model
+
+
+class PSplinesCV(PSplines):
+    """P-Splines Smoothing with automatic selection of the penalty.
+
+    For the criteria `"gcv"`, `"aic"` and `"cv"`, the penalty is selected on a
+    grid by minimizing the criterion, see
+    :func:`~pyspline.selection.select_penalty`, and only one-dimensional data
+    are supported. For the criterion `"schall"`, the penalties of all the
+    dimensions are estimated jointly as variance components of a mixed model,
+    see :func:`~pyspline.selection.select_penalties_schall`. The model is then
+    fitted with the selected penalties.
+
+    Parameters
+    ----------
+    penalties: npt.NDArray[np.float_] | None, default=None
+        For the grid criteria, the grid of penalties to evaluate. If not
+        provided, the grid is `10 ** np.arange(-4, 6.1, 0.1)`. For the
+        criterion `"schall"`, the initial penalties for each dimension. If not
+        provided, they are all set to 1.
+    criterion: str, {"gcv", "aic", "cv", "schall"}, default="gcv"
+        The criterion used to select the penalties.
+    n_segments: Tuple[int], default=(10,)
+        The number of evenly spaced segments.
+    degree: Tuple[int], default=(3,)
+        The number of the degree of the basis.
+    order_penalty: int, default=2
+        The number of the order of the difference penalty.
+    basis_format: str, {"dense", "csr", "csc", "compact"}, default="dense"
+        The format of the B-splines basis.
+    solver: str, {"auto", "dense", "banded", "cg", "sandwich", "sparse"}, \
+        default="auto"
+        The solver used for the final fit.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="full"
+        The diagnostics computed during the final fit.
+    bins: int | Tuple[int, ...] | None, default=None
+        For multi-dimensional fits, the number of grid points in each
+        dimension onto which scattered observations are snapped.
+    cache_size: int | None, default=None
+        The maximum size, in bytes, of the cache of the B-splines bases
+        evaluated after the fit. If `None`, the bases are not cached.
+    profile: bool, default=False
+        If `True`, the stages of `fit`, `predict` and `errors` are recorded
+        in `fit_profile_`, `predict_profile_` and `errors_profile_`, see
+        :class:`PSplines`.
+
+    Attributes
+    ----------
+    penalty_: Tuple[float, ...]
+        The selected penalties for each dimension.
+    cv_results_: dict[str, Any]
+        For the grid criteria, the criteria and the effective dimensions
+        evaluated on the grid. For the criterion `"schall"`, the number of
+        iterations `n_iter` and whether the algorithm has converged.
+
+    """
+
+    def __init__(
+        self,
+        penalties: npt.NDArray[np.float_] | None = None,
+        *,
+        criterion: str = "gcv",
+        n_segments: Tuple[int] = (10,),
+        degree: Tuple[int] = (3,),
+        order_penalty: int = 2,
+        basis_format: str = "dense",
+        solver: str = "auto",
+        compute_diagnostics: str = "full",
+        bins: int | Tuple[int, ...] | None = None,
+        cache_size: int | None = None,
+        profile: bool = False,
+    ):
+        """Initialize PSplinesCV object."""
+        self.penalties = penalties
+        self.criterion = criterion
+        self.n_segments = n_segments
+        self.degree = degree
+        self.order_penalty = order_penalty
+        self.basis_format = basis_format
+        self.solver = solver
+        self.compute_diagnostics = compute_diagnostics
+        self.bins = bins
+        self.cache_size = cache_size
+        self.profile = profile
+
+    def fit(
+        self,
+        X: npt.NDArray[np.float_],
+        y: npt.NDArray[np.float_],
+        sample_weights: npt.NDArray[np.float_] | None = None,
+        domains: list[tuple[np.float_]] | tuple[np.float_] | None = None,
+    ) -> PSplinesCV:
+        """Select the penalties and fit a P-splines model to the given data.
+
+        Parameters
+        ----------
+        X: npt.NDArray[np.float_], shape=(n_obs, n_dimension)
+            An array containing the predictor variable values.
+        y: npt.NDArray[np.float_], shape=(n_obs,)
+            An array containing the response variable values.
+        sample_weights: npt.NDArray[np.float64] | None, default=None
+            An array of shape `(n_obs,)` containing the weights for each
+            observation. If not provided, all observations are assumed to have
+            equal weight.
+        domains: list[tuple[np.float_]] | tuple[np.float_] | None, default=None
+            The domains of the B-splines basis.
+
+        Returns
+        -------
+        self: PSplinesCV
+            Returns self.
+
+        """
+        with self._profile("fit"):
+            X, y = check_X_y(X, y)
+            dimension = X.shape[1]
+            if dimension > 1 and self.criterion != "schall":
+                raise NotImplementedError("Not implemented for dimension > 1.")
+            schall_penalties = None
+            if self.criterion == "schall" and self.penalties is not None:
+                schall_penalties = tuple(
+                    float(penalty) for penalty in np.ravel(self.penalties)
+                )
+                if len(schall_penalties) != dimension:
+                    raise ValueError(
+                        f"With `criterion=\"schall\"`, `penalties` must "
+                        f"contain an initial penalty for each of the "
+                        f"{dimension} dimensions, got "
+                        f"{len(schall_penalties)}."
+                    )
+
+            if sample_weights is not None:
+                sample_weights = _check_sample_weight(
+                    sample_weights, X, dtype=X.dtype
+                )
+
+            if dimension == 1:
+                argvals, data, weights = [X.squeeze()], y, sample_weights
+                if domains is None:
+                    domains = (np.min(X), np.max(X))
+                domains_list = [domains]
+            else:
+                argvals, data, weights = format_X_y(
+                    X, y, sample_weights, bins=self.bins
+                )
+                if domains is None:
+                    domains = [(np.min(xx), np.max(xx)) for xx in argvals]
+                domains_list = domains
+            basis_list = [
+                basis_bsplines(
+                    argvals=xx,
+                    n_functions=n_segments + degree,
+                    degree=degree,
+                    domain_min=domain[0],
+                    domain_max=domain[1],
+                    format="compact",
+                )
+                for xx, n_segments, degree, domain in zip(
+                    argvals, self.n_segments, self.degree, domains_list
+                )
+            ]
+
+            with stage("select", criterion=self.criterion):
+                if self.criterion == "schall":
+                    results = select_penalties_schall(
+                        data=data,
+                        basis_list=basis_list,
+                        sample_weights=weights,
+                        penalties=schall_penalties,
+                        order_penalty=self.order_penalty,
+                    )
+                    self.cv_results_ = {
+                        "n_iter": results["n_iter"],
+                        "converged": results["converged"],
+                    }
+                    self.penalty_ = results["penalties"]
+                else:
+                    self.cv_results_ = select_penalty(
+                        data=data,
+                        basis=basis_list[0],
+                        sample_weights=weights,
+                        penalties=self.penalties,
+                        order_penalty=self.order_penalty,
+                        criterion=self.criterion,
+                    )
+                    self.penalty_ = (float(self.cv_results_.pop("penalty")),)
+            self._fit(X, y, sample_weights, domains, self.penalty_)
+            return self
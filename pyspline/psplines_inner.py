@@ -7,10 +7,137 @@ P-Splines inner functions
 
 """
 
+import functools
+import os
+import sys
+import warnings
+
 import numpy as np
 import numpy.typing as npt
 
-from .arrays import create_permutation, rotated_h_transform, row_tensor
+from typing import Any
+
+from scipy import sparse
+from scipy.linalg import cho_factor, cho_solve, cholesky_banded, eigh
+from scipy.sparse.linalg import splu
+
+from .arrays import (
+    GlamContraction,
+    create_permutation,
+    glam_contract,
+    row_tensor,
+    sparse_row_tensor,
+)
+from .banded import (
+    band_entries,
+    banded_cross_products,
+    banded_dot,
+    banded_quadratic_diagonal,
+    basis_bandwidth,
+    cholesky_solve_banded,
+    from_banded,
+    selected_inverse_banded,
+    sparse_to_banded,
+    to_banded,
+)
+from .basis import CompactBasis, tensor_product_gram
+from .penalties import KroneckerSumPenalty, penalty_matrix
+from .profiling import stage
+
+
+def _external_stacklevel() -> int:
+    """Get the stack level of the first caller outside of the package.
+
+    The warnings then point at the code of the user, whichever public
+    function or estimator method was called.
+    """
+    package = os.path.dirname(os.path.abspath(__file__))
+    frame, level = sys._getframe(1), 1
+    while frame.f_back is not None and os.path.abspath(
+        frame.f_code.co_filename
+    ).startswith(package):
+        frame, level = frame.f_back, level + 1
+    return level
+
+
+def _as_matrix(basis: Any) -> Any:
+    """Convert a compact B-splines basis into a sparse matrix."""
+    if isinstance(basis, CompactBasis):
+        return basis.tosparse()
+    return basis
+
+
+def _padded_penalty_band(
+    n_basis: int, order_penalty: int, bandwidth: int
+) -> npt.NDArray[np.float_]:
+    """Get the band of `D'D` with `bandwidth >= order_penalty` diagonals."""
+    band = penalty_matrix(n_basis, order_penalty, "banded")
+    return np.pad(band, ((bandwidth - order_penalty, 0), (0, 0)))
+
+
+def n_dimensional_penalty(
+    n_basis: tuple[int, ...],
+    penalties: tuple[float, ...],
+    order_penalty: int = 2,
+) -> KroneckerSumPenalty:
+    """Get the penalty operator of an nD P-splines model.
+
+    The dimensions without a penalty parameter, if `penalties` is shorter
+    than `n_basis`, are not penalized.
+
+    Parameters
+    ----------
+    n_basis: tuple[int, ...]
+        The number of basis functions in each dimension, `(m1, m2, ..., mk)`.
+    penalties: tuple[float, ...]
+        A tuple of penalty parameters for each dimension.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+
+    Returns
+    -------
+    KroneckerSumPenalty
+        The penalty `sum_i penalties[i] * I x ... x D_i'D_i x ... x I`.
+
+    """
+    penalties = tuple(penalties[: len(n_basis)])
+    penalties = penalties + (len(n_basis) - len(penalties)) * (0.0,)
+    return KroneckerSumPenalty.from_difference(
+        n_basis, order_penalty, penalties
+    )
+
+
+def diagonal_quadratic_form(
+    basis: Any, mat: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    """Compute the diagonal of `basis.T @ mat @ basis`.
+
+    The diagonal is computed column by column such that the `(n_obs, n_obs)`
+    matrix is never formed.
+
+    Parameters
+    ----------
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        An array of shape `(n_basis, n_obs)` containing the basis matrix.
+    mat: npt.NDArray[np.float_]
+        A two-dimensional array of shape `(n_basis, n_basis)`.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        A one-dimensional array of shape `(n_obs,)`.
+
+    """
+    if isinstance(basis, CompactBasis):
+        indices = basis.indices
+        blocks = mat[indices[:, :, np.newaxis], indices[:, np.newaxis, :]]
+        return np.einsum(  # type: ignore
+            "ij,ijk,ik->i", basis.values, blocks, basis.values
+        )
+    if sparse.issparse(basis):
+        product = (basis.T @ mat.T).T
+        return np.asarray(basis.multiply(product).sum(axis=0)).ravel()
+    return np.einsum("ij,ij->j", basis, mat @ basis)  # type: ignore
 
 
 def tensor_product_penalties(
@@ -100,11 +227,13 @@ def tensor_product_penalties(
 
 def fit_one_dimensional(
     data: npt.NDArray[np.float_],
-    basis: npt.NDArray[np.float_],
+    basis: Any,
     sample_weights: npt.NDArray[np.float_] | None = None,
     penalty: float = 1.0,
     order_penalty: int = 2,
-) -> dict[str, npt.NDArray[np.float_]]:
+    solver: str = "dense",
+    compute_diagnostics: str = "full",
+) -> dict[str, Any]:
     """
     Fit a one-dimensional P-splines model to the given data.
 
@@ -113,14 +242,18 @@ def fit_one_dimensional(
     dictionary containing the fitted values, the estimated coefficients, and the
     hat matrix.
 
+    Several responses observed at the same points, with the same weights, are
+    fitted at once: `B'WB + P` is factorized once and all the right-hand sides
+    are solved together.
+
     Parameters
     ----------
     data: npt.NDArray[np.float_]
-        A one-dimensional array of shape `(n_obs,)` containing the response
-        variable values.
-    basis: npt.NDArray[np.float_]
+        An array of shape `(n_obs,)` or `(n_obs, n_outputs)` containing the
+        response variable values.
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
         A two-dimensional array of shape `(n_basis, n_obs)` containing the basis
-        matrix.
+        matrix. Sparse and compact bases are also accepted.
     sample_weights: npt.NDArray[np.float_] | None, default=None
         A one-dimensional array of shape `(n_obs,)` containing the weights for
         each observation. If not provided, all observations are assumed to have
@@ -129,17 +262,36 @@ def fit_one_dimensional(
         The penalty parameter for the P-splines model.
     order_penalty: int, default=2
         The order of the penalty difference matrix.
+    solver: str, {"dense", "banded"}, default="dense"
+        The solver used for the penalized system. `"dense"` uses the Cholesky
+        decomposition of the full matrix. `"banded"` accumulates `B'WB`
+        directly in banded storage and solves the system with a banded Cholesky
+        decomposition, which costs `O(n_obs * d**2 + n_basis * d**2)` where `d`
+        is the bandwidth of the system. Only the band of the inverse is computed
+        (see :func:`~pyspline.banded.selected_inverse_banded`). Both solvers
+        fall back on the pseudo-inverse if the system is singular.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="full"
+        The diagnostics to compute, see :func:`one_dimensional_diagnostics`.
+        With `"none"`, the fit only costs one Cholesky decomposition and the
+        diagnostics can be computed later from the returned `system`.
 
     Returns
     -------
-    dict[str, npt.NDArray[np.float_]]
+    dict[str, Any]
         A dictionary containing the following keys:
-        - `y_hat`: A one-dimensional array of shape `(n_obs,)` containing the
-        fitted values.
-        - `beta_hat`: A one-dimensional array of shape `(n_basis,)` containing
-        the estimated coefficients.
+        - `y_hat`: An array of shape `(n_obs,)` or `(n_obs, n_outputs)`
+        containing the fitted values.
+        - `beta_hat`: An array of shape `(n_basis,)` or `(n_basis, n_outputs)`
+        containing the estimated coefficients.
+        - `system`: The factorization of `B'WB + P`, used to compute the
+        diagnostics.
         - `hat_matrix`: A one-dimensional array of shape `(n_obs,)` containing
-        the diagonal of the hat matrix.
+        the diagonal of the hat matrix, shared by all the outputs.
+        - `inv_mat`: The inverse of `B'WB + P`, for the dense solver.
+        - `inv_band`: The band of the inverse of `B'WB + P` in upper banded
+        storage, for the banded solver.
+        - `eff_dimension`, `roughness`, `residuals_std`, `se_eta`: see
+        :func:`one_dimensional_diagnostics`.
 
     Notes
     -----
@@ -168,57 +320,781 @@ def fit_one_dimensional(
         (2023). JOPS: Practical Smoothing with P-Splines.
 
     """
+    if compute_diagnostics not in ("none", "edf", "full"):
+        raise ValueError(
+            "`compute_diagnostics` must be 'none', 'edf' or 'full', got "
+            f"'{compute_diagnostics}'."
+        )
+
     # Get parameters.
     n_basis, n_obs = basis.shape
 
-    # Construct the penalty.
-    diff_mat = np.diff(np.eye(n_basis), n=order_penalty, axis=0)
-
-    # Build the different part of the model.
+    # Build the different part of the model and fit it.
+    system: dict[str, Any] = {}
     if sample_weights is None:
         sample_weights = np.ones(n_obs)
-    weight_mat = np.diag(sample_weights)
+    if solver == "banded":
+        bandwidth = max(basis_bandwidth(basis), order_penalty)
+        with stage("cross_products", basis=basis.shape) as sizes:
+            bwb_band, bwy_mat = banded_cross_products(
+                basis, data, sample_weights, bandwidth
+            )
+            sizes["bwb_band"] = bwb_band.shape
+        pen_band = penalty * _padded_penalty_band(
+            n_basis, order_penalty, bandwidth
+        )
+        try:
+            with stage("factorize", bwb_band=bwb_band.shape):
+                beta_hat, chol = cholesky_solve_banded(
+                    bwb_band + pen_band, bwy_mat
+                )
+        except np.linalg.LinAlgError:
+            # The system is singular, fall back on the pseudo-inverse.
+            with stage("pinv", bwb_mat=(n_basis, n_basis)):
+                system["bwb_mat"] = from_banded(bwb_band)
+                system["inv_mat"] = np.linalg.pinv(
+                    from_banded(bwb_band + pen_band)
+                )
+            beta_hat = system["inv_mat"] @ bwy_mat
+        else:
+            system["bwb_band"], system["chol_band"] = bwb_band, chol
+    elif solver == "dense":
+        basis = _as_matrix(basis)
+        with stage("cross_products", basis=basis.shape) as sizes:
+            if sparse.issparse(basis):
+                weighted_basis = basis.multiply(sample_weights).tocsr()
+                bwb_mat = (weighted_basis @ basis.T).toarray()
+            else:
+                weighted_basis = basis * sample_weights
+                bwb_mat = weighted_basis @ basis.T
+            bwy_mat = weighted_basis @ data
+            sizes["bwb_mat"] = bwb_mat.shape
 
-    bwb_mat = basis @ weight_mat @ basis.T
-    pen_mat = penalty * diff_mat.T @ diff_mat
-    bwy_mat = basis @ weight_mat @ data
+        pen_mat = penalty * penalty_matrix(n_basis, order_penalty)
+        system["bwb_mat"] = bwb_mat
+        try:
+            with stage("factorize", bwb_mat=bwb_mat.shape):
+                system["chol"] = cho_factor(bwb_mat + pen_mat)
+                beta_hat = cho_solve(system["chol"], bwy_mat)
+        except np.linalg.LinAlgError:
+            # The system is singular, fall back on the pseudo-inverse.
+            with stage("pinv", bwb_mat=bwb_mat.shape):
+                system["inv_mat"] = np.linalg.pinv(bwb_mat + pen_mat)
+            beta_hat = system["inv_mat"] @ bwy_mat
+    else:
+        raise ValueError(
+            f"`solver` must be 'dense' or 'banded', got '{solver}'."
+        )
+
+    with stage("fitted_values", basis=basis.shape):
+        if isinstance(basis, CompactBasis):
+            y_hat = basis.dot(beta_hat)
+        else:
+            y_hat = basis.T @ beta_hat
+
+    results = {"y_hat": y_hat, "beta_hat": beta_hat, "system": system}
+    with stage("diagnostics"):
+        results.update(
+            one_dimensional_diagnostics(
+                data,
+                basis,
+                sample_weights,
+                results,
+                order_penalty=order_penalty,
+                compute_diagnostics=compute_diagnostics,
+            )
+        )
+    return results
 
-    # Fit the model
-    inv_mat = np.linalg.pinv(bwb_mat + pen_mat)
-    beta_hat = inv_mat @ bwy_mat
-    y_hat = basis.T @ beta_hat
 
-    # Compute the hat matrix and effective dimension
-    hat_matrix = np.diag(basis.T @ inv_mat @ basis @ weight_mat)
-    eff_dimension = np.sum(hat_matrix)
+def _inverse(system: dict[str, Any]) -> dict[str, Any]:
+    """Compute the inverse, or its band, of a factorized penalized system."""
+    if "inv_mat" in system:
+        return {"inv_mat": system["inv_mat"], "inv_band": None}
+    if "chol_band" in system:
+        return {
+            "inv_mat": None,
+            "inv_band": selected_inverse_banded(system["chol_band"]),
+        }
+    n_basis = system["chol"][0].shape[0]
+    return {
+        "inv_mat": cho_solve(system["chol"], np.eye(n_basis)),
+        "inv_band": None,
+    }
+
+
+def one_dimensional_diagnostics(
+    data: npt.NDArray[np.float_],
+    basis: Any,
+    sample_weights: npt.NDArray[np.float_],
+    results: dict[str, Any],
+    order_penalty: int = 2,
+    compute_diagnostics: str = "full",
+) -> dict[str, Any]:
+    """
+    Compute the diagnostics of a fitted one-dimensional P-splines model.
+
+    The diagnostics reuse the factorization of `B'WB + P` computed by
+    :func:`fit_one_dimensional`, such that they can be computed after the fit,
+    only when they are needed.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An array of shape `(n_obs,)` or `(n_obs, n_outputs)` containing the
+        response variable values.
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        A two-dimensional array of shape `(n_basis, n_obs)` containing the basis
+        matrix.
+    sample_weights: npt.NDArray[np.float_]
+        A one-dimensional array of shape `(n_obs,)` containing the weights for
+        each observation.
+    results: dict[str, Any]
+        The results of :func:`fit_one_dimensional`, containing at least the keys
+        `y_hat`, `beta_hat` and `system`.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="full"
+        The diagnostics to compute. `"none"` computes nothing. `"edf"` computes
+        the effective dimension, the roughness and the standard deviation of
+        the residuals, from the (band of the) inverse of `B'WB + P`. `"full"`
+        computes also the diagonal of the hat matrix and the standard errors.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the keys `hat_matrix`, `eff_dimension`,
+        `roughness`, `residuals_std`, `se_eta`, `inv_mat` and `inv_band`. The
+        diagnostics that are not computed are `None`. The hat matrix and the
+        effective dimension are shared by all the outputs, while the
+        roughness, the standard deviation of the residuals and the standard
+        errors have a trailing outputs axis for multiple outputs.
+
+    """
+    diagnostics: dict[str, Any] = {
+        "hat_matrix": None,
+        "eff_dimension": None,
+        "roughness": None,
+        "residuals_std": None,
+        "se_eta": None,
+        "inv_mat": None,
+        "inv_band": None,
+    }
+    if compute_diagnostics == "none":
+        return diagnostics
+
+    n_basis, n_obs = basis.shape
+    system, beta_hat = results["system"], results["beta_hat"]
+    with stage("inverse", system=(n_basis, n_basis)):
+        diagnostics.update(_inverse(system))
+    if compute_diagnostics == "full":
+        with stage("hat_matrix", basis=basis.shape):
+            if diagnostics["inv_band"] is not None:
+                hat_matrix = banded_quadratic_diagonal(
+                    basis, diagnostics["inv_band"]
+                )
+            else:
+                hat_matrix = diagonal_quadratic_form(
+                    basis, diagnostics["inv_mat"]
+                )
+        hat_matrix = sample_weights * hat_matrix
+        eff_dimension = np.sum(hat_matrix)
+    elif diagnostics["inv_band"] is not None:
+        # The trace of the product of two symmetric banded matrices.
+        products = diagnostics["inv_band"] * system["bwb_band"]
+        eff_dimension = 2 * np.sum(products) - np.sum(products[-1])
+    else:
+        eff_dimension = np.sum(diagnostics["inv_mat"] * system["bwb_mat"])
+
     # Compute the roughness
-    roughness = beta_hat @ diff_mat.T @ diff_mat @ beta_hat
-    roughness = np.sqrt(roughness / (n_basis - order_penalty))
+    diff_beta = np.diff(beta_hat, n=order_penalty, axis=0)
+    roughness = np.sqrt(
+        np.sum(diff_beta**2, axis=0) / (n_basis - order_penalty)
+    )
     # Compute standard deviation of the residuals
     residuals_std = np.sqrt(
-        np.sum((data - y_hat) ** 2) / (n_obs - eff_dimension)
+        np.sum((data - results["y_hat"]) ** 2, axis=0)
+        / (n_obs - eff_dimension)
+    )
+    diagnostics.update(
+        {
+            "eff_dimension": eff_dimension,
+            "roughness": roughness,
+            "residuals_std": residuals_std,
+        }
     )
-    # Compute standard errors on the grid
-    se_eta = np.sqrt(residuals_std**2 * hat_matrix)
+    if compute_diagnostics == "full":
+        # Compute standard errors on the grid
+        diagnostics["hat_matrix"] = hat_matrix
+        diagnostics["se_eta"] = np.sqrt(
+            np.multiply.outer(hat_matrix, residuals_std**2)
+        )
+    return diagnostics
+
+
+def one_dimensional_statistics(
+    data: npt.NDArray[np.float_],
+    basis: Any,
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    bandwidth: int | None = None,
+) -> dict[str, Any]:
+    """
+    Compute the sufficient statistics of a one-dimensional P-splines model.
+
+    The statistics are sums over the observations, such that the statistics of
+    a data set are the sums of the statistics of its chunks. The memory is
+    `O(n_basis * bandwidth)`, whatever the number of observations.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An array of shape `(n_obs,)` or `(n_obs, n_outputs)` containing the
+        response variable values.
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        A two-dimensional array of shape `(n_basis, n_obs)` containing the basis
+        matrix.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        A one-dimensional array of shape `(n_obs,)` containing the weights for
+        each observation. If not provided, all observations are assumed to have
+        equal weight.
+    bandwidth: int | None, default=None
+        The number of super-diagonals of the banded matrices. If not provided,
+        it is the bandwidth of the basis.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the following keys:
+        - `bwb_band`, `bwy_mat`, `ywy`: `B'WB` in upper banded storage, `B'Wy`
+        and `y'Wy`.
+        - `btb_band`, `bty_mat`, `yty`: the same statistics without the
+        weights, used to compute the residual sum of squares.
+        - `n_obs`: the number of observations.
+
+    """
+    n_obs = basis.shape[1]
+    if bandwidth is None:
+        bandwidth = basis_bandwidth(basis)
+    bwb_band, bwy_mat = banded_cross_products(
+        basis, data, np.ones(n_obs), bandwidth
+    )
+    statistics = {
+        "btb_band": bwb_band,
+        "bty_mat": bwy_mat,
+        "yty": np.sum(data**2, axis=0),
+        "n_obs": n_obs,
+    }
+    if sample_weights is not None:
+        weights = sample_weights.reshape((n_obs,) + (1,) * (data.ndim - 1))
+        bwb_band, bwy_mat = banded_cross_products(
+            basis, data, sample_weights, bandwidth
+        )
+        statistics["ywy"] = np.sum(weights * data**2, axis=0)
+    else:
+        statistics["ywy"] = statistics["yty"]
+    statistics["bwb_band"], statistics["bwy_mat"] = bwb_band, bwy_mat
+    return statistics
+
+
+def fit_one_dimensional_statistics(
+    statistics: dict[str, Any],
+    penalty: float = 1.0,
+    order_penalty: int = 2,
+    compute_diagnostics: str = "edf",
+) -> dict[str, Any]:
+    """
+    Fit a one-dimensional P-splines model from its sufficient statistics.
+
+    The coefficients are the same as the ones of :func:`fit_one_dimensional`
+    on the whole data set, with the banded solver.
+
+    Parameters
+    ----------
+    statistics: dict[str, Any]
+        The sufficient statistics, see :func:`one_dimensional_statistics`.
+    penalty: float, default=1.0
+        The penalty parameter for the P-splines model.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="edf"
+        The diagnostics to compute. The observations are not available, such
+        that `"full"` is the same as `"edf"`: the hat matrix and the standard
+        errors on the observations are not computed.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the keys `beta_hat` and `system` and the
+        diagnostics of :func:`one_dimensional_diagnostics`.
+
+    """
+    if compute_diagnostics not in ("none", "edf", "full"):
+        raise ValueError(
+            "`compute_diagnostics` must be 'none', 'edf' or 'full', got "
+            f"'{compute_diagnostics}'."
+        )
+    bwb_band, bwy_mat = statistics["bwb_band"], statistics["bwy_mat"]
+    bandwidth, n_basis = bwb_band.shape[0] - 1, bwb_band.shape[1]
+    if bandwidth < order_penalty:
+        raise ValueError(
+            f"The bandwidth of the statistics must be at least "
+            f"`order_penalty`, got {bandwidth}."
+        )
+
+    pen_band = penalty * _padded_penalty_band(
+        n_basis, order_penalty, bandwidth
+    )
+    system: dict[str, Any] = {}
+    try:
+        beta_hat, chol = cholesky_solve_banded(bwb_band + pen_band, bwy_mat)
+    except np.linalg.LinAlgError:
+        # The system is singular, fall back on the pseudo-inverse.
+        system["bwb_mat"] = from_banded(bwb_band)
+        system["inv_mat"] = np.linalg.pinv(from_banded(bwb_band + pen_band))
+        beta_hat = system["inv_mat"] @ bwy_mat
+    else:
+        system["bwb_band"], system["chol_band"] = bwb_band, chol
+
+    diagnostics: dict[str, Any] = {
+        "hat_matrix": None,
+        "eff_dimension": None,
+        "roughness": None,
+        "residuals_std": None,
+        "se_eta": None,
+        "inv_mat": None,
+        "inv_band": None,
+    }
+    if compute_diagnostics != "none":
+        diagnostics.update(_inverse(system))
+        if diagnostics["inv_band"] is not None:
+            products = diagnostics["inv_band"] * bwb_band
+            eff_dimension = 2 * np.sum(products) - np.sum(products[-1])
+        else:
+            eff_dimension = np.sum(diagnostics["inv_mat"] * system["bwb_mat"])
+        diff_beta = np.diff(beta_hat, n=order_penalty, axis=0)
+        btb_beta = banded_dot(statistics["btb_band"], beta_hat)
+        rss = statistics["yty"] + np.sum(
+            beta_hat * (btb_beta - 2 * statistics["bty_mat"]), axis=0
+        )
+        diagnostics.update(
+            {
+                "eff_dimension": eff_dimension,
+                "roughness": np.sqrt(
+                    np.sum(diff_beta**2, axis=0) / (n_basis - order_penalty)
+                ),
+                "residuals_std": np.sqrt(
+                    np.maximum(rss, 0) / (statistics["n_obs"] - eff_dimension)
+                ),
+            }
+        )
+    results = {"beta_hat": beta_hat, "system": system}
+    results.update(diagnostics)
+    return results
+
+
+def n_dimensional_penalties(
+    n_basis: tuple[int, ...], order_penalty: int = 2
+) -> list[npt.NDArray[np.float_]]:
+    """
+    Compute the penalty matrices of an nD P-splines model.
+
+    Parameters
+    ----------
+    n_basis: tuple[int, ...]
+        The number of basis functions in each dimension, `(m1, m2, ..., mk)`.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+
+    Returns
+    -------
+    list[npt.NDArray[np.float_]]
+        A list of `k` arrays of shape `(m1 * m2 * ... * mk, m1 * m2 * ... * mk)`
+        containing the penalty matrix of each dimension.
+
+    """
+    penalty = KroneckerSumPenalty.from_difference(n_basis, order_penalty)
+    return [penalty.term(axis).toarray() for axis in range(len(n_basis))]
+
+
+def n_dimensional_sparse_penalty(
+    n_basis: tuple[int, ...],
+    penalties: tuple[float, ...],
+    order_penalty: int = 2,
+) -> Any:
+    """
+    Compute the penalty matrix of an nD P-splines model as a sparse array.
+
+    The penalty is the Kronecker sum
+    `sum_i penalties[i] * I x ... x D_i'D_i x ... x I`, whose number of
+    non-zero entries is `O(m1 * ... * mk * order_penalty * k)`.
+
+    Parameters
+    ----------
+    n_basis: tuple[int, ...]
+        The number of basis functions in each dimension, `(m1, m2, ..., mk)`.
+    penalties: tuple[float, ...]
+        A tuple of penalty parameters for each dimension.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+
+    Returns
+    -------
+    scipy.sparse.csc_array
+        A sparse array of shape `(m1 * ... * mk, m1 * ... * mk)`.
+
+    """
+    return n_dimensional_penalty(n_basis, penalties, order_penalty).tosparse()
+
+
+def n_dimensional_cross_products(
+    data: npt.NDArray[np.float_],
+    basis_list: list[npt.NDArray[np.float_]],
+    sample_weights: npt.NDArray[np.float_],
+) -> tuple[
+    npt.NDArray[np.float_],
+    npt.NDArray[np.float_],
+    list[npt.NDArray[np.float_]],
+]:
+    """
+    Compute `B'WB` and `B'Wy` of an nD P-splines model with array arithmetic.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An nD array of shape `(n1, n2, ..., nk)` containing the response
+        variable values. A trailing axis of outputs is also accepted.
+    basis_list: list[npt.NDArray[np.float_]]
+        A list of two-dimensional arrays of shape
+        `(m1, n1), (m2, n2), ..., (mk, nk)` containing the basis matrices for
+        each dimension.
+    sample_weights: npt.NDArray[np.float_]
+        An nD array of shape `(n1, n2, ..., nk)` containing the weights for each
+        observation.
+
+    Returns
+    -------
+    tuple[
+        npt.NDArray[np.float_],
+        npt.NDArray[np.float_],
+        list[npt.NDArray[np.float_]]
+    ]
+        The matrix `B'WB` of shape `(m1 * ... * mk, m1 * ... * mk)`, `B'Wy` of
+        shape `(m1 * ... * mk,)`, or `(m1 * ... * mk, n_outputs)`, and the row
+        tensors of the bases, which are reused to compute the hat matrix.
+
+    """
+    n_basis = tuple(basis.shape[0] for basis in basis_list)
+    with stage("row_tensor") as sizes:
+        tensor_list = [row_tensor(basis.T) for basis in basis_list]
+        sizes["tensors"] = [tensor.shape for tensor in tensor_list]
+
+    with stage("glam_bwb", weights=sample_weights.shape) as sizes:
+        bwb_mat = glam_contract(
+            [tensor.T for tensor in tensor_list], sample_weights
+        )
+        bwb_mat = (
+            bwb_mat.reshape(np.repeat(n_basis, 2))
+            .transpose(create_permutation(2, len(n_basis)))
+            .reshape((np.prod(n_basis), np.prod(n_basis)))
+        )
+        sizes["bwb_mat"] = bwb_mat.shape
+
+    trailing = data.shape[len(n_basis) :]
+    weights = sample_weights.reshape(
+        sample_weights.shape + (1,) * len(trailing)
+    )
+    with stage("glam_bwy", data=data.shape):
+        bwy_mat = glam_contract(basis_list, data * weights)
+    bwy_mat = bwy_mat.reshape((np.prod(n_basis),) + trailing)
+    return bwb_mat, bwy_mat, tensor_list
+
+
+def conjugate_gradient(
+    matvec: Any,
+    rhs: npt.NDArray[np.float_],
+    preconditioner: npt.NDArray[np.float_],
+    tol: float = 1e-10,
+    max_iter: int | None = None,
+) -> tuple[npt.NDArray[np.float_], int, bool]:
+    """Solve a symmetric positive definite system with preconditioned CG.
+
+    The matrix of the system is only accessed through products with nD
+    arrays of the shape of `rhs`, such that it is never formed.
+
+    Parameters
+    ----------
+    matvec: Callable[[npt.NDArray[np.float_]], npt.NDArray[np.float_]]
+        The product of the matrix of the system with a nD array.
+    rhs: npt.NDArray[np.float_]
+        The right-hand side of the system, as a nD array.
+    preconditioner: npt.NDArray[np.float_]
+        A nD array of the shape of `rhs` containing the diagonal of the
+        (Jacobi) preconditioner, i.e. the diagonal of the matrix of the system.
+    tol: float, default=1e-10
+        The tolerance on the relative norm of the residuals.
+    max_iter: int | None, default=None
+        The maximum number of iterations. If not provided, it is set to the
+        ten times the size of `rhs`.
+
+    Returns
+    -------
+    tuple[npt.NDArray[np.float_], int, bool]
+        The solution of the system, the number of iterations and whether the
+        algorithm has converged.
+
+    """
+    if max_iter is None:
+        max_iter = 10 * rhs.size
+    solution = np.zeros_like(rhs)
+    residuals = rhs.copy()
+    rhs_norm = np.linalg.norm(rhs)
+    if rhs_norm == 0:
+        return solution, 0, True
+
+    precond_residuals = residuals / preconditioner
+    direction = precond_residuals.copy()
+    rz_old = np.vdot(residuals, precond_residuals)
+    for n_iter in range(1, max_iter + 1):
+        mat_direction = matvec(direction)
+        step = rz_old / np.vdot(direction, mat_direction)
+        solution += step * direction
+        residuals -= step * mat_direction
+        if np.linalg.norm(residuals) <= tol * rhs_norm:
+            return solution, n_iter, True
+        precond_residuals = residuals / preconditioner
+        rz_new = np.vdot(residuals, precond_residuals)
+        direction = precond_residuals + (rz_new / rz_old) * direction
+        rz_old = rz_new
+    return solution, max_iter, False
+
+
+def _fit_n_dimensional_cg(
+    data: npt.NDArray[np.float_],
+    basis_list: list[Any],
+    sample_weights: npt.NDArray[np.float_],
+    penalties: tuple[float, ...],
+    order_penalty: int,
+    tol: float,
+    max_iter: int | None,
+) -> dict[str, Any]:
+    """Fit an nD P-splines model without forming the normal equations."""
+    n_basis = tuple(basis.shape[0] for basis in basis_list)
+    penalty_op = n_dimensional_penalty(n_basis, penalties, order_penalty)
+
+    # The products with B and B' are applied to nD arrays with GLAM.
+    forward = GlamContraction([basis.T for basis in basis_list], n_basis)
+    backward = GlamContraction(basis_list, sample_weights.shape)
+
+    def matvec(tensor: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
+        result = backward(sample_weights * forward(tensor))
+        return result + penalty_op.matvec(tensor)
+
+    # The diagonal of B'WB is the GLAM product of the squared bases.
+    squared_list = [
+        basis.power(2) if sparse.issparse(basis) else basis**2
+        for basis in basis_list
+    ]
+    diagonal = glam_contract(squared_list, sample_weights)
+    diagonal = diagonal + penalty_op.diag().reshape(n_basis)
+
+    # The outputs, if any, are solved one after the other with the same plans.
+    outputs = data.reshape(data.shape[: len(n_basis)] + (-1,))
+    beta_hat = np.empty(n_basis + (outputs.shape[-1],))
+    n_iter = 0
+    for idx in range(outputs.shape[-1]):
+        bwy_mat = backward(outputs[..., idx] * sample_weights)
+        beta_hat[..., idx], n_iter_output, converged = conjugate_gradient(
+            matvec, bwy_mat, diagonal, tol=tol, max_iter=max_iter
+        )
+        n_iter = max(n_iter, n_iter_output)
+        if not converged:
+            warnings.warn(
+                f"The conjugate gradient did not converge in {n_iter_output} "
+                "iterations.",
+                RuntimeWarning,
+                stacklevel=_external_stacklevel(),
+            )
+    beta_hat = beta_hat.reshape(n_basis + data.shape[len(n_basis) :])
     return {
-        "y_hat": y_hat,
+        "y_hat": glam_contract([basis.T for basis in basis_list], beta_hat),
+        "beta_hat": beta_hat,
+        "system": {},
+        "hat_matrix": None,
+        "eff_dimension": None,
+        "residuals_std": None,
+        "n_iter": n_iter,
+    }
+
+
+def separable_weights(
+    sample_weights: npt.NDArray[np.float_], rtol: float = 1e-10
+) -> list[npt.NDArray[np.float_]] | None:
+    """Factorize nD weights as an outer product of one-dimensional weights.
+
+    If `W = w1 x w2 x ... x wk`, the marginal sum of `W` over all the axes but
+    `i` is proportional to `wi`. The factors are the marginal sums, scaled
+    such that they all have the same mean, `mean(W)**(1 / k)`. For unit
+    weights, the factors are thus unit weights.
+
+    Parameters
+    ----------
+    sample_weights: npt.NDArray[np.float_]
+        An nD array of shape `(n1, n2, ..., nk)` containing the weights for each
+        observation.
+    rtol: float, default=1e-10
+        The relative tolerance of the check of the factorization.
+
+    Returns
+    -------
+    list[npt.NDArray[np.float_]] | None
+        A list of `k` arrays of shape `(n1,), ..., (nk,)` whose outer product
+        is `sample_weights`, or `None` if the weights are not separable, e.g.
+        for incomplete grids.
+
+    Examples
+    --------
+    >>> separable_weights(np.array([[1.0, 2.0], [2.0, 4.0]]))
+    [array([1., 2.]), array([1., 2.])]
+
+    """
+    mean_weights = np.mean(sample_weights)
+    if mean_weights <= 0:
+        return None
+    axes = range(sample_weights.ndim)
+    scale = mean_weights ** (1 / sample_weights.ndim)
+    factors = []
+    for i in axes:
+        marginal = np.sum(sample_weights, axis=tuple(j for j in axes if j != i))
+        factors.append(scale * marginal / np.mean(marginal))
+    outer = functools.reduce(np.multiply.outer, factors)
+    if not np.allclose(
+        outer,
+        sample_weights,
+        rtol=0,
+        atol=rtol * float(np.max(sample_weights)),
+    ):
+        return None
+    return factors
+
+
+def _sandwich_denominator(
+    eigenvalues: list[npt.NDArray[np.float_]], penalties: tuple[float, ...]
+) -> tuple[npt.NDArray[np.float_], npt.NDArray[np.float_]]:
+    """Compute the diagonals of `B'WB` and `B'WB + P` in the eigenbasis."""
+    # As for the other solvers, the dimensions without penalty parameter are
+    # not penalized.
+    penalties = tuple(penalties) + (0.0,) * (len(eigenvalues) - len(penalties))
+    gram = functools.reduce(np.multiply.outer, eigenvalues)
+    denominator = functools.reduce(
+        np.multiply.outer,
+        [
+            values + penalty * (1 - values)
+            for values, penalty in zip(eigenvalues, penalties)
+        ],
+    )
+    return gram, denominator
+
+
+def _safe_inverse(values: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
+    """Invert the non-zero values, as the pseudo-inverse of a diagonal."""
+    is_positive = values > np.finfo(np.float_).eps * np.max(values)
+    return np.divide(1, values, out=np.zeros_like(values), where=is_positive)
+
+
+def sandwich_solve(
+    system: dict[str, Any], penalties: tuple[float, ...]
+) -> npt.NDArray[np.float_]:
+    """Solve the system of a sandwich smoother for new penalties.
+
+    The eigendecompositions of :func:`fit_n_dimensional` with the solver
+    `"sandwich"` do not depend on the penalties, such that a new solve only
+    costs two GLAM products, `O(m1 * ... * mk * (m1 + ... + mk))`.
+
+    Parameters
+    ----------
+    system: dict[str, Any]
+        The `system` returned by :func:`fit_n_dimensional` with the solver
+        `"sandwich"`.
+    penalties: tuple[float, ...]
+        A tuple of penalty parameters for each dimension.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        An nD array of shape `(m1, m2, ..., mk)` containing the estimated
+        coefficients, with the trailing outputs axis of the data if any.
+
+    """
+    _, denominator = _sandwich_denominator(system["eigenvalues"], penalties)
+    inv_denominator = _safe_inverse(denominator)
+    rotated_bwy = system["rotated_bwy"]
+    inv_denominator = inv_denominator.reshape(
+        inv_denominator.shape
+        + (1,) * (rotated_bwy.ndim - inv_denominator.ndim)
+    )
+    return glam_contract(system["transforms"], rotated_bwy * inv_denominator)
+
+
+def _fit_n_dimensional_sandwich(
+    data: npt.NDArray[np.float_],
+    basis_list: list[Any],
+    sample_weights: npt.NDArray[np.float_],
+    penalties: tuple[float, ...],
+    order_penalty: int,
+) -> dict[str, Any]:
+    """Fit an nD sandwich smoother with per-axis eigendecompositions."""
+    weights_list = separable_weights(sample_weights)
+    if weights_list is None:
+        raise ValueError(
+            "The solver 'sandwich' requires separable weights, i.e. complete "
+            "grids; use the solver 'dense' or 'cg'."
+        )
+
+    # For each axis, the generalized eigenvectors `T` of the pencil
+    # `(B'WB, B'WB + D'D)` give `T'(B'WB + D'D)T = I` and `T'B'WBT = diag(a)`,
+    # such that `T'(B'WB + lambda D'D)T = diag(a + lambda (1 - a))`. The
+    # Kronecker product of the `T` then diagonalizes the whole system.
+    transforms, eigenvalues, rotated_bases = [], [], []
+    for basis, weights in zip(basis_list, weights_list):
+        basis = basis.toarray() if sparse.issparse(basis) else basis
+        bwb_mat = (basis * weights) @ basis.T
+        values, transform = eigh(
+            bwb_mat, bwb_mat + penalty_matrix(basis.shape[0], order_penalty)
+        )
+        transforms.append(transform)
+        eigenvalues.append(np.clip(values, 0, 1))
+        rotated_bases.append(transform.T @ basis)
+
+    trailing = data.shape[len(basis_list) :]
+    weights = sample_weights.reshape(
+        sample_weights.shape + (1,) * len(trailing)
+    )
+    system: dict[str, Any] = {
+        "transforms": transforms,
+        "eigenvalues": eigenvalues,
+        "rotated_bases": rotated_bases,
+        "rotated_bwy": glam_contract(rotated_bases, data * weights),
+        "penalties": tuple(penalties),
+    }
+    beta_hat = sandwich_solve(system, penalties)
+    return {
+        "y_hat": glam_contract([basis.T for basis in basis_list], beta_hat),
         "beta_hat": beta_hat,
-        "hat_matrix": hat_matrix,
-        "eff_dimension": eff_dimension,
-        "roughness": roughness,
-        "residuals_std": residuals_std,
-        "se_eta": se_eta,
-        "inv_mat": inv_mat,
+        "system": system,
     }
 
 
 def fit_n_dimensional(
     data: npt.NDArray[np.float_],
-    basis_list: list[npt.NDArray[np.float_]],
+    basis_list: list[Any],
     sample_weights: npt.NDArray[np.float_] | None = None,
     penalties: tuple[float, ...] | None = None,
     order_penalty: int = 2,
-) -> dict[str, npt.NDArray[np.float_]]:
+    solver: str = "dense",
+    tol: float = 1e-10,
+    max_iter: int | None = None,
+    compute_diagnostics: str = "full",
+) -> dict[str, Any]:
     """
     Fit an nD P-splines model to the given data.
 
@@ -227,15 +1103,21 @@ def fit_n_dimensional(
     dictionary containing the fitted values, the estimated coefficients, and the
     hat matrix.
 
+    Several responses observed on the same grid, with the same weights, are
+    fitted at once: `B'WB + P` is factorized once and all the right-hand sides
+    are solved together.
+
     Parameters
     ----------
     data: npt.NDArray[np.float_]
         An nD array of shape `(n1, n2, ..., nk)` containing the response
-        variable values.
+        variable values, or of shape `(n1, n2, ..., nk, n_outputs)` for
+        several responses.
     basis_list: list[npt.NDArray[np.float_]]
         A list of two-dimensional arrays of shape
         `(m1, n1), (m2, n2), ..., (mk, nk)` containing the basis matrices for
-        each dimension.
+        each dimension. Compact bases are converted to sparse arrays, and the
+        row tensors of sparse bases are kept sparse.
     sample_weights: npt.NDArray[np.float_] | None, default=None
         An nD array of shape `(n1, n2, ..., nk)` containing the weights for each
         observation. If not provided, all observations are assumed to have equal
@@ -245,17 +1127,51 @@ def fit_n_dimensional(
         penalty is assumed to be the same for each dimension and equal to 1.
     order_penalty: int, default=2
         The order of the penalty difference matrix.
+    solver: str, {"dense", "cg", "sandwich"}, default="dense"
+        The solver of the penalized least squares problem. `"dense"` forms the
+        matrix `B'WB + P` of shape `(m1 * ... * mk, m1 * ... * mk)` and
+        computes the hat matrix. `"cg"` never forms it: the products
+        `(B'WB + P)v` are computed with array arithmetic on the coefficient
+        tensor and the system is solved with a Jacobi preconditioned conjugate
+        gradient, see :func:`conjugate_gradient`. The memory is then
+        `O(n1 * ... * nk + m1 * ... * mk)`, but the hat matrix is not computed.
+        `"sandwich"` fits the sandwich smoother of [3]_, whose penalty is
+        `P = kron(B1'W1B1 + l1 P1, ..., Bk'WkBk + lk Pk) - B'WB` instead of
+        the sum of the penalties of each dimension. It requires separable
+        weights `W = kron(W1, ..., Wk)`, see :func:`separable_weights`, e.g.
+        complete grids. The system is then a Kronecker product and each axis
+        is diagonalized independently, in `O(m1**3 + ... + mk**3)`. The
+        solution and the diagnostics are exact and cost
+        `O(m1 * ... * mk * (m1 + ... + mk))`, and new penalties are solved
+        with :func:`sandwich_solve`. The additive penalty of the other solvers
+        has no such factorization.
+    tol: float, default=1e-10
+        The tolerance of the conjugate gradient, only used with `"cg"`.
+    max_iter: int | None, default=None
+        The maximum number of iterations of the conjugate gradient, only used
+        with `"cg"`.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="full"
+        The diagnostics to compute, see :func:`n_dimensional_diagnostics`.
+        With `"none"`, the fit only costs one Cholesky decomposition and the
+        diagnostics can be computed later from the returned `system`.
 
     Returns
     -------
-    dict[str, npt.NDArray[np.float_]]
+    dict[str, Any]
         A dictionary containing the following keys:
         - `y_hat`: An nD array of shape `(n1, n2, ..., nk)` containing the
-        fitted values.
+        fitted values, with the trailing outputs axis of `data` if any.
         - `beta_hat`: An nD array of shape `(m1, m2, ..., mk)` containing the
-        estimated coefficients.
+        estimated coefficients, with the trailing outputs axis of `data` if
+        any.
+        - `system`: The factorization of `B'WB + P`, used to compute the
+        diagnostics.
         - `hat_matrix`: A nD array of shape `(n1, n2, ..., nk)` containing the
-        hat matrix.
+        hat matrix, `None` for the solver `"cg"`.
+        - `eff_dimension`, `residuals_std`: see
+        :func:`n_dimensional_diagnostics`.
+        - `n_iter`: The number of iterations of the conjugate gradient, only
+        for the solver `"cg"`.
 
     Notes
     -----
@@ -287,65 +1203,536 @@ def fit_n_dimensional(
         of P-splines. Cambridge University Press, Cambridge.
     .. [2] Eilers, P., Marx, B., Li, B., Gampe, J., Rodriguez-Alvarez, M.X.
         (2023). JOPS: Practical Smoothing with P-Splines.
+    .. [3] Xiao, L., Li, Y., Ruppert, D. (2013). Fast bivariate P-splines: the
+        sandwich smoother. Journal of the Royal Statistical Society: Series B,
+        75(3), 577-599.
 
     """
+    if solver not in ("dense", "cg", "sandwich"):
+        raise ValueError(
+            f"`solver` must be 'dense', 'cg' or 'sandwich', got '{solver}'."
+        )
+    if compute_diagnostics not in ("none", "edf", "full"):
+        raise ValueError(
+            "`compute_diagnostics` must be 'none', 'edf' or 'full', got "
+            f"'{compute_diagnostics}'."
+        )
     if sample_weights is None:
-        sample_weights = np.ones_like(data)
+        sample_weights = np.ones(data.shape[: len(basis_list)])
     if penalties is None:
-        penalties = len(data.shape) * (1,)
+        penalties = len(basis_list) * (1,)
+
+    basis_list = [_as_matrix(basis) for basis in basis_list]
+    bases = [basis.shape for basis in basis_list]
+    if solver == "cg":
+        with stage("conjugate_gradient", bases=bases):
+            return _fit_n_dimensional_cg(
+                data,
+                basis_list,
+                sample_weights,
+                penalties,
+                order_penalty,
+                tol,
+                max_iter,
+            )
+    if solver == "sandwich":
+        with stage("sandwich", bases=bases):
+            results = _fit_n_dimensional_sandwich(
+                data, basis_list, sample_weights, penalties, order_penalty
+            )
+        with stage("diagnostics"):
+            results.update(
+                n_dimensional_diagnostics(
+                    data, sample_weights, results, compute_diagnostics
+                )
+            )
+        return results
 
     n_basis = tuple(basis.shape[0] for basis in basis_list)
-    tensor_list = [row_tensor(basis.T) for basis in basis_list]
-
-    bwb_mat = rotated_h_transform(tensor_list[0].T, sample_weights)
-    for idx in np.arange(1, len(tensor_list)):
-        bwb_mat = rotated_h_transform(tensor_list[idx].T, bwb_mat)
-    bwb_mat = (
-        bwb_mat.reshape(np.repeat(n_basis, 2))
-        .transpose(create_permutation(2, len(n_basis)))
-        .reshape((np.prod(n_basis), np.prod(n_basis)))
-    )
+    with stage("cross_products", bases=bases):
+        bwb_mat, bwy_mat, tensor_list = n_dimensional_cross_products(
+            data, basis_list, sample_weights
+        )
 
     # Penalty
-    eyes_mats = [np.eye(n) for n in n_basis]
-    diff_mats = [
-        np.diff(eyes_mat, n=order_penalty, axis=0) for eyes_mat in eyes_mats
-    ]
-    prod_diff_mats = [diff_mat.T @ diff_mat for diff_mat in diff_mats]
-    pen_mats = tensor_product_penalties(prod_diff_mats)
+    with stage("penalty", bwb_mat=bwb_mat.shape):
+        penalty_mat = n_dimensional_penalty(
+            n_basis, penalties, order_penalty
+        ).toarray()
+
+    # Fit
+    system: dict[str, Any] = {"bwb_mat": bwb_mat, "tensor_list": tensor_list}
+    try:
+        with stage("factorize", bwb_mat=bwb_mat.shape):
+            system["chol"] = cho_factor(bwb_mat + penalty_mat)
+            beta_hat = cho_solve(system["chol"], bwy_mat)
+    except np.linalg.LinAlgError:
+        # The system is singular, fall back on the pseudo-inverse.
+        with stage("pinv", bwb_mat=bwb_mat.shape):
+            system["inv_mat"] = np.linalg.pinv(bwb_mat + penalty_mat)
+        beta_hat = system["inv_mat"] @ bwy_mat
+    beta_hat = beta_hat.reshape(n_basis + data.shape[len(n_basis) :])
+    with stage("fitted_values", data=data.shape):
+        y_hat = glam_contract([basis.T for basis in basis_list], beta_hat)
+
+    results = {"y_hat": y_hat, "beta_hat": beta_hat, "system": system}
+    with stage("diagnostics"):
+        results.update(
+            n_dimensional_diagnostics(
+                data, sample_weights, results, compute_diagnostics
+            )
+        )
+    return results
 
-    penalty_mat = np.sum(
-        [penalty * pen_mat for (penalty, pen_mat) in zip(penalties, pen_mats)],
-        axis=0,
+
+def _scattered_diagnostics(
+    system: dict[str, Any],
+    sample_weights: npt.NDArray[np.float_],
+    compute_diagnostics: str,
+) -> tuple[float, npt.NDArray[np.float_] | None]:
+    """Compute the effective dimension and the hat matrix of a sparse fit.
+
+    Only the band of the inverse of `B'WB + P` is computed, see
+    :func:`~pyspline.banded.selected_inverse_banded`. It contains all the
+    entries between the B-splines that overlap, which are the only ones the
+    diagnostics use.
+    """
+    if "inv_band" not in system:
+        with stage("inverse", system=system["mat"].shape) as sizes:
+            mat_band = sparse_to_banded(system["mat"])
+            bandwidth = mat_band.shape[0] - 1
+            if "inv_mat" not in system:
+                try:
+                    chol = cholesky_banded(mat_band, lower=False)
+                    system["inv_band"] = selected_inverse_banded(chol)
+                except np.linalg.LinAlgError:
+                    # The system is singular, fall back on the
+                    # pseudo-inverse.
+                    system["inv_mat"] = np.linalg.pinv(
+                        system["mat"].toarray()
+                    )
+            if "inv_band" not in system:
+                system["inv_band"] = to_banded(system["inv_mat"], bandwidth)
+            sizes["inv_band"] = system["inv_band"].shape
+    inv_band, tensor = system["inv_band"], system["tensor"]
+    if compute_diagnostics == "edf":
+        bwb_mat = system["bwb_sparse"].tocoo()
+        entries = band_entries(inv_band, bwb_mat.row, bwb_mat.col)
+        eff_dimension = float(np.sum(bwb_mat.data * entries))
+        return eff_dimension, None
+
+    # The diagonal of `W B (B'WB + P)^{-1} B'` only involves the entries of
+    # the inverse between the non-zero B-splines of each observation. The
+    # observations in the same cell of the grid of knots share them. The rows
+    # with fewer non-zero entries are padded with zeros.
+    counts = np.diff(tensor.indptr)
+    n_obs, width = tensor.shape[0], int(np.max(counts, initial=0))
+    rows = np.repeat(np.arange(n_obs), counts)
+    positions = np.arange(tensor.nnz) - np.repeat(tensor.indptr[:-1], counts)
+    values = np.zeros((n_obs, width))
+    values[rows, positions] = tensor.data
+    indices = np.zeros((n_obs, width), dtype=tensor.indices.dtype)
+    indices[counts > 0] = tensor.indices[tensor.indptr[:-1][counts > 0], None]
+    indices[rows, positions] = tensor.indices
+    patterns, inverse = np.unique(indices, axis=0, return_inverse=True)
+    order = np.argsort(inverse.ravel(), kind="stable")
+    bounds = np.searchsorted(
+        inverse.ravel()[order], np.arange(len(patterns) + 1)
     )
+    hat_matrix = np.empty(n_obs)
+    for pattern, lower, upper in zip(patterns, bounds[:-1], bounds[1:]):
+        local = values[order[lower:upper]]
+        block = band_entries(
+            inv_band, pattern[:, np.newaxis], pattern[np.newaxis, :]
+        )
+        hat_matrix[order[lower:upper]] = np.sum(
+            (local @ block) * local, axis=1
+        )
+    hat_matrix *= sample_weights
+    return float(np.sum(hat_matrix)), hat_matrix
 
-    # Last part of the equation
-    bwy_mat = rotated_h_transform(basis_list[0], data * sample_weights)
-    for idx in np.arange(1, len(basis_list)):
-        bwy_mat = rotated_h_transform(basis_list[idx], bwy_mat)
-    bwy_mat = bwy_mat.reshape(np.prod(n_basis))
 
-    # Fit
-    fit = np.linalg.lstsq(bwb_mat + penalty_mat, bwy_mat, rcond=None)
-    y_hat = rotated_h_transform(basis_list[0].T, fit[0].reshape(n_basis))
-    for idx in np.arange(1, len(basis_list)):
-        y_hat = rotated_h_transform(basis_list[idx].T, y_hat)
-
-    # Compute the H matrix
-    rot_hat_mat = np.linalg.pinv(bwb_mat + penalty_mat)
-    rot_hat_mat = (
-        rot_hat_mat.reshape(np.repeat(n_basis, 2))
-        .transpose(create_permutation(2, len(n_basis)))
-        .reshape(tuple(n**2 for n in n_basis))
+def n_dimensional_diagnostics(
+    data: npt.NDArray[np.float_],
+    sample_weights: npt.NDArray[np.float_],
+    results: dict[str, Any],
+    compute_diagnostics: str = "full",
+) -> dict[str, Any]:
+    """
+    Compute the diagnostics of a fitted nD P-splines model.
+
+    The diagnostics reuse the factorization of `B'WB + P` computed by
+    :func:`fit_n_dimensional`, such that they can be computed after the fit,
+    only when they are needed.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An nD array of shape `(n1, n2, ..., nk)` containing the response
+        variable values, with a trailing outputs axis if any.
+    sample_weights: npt.NDArray[np.float_]
+        An nD array of shape `(n1, n2, ..., nk)` containing the weights for each
+        observation.
+    results: dict[str, Any]
+        The results of :func:`fit_n_dimensional`, containing at least the keys
+        `y_hat`, `beta_hat` and `system`.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="full"
+        The diagnostics to compute. `"none"` computes nothing. `"edf"` computes
+        the effective dimension and the standard deviation of the residuals
+        from the inverse of `B'WB + P`. `"full"` computes also the hat matrix.
+        Nothing is computed for a fit with the conjugate gradient.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the keys `hat_matrix`, `eff_dimension` and
+        `residuals_std`. The diagnostics that are not computed are `None`. The
+        standard deviation of the residuals has an outputs axis for multiple
+        outputs.
+
+    """
+    diagnostics: dict[str, Any] = {
+        "hat_matrix": None,
+        "eff_dimension": None,
+        "residuals_std": None,
+    }
+    system = results["system"]
+    is_sandwich = "eigenvalues" in system
+    is_scattered = "bwb_sparse" in system
+    if compute_diagnostics == "none" or not (
+        is_sandwich or is_scattered or "bwb_mat" in system
+    ):
+        return diagnostics
+
+    n_basis = results["beta_hat"].shape[: sample_weights.ndim]
+    if is_sandwich:
+        # `B'WB + P` is diagonal in the eigenbasis, see `sandwich_solve`.
+        gram, denominator = _sandwich_denominator(
+            system["eigenvalues"], system["penalties"]
+        )
+        inv_denominator = _safe_inverse(denominator)
+        if compute_diagnostics == "full":
+            hat_matrix = sample_weights * glam_contract(
+                [(basis**2).T for basis in system["rotated_bases"]],
+                inv_denominator,
+            )
+            eff_dimension = np.sum(hat_matrix)
+            diagnostics["hat_matrix"] = hat_matrix
+        else:
+            eff_dimension = np.sum(gram * inv_denominator)
+    elif is_scattered:
+        eff_dimension, diagnostics["hat_matrix"] = _scattered_diagnostics(
+            system, sample_weights, compute_diagnostics
+        )
+    elif compute_diagnostics == "full":
+        with stage("inverse", system=system["bwb_mat"].shape):
+            inv_mat = _inverse(system)["inv_mat"]
+        # Compute the H matrix
+        with stage("hat_matrix", weights=sample_weights.shape):
+            rot_hat_mat = (
+                inv_mat.reshape(np.tile(n_basis, 2))
+                .transpose(create_permutation(2, len(n_basis)))
+                .reshape(tuple(n**2 for n in n_basis))
+            )
+            hat_matrix = sample_weights * glam_contract(
+                system["tensor_list"], rot_hat_mat
+            )
+        eff_dimension = np.sum(hat_matrix)
+        diagnostics["hat_matrix"] = hat_matrix
+    else:
+        with stage("inverse", system=system["bwb_mat"].shape):
+            inv_mat = _inverse(system)["inv_mat"]
+        eff_dimension = np.sum(inv_mat * system["bwb_mat"])
+
+    is_observed = sample_weights > 0
+    residuals = (data - results["y_hat"])[is_observed]
+    diagnostics["eff_dimension"] = eff_dimension
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # The model may interpolate the data.
+        diagnostics["residuals_std"] = np.sqrt(
+            np.sum(residuals**2, axis=0)
+            / (np.sum(is_observed) - eff_dimension)
+        )
+    return diagnostics
+
+
+def scattered_row_tensor(basis_list: list[Any]) -> Any:
+    """
+    Compute the tensor-product basis of scattered observations.
+
+    The `i`-th observation is the point whose coordinates are the `i`-th
+    observations of each basis. The basis is the sparse row tensor of the
+    bases, see :func:`~pyspline.arrays.sparse_row_tensor`, with
+    `(d1 + 1) * ... * (dk + 1)` non-zero entries per row for B-splines of
+    degrees `d1, ..., dk`.
+
+    Parameters
+    ----------
+    basis_list: list[npt.NDArray[np.float_]]
+        A list of two-dimensional arrays of shape
+        `(m1, n_obs), ..., (mk, n_obs)` containing the basis matrices for
+        each dimension. Sparse and compact bases are also accepted.
+
+    Returns
+    -------
+    scipy.sparse.csr_array
+        A sparse array of shape `(n_obs, m1 * ... * mk)`. The columns are in
+        the C order of the coefficients of shape `(m1, ..., mk)`.
+
+    """
+    tensor = sparse.csr_array(_as_matrix(basis_list[0]).T)
+    for basis in basis_list[1:]:
+        tensor = sparse_row_tensor(tensor, _as_matrix(basis).T)
+    return tensor
+
+
+def n_dimensional_statistics(
+    data: npt.NDArray[np.float_],
+    basis_list: list[Any],
+    sample_weights: npt.NDArray[np.float_] | None = None,
+) -> dict[str, Any]:
+    """
+    Compute the sufficient statistics of an nD P-splines model.
+
+    The observations are scattered, see :func:`scattered_row_tensor`. As in
+    :func:`one_dimensional_statistics`, the statistics of a data set are the
+    sums of the statistics of its chunks, and the memory is
+    `O((m1 * ... * mk)**2)`, whatever the number of observations.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An array of shape `(n_obs,)` or `(n_obs, n_outputs)` containing the
+        response variable values.
+    basis_list: list[npt.NDArray[np.float_]]
+        A list of two-dimensional arrays of shape
+        `(m1, n_obs), (m2, n_obs), ..., (mk, n_obs)` containing the basis
+        matrices for each dimension. Sparse and compact bases are also
+        accepted.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        A one-dimensional array of shape `(n_obs,)` containing the weights for
+        each observation. If not provided, all observations are assumed to have
+        equal weight.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the keys of
+        :func:`one_dimensional_statistics`, where `bwb_band` and `btb_band` are
+        replaced by the dense matrices `bwb_mat` and `btb_mat` of shape
+        `(m1 * ... * mk, m1 * ... * mk)`.
+
+    """
+    tensor = scattered_row_tensor(basis_list)
+    n_obs = tensor.shape[0]
+    statistics = {
+        "btb_mat": (tensor.T @ tensor).toarray(),
+        "bty_mat": tensor.T @ data,
+        "yty": np.sum(data**2, axis=0),
+        "n_obs": n_obs,
+    }
+    if sample_weights is not None:
+        weights = sample_weights.reshape((n_obs,) + (1,) * (data.ndim - 1))
+        weighted_tensor = tensor.multiply(sample_weights[:, np.newaxis]).tocsr()
+        statistics["bwb_mat"] = (tensor.T @ weighted_tensor).toarray()
+        statistics["bwy_mat"] = weighted_tensor.T @ data
+        statistics["ywy"] = np.sum(weights * data**2, axis=0)
+    else:
+        statistics["bwb_mat"] = statistics["btb_mat"]
+        statistics["bwy_mat"] = statistics["bty_mat"]
+        statistics["ywy"] = statistics["yty"]
+    return statistics
+
+
+def fit_n_dimensional_statistics(
+    statistics: dict[str, Any],
+    n_basis: tuple[int, ...],
+    penalties: tuple[float, ...] | None = None,
+    order_penalty: int = 2,
+    compute_diagnostics: str = "edf",
+) -> dict[str, Any]:
+    """
+    Fit an nD P-splines model from its sufficient statistics.
+
+    Parameters
+    ----------
+    statistics: dict[str, Any]
+        The sufficient statistics, see :func:`n_dimensional_statistics`.
+    n_basis: tuple[int, ...]
+        The number of basis functions in each dimension, `(m1, m2, ..., mk)`.
+    penalties: tuple[float, ...] | None, default=None
+        A tuple of penalty parameters for each dimension. If not provided, the
+        penalty is assumed to be the same for each dimension and equal to 1.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="edf"
+        The diagnostics to compute. The observations are not available, such
+        that `"full"` is the same as `"edf"`: the hat matrix is not computed.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the keys `beta_hat`, of shape
+        `(m1, m2, ..., mk)` with a trailing outputs axis if any, `system`,
+        `hat_matrix`, `eff_dimension`, `residuals_std` and `inv_mat`.
+
+    """
+    if compute_diagnostics not in ("none", "edf", "full"):
+        raise ValueError(
+            "`compute_diagnostics` must be 'none', 'edf' or 'full', got "
+            f"'{compute_diagnostics}'."
+        )
+    if penalties is None:
+        penalties = len(n_basis) * (1,)
+    bwb_mat, bwy_mat = statistics["bwb_mat"], statistics["bwy_mat"]
+    penalty_mat = n_dimensional_penalty(
+        n_basis, penalties, order_penalty
+    ).toarray()
+
+    system: dict[str, Any] = {"bwb_mat": bwb_mat}
+    try:
+        system["chol"] = cho_factor(bwb_mat + penalty_mat)
+        beta_hat = cho_solve(system["chol"], bwy_mat)
+    except np.linalg.LinAlgError:
+        # The system is singular, fall back on the pseudo-inverse.
+        system["inv_mat"] = np.linalg.pinv(bwb_mat + penalty_mat)
+        beta_hat = system["inv_mat"] @ bwy_mat
+
+    results: dict[str, Any] = {
+        "beta_hat": beta_hat.reshape(n_basis + bwy_mat.shape[1:]),
+        "system": system,
+        "hat_matrix": None,
+        "eff_dimension": None,
+        "residuals_std": None,
+        "inv_mat": None,
+    }
+    if compute_diagnostics != "none":
+        inv_mat = _inverse(system)["inv_mat"]
+        eff_dimension = np.sum(inv_mat * bwb_mat)
+        rss = statistics["yty"] + np.sum(
+            beta_hat
+            * (statistics["btb_mat"] @ beta_hat - 2 * statistics["bty_mat"]),
+            axis=0,
+        )
+        results.update(
+            {
+                "eff_dimension": eff_dimension,
+                "residuals_std": np.sqrt(
+                    np.maximum(rss, 0) / (statistics["n_obs"] - eff_dimension)
+                ),
+                "inv_mat": inv_mat,
+            }
+        )
+    return results
+
+
+def fit_n_dimensional_scattered(
+    data: npt.NDArray[np.float_],
+    basis_list: list[Any],
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    penalties: tuple[float, ...] | None = None,
+    order_penalty: int = 2,
+    compute_diagnostics: str = "full",
+) -> dict[str, Any]:
+    """
+    Fit an nD P-splines model to scattered data with sparse algebra.
+
+    The observations are not put on a grid: the tensor-product basis of the
+    scattered points, see :func:`scattered_row_tensor`, is sparse, and so are
+    `B'WB`, of bandwidth `O(m2 * ... * mk)`, and the penalty, see
+    :func:`n_dimensional_sparse_penalty`. The system is solved with a sparse
+    LU decomposition, such that the memory grows with `n_obs` and
+    `m1 * ... * mk` instead of the size of the grid of the unique values.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An array of shape `(n_obs,)`, or `(n_obs, n_outputs)` for several
+        responses, containing the response variable values.
+    basis_list: list[npt.NDArray[np.float_]]
+        A list of two-dimensional arrays of shape
+        `(m1, n_obs), ..., (mk, n_obs)` containing the basis matrices for
+        each dimension. Sparse and compact bases are also accepted.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        An array of shape `(n_obs,)` containing the weights for each
+        observation. If not provided, all observations are assumed to have
+        equal weight.
+    penalties: tuple[float, ...] | None, default=None
+        A tuple of penalty parameters for each dimension. If not provided, the
+        penalty is assumed to be the same for each dimension and equal to 1.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+    compute_diagnostics: str, {"none", "edf", "full"}, default="full"
+        The diagnostics to compute, see :func:`n_dimensional_diagnostics`.
+        They only use the entries of the inverse of `B'WB + P` between
+        overlapping B-splines, such that only its band is computed, of
+        bandwidth `O(m2 * ... * mk)`, see
+        :func:`~pyspline.banded.selected_inverse_banded`.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the keys `y_hat`, of shape `(n_obs,)` with the
+        trailing outputs axis of `data` if any, `beta_hat`, of shape
+        `(m1, ..., mk)` with the trailing outputs axis of `data` if any,
+        `system`, `hat_matrix`, of shape `(n_obs,)`, `eff_dimension` and
+        `residuals_std`.
+
+    """
+    if compute_diagnostics not in ("none", "edf", "full"):
+        raise ValueError(
+            "`compute_diagnostics` must be 'none', 'edf' or 'full', got "
+            f"'{compute_diagnostics}'."
+        )
+    if sample_weights is None:
+        sample_weights = np.ones(data.shape[0])
+    if penalties is None:
+        penalties = len(basis_list) * (1,)
+
+    n_basis = tuple(basis.shape[0] for basis in basis_list)
+    with stage("row_tensor") as sizes:
+        tensor = scattered_row_tensor(basis_list)
+        sizes["tensor"], sizes["nnz"] = tensor.shape, tensor.nnz
+    with stage("cross_products", tensor=tensor.shape) as sizes:
+        if all(isinstance(basis, CompactBasis) for basis in basis_list):
+            bwb_mat = tensor_product_gram(basis_list, sample_weights)
+        else:
+            weighted_tensor = tensor.multiply(sample_weights[:, np.newaxis])
+            bwb_mat = (tensor.T @ weighted_tensor.tocsr()).tocsc()
+        bwy_mat = tensor.T @ (
+            sample_weights[:, np.newaxis] * data.reshape(data.shape[0], -1)
+        )
+        sizes["bwb_sparse"], sizes["nnz"] = bwb_mat.shape, bwb_mat.nnz
+    penalty_mat = n_dimensional_sparse_penalty(
+        n_basis, penalties, order_penalty
     )
 
-    hat_matrix = rotated_h_transform(tensor_list[0], rot_hat_mat)
-    for idx in np.arange(1, len(tensor_list)):
-        hat_matrix = rotated_h_transform(tensor_list[idx], hat_matrix)
-    hat_matrix = sample_weights * hat_matrix
+    system: dict[str, Any] = {
+        "bwb_sparse": bwb_mat,
+        "mat": (bwb_mat + penalty_mat).tocsc(),
+        "tensor": tensor,
+    }
+    try:
+        with stage("factorize", mat=bwb_mat.shape):
+            system["lu"] = splu(system["mat"])
+            beta_hat = system["lu"].solve(bwy_mat)
+    except RuntimeError:
+        # The system is singular, fall back on the pseudo-inverse.
+        with stage("pinv", mat=bwb_mat.shape):
+            system["inv_mat"] = np.linalg.pinv(system["mat"].toarray())
+        beta_hat = system["inv_mat"] @ bwy_mat
+    with stage("fitted_values", tensor=tensor.shape):
+        y_hat = (tensor @ beta_hat).reshape(data.shape)
 
-    return {
+    results = {
         "y_hat": y_hat,
-        "beta_hat": fit[0].reshape(n_basis),
-        "hat_matrix": hat_matrix,
+        "beta_hat": beta_hat.reshape(n_basis + data.shape[1:]),
+        "system": system,
     }
+    with stage("diagnostics"):
+        results.update(
+            n_dimensional_diagnostics(
+                data, sample_weights, results, compute_diagnostics
+            )
+        )
+    return results
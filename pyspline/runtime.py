@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Inference runtime
+-----------------
+
+The module scores the models saved by :meth:`~pyspline.psplines.PSplines.save`
+with NumPy only. It does not import scikit-learn nor SciPy, such that
+short-lived workers that only predict start fast. The estimators, in
+:mod:`pyspline.psplines`, are only needed to fit the models.
+
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import numpy.typing as npt
+
+from typing import Any, Sequence
+
+from .arrays import glam_contract
+from .basis import basis_bsplines, tensor_product_dot
+from .io import load_arrays
+from .ppoly import PPoly, bsplines_to_ppoly
+
+
+def _check_X(X: npt.NDArray[np.float_], dimension: int) -> npt.NDArray[Any]:
+    """Convert the predictor variable values to a finite 2D array."""
+    X = np.asarray(X, dtype=np.float_)
+    if X.ndim == 1 and dimension == 1:
+        X = X.reshape(-1, 1)
+    if X.ndim != 2 or X.shape[1] != dimension:
+        raise ValueError(
+            f"`X` must be a two-dimensional array with {dimension} columns, "
+            f"got shape {X.shape}."
+        )
+    if not np.all(np.isfinite(X)):
+        raise ValueError("`X` must not contain NaN or infinity.")
+    return X
+
+
+class SplineModel:
+    """Fitted P-splines model, for inference only.
+
+    Parameters
+    ----------
+    beta_hat: npt.NDArray[np.float_]
+        The coefficients, of shape `(m1, ..., mk)` with a trailing outputs
+        axis if any.
+    n_segments: Sequence[int]
+        The number of evenly spaced segments in each dimension.
+    degree: Sequence[int]
+        The degree of the basis in each dimension.
+    domains: Sequence[tuple[float, float]]
+        The domain of the basis in each dimension.
+
+    Examples
+    --------
+    >>> model = SplineModel(np.arange(5.0), (2,), (3,), [(0.0, 1.0)])
+    >>> model.predict(np.array([[0.0], [0.5], [1.0]]))
+    array([1., 2., 3.])
+
+    """
+
+    def __init__(
+        self,
+        beta_hat: npt.NDArray[np.float_],
+        n_segments: Sequence[int],
+        degree: Sequence[int],
+        domains: Sequence[tuple[float, float]],
+    ) -> None:
+        """Initialize SplineModel object."""
+        dimension = len(domains)
+        if len(n_segments) < dimension or len(degree) < dimension:
+            raise ValueError(
+                f"`n_segments` and `degree` must have {dimension} values, "
+                f"got {len(n_segments)} and {len(degree)}."
+            )
+        self.beta_hat = beta_hat
+        self.n_segments = tuple(int(n) for n in n_segments[:dimension])
+        self.degree = tuple(int(d) for d in degree[:dimension])
+        self.domains = [(float(dmin), float(dmax)) for dmin, dmax in domains]
+
+    @classmethod
+    def load(
+        cls, path: str | os.PathLike[str], mmap: bool = True
+    ) -> SplineModel:
+        """Load a model saved by :meth:`~pyspline.psplines.PSplines.save`.
+
+        Parameters
+        ----------
+        path: str | os.PathLike[str]
+            The path of the file.
+        mmap: bool, default=True
+            If `True`, the coefficients are a read-only memory map of the
+            file, see :func:`~pyspline.io.load_arrays`.
+
+        Returns
+        -------
+        SplineModel
+            The model. The diagnostics are not loaded.
+
+        """
+        metadata, arrays = load_arrays(path, mmap=mmap, names=["beta_hat"])
+        params = metadata["params"]
+        return cls(
+            arrays["beta_hat"],
+            params["n_segments"],
+            params["degree"],
+            [tuple(domain) for domain in metadata["domains"]],
+        )
+
+    @classmethod
+    def from_estimator(cls, estimator: Any) -> SplineModel:
+        """Get the inference model of a fitted estimator.
+
+        Parameters
+        ----------
+        estimator: pyspline.psplines.PSplines
+            The fitted estimator. Its coefficients are shared, not copied.
+
+        Returns
+        -------
+        SplineModel
+            The model.
+
+        """
+        return cls(
+            estimator.beta_hat_,
+            estimator.n_segments,
+            estimator.degree,
+            estimator.domains_,
+        )
+
+    @property
+    def dimension(self) -> int:
+        """Number of predictor variables."""
+        return len(self.domains)
+
+    def _basis(
+        self, argvals: npt.NDArray[np.float_], axis: int, format: str
+    ) -> Any:
+        """Evaluate the B-splines basis of a dimension."""
+        return basis_bsplines(
+            argvals=argvals,
+            n_functions=self.n_segments[axis] + self.degree[axis],
+            degree=self.degree[axis],
+            domain_min=self.domains[axis][0],
+            domain_max=self.domains[axis][1],
+            format=format,
+        )
+
+    def predict(
+        self,
+        X: npt.NDArray[np.float_],
+        grid: bool = True,
+        chunk_size: int = 8192,
+    ) -> npt.NDArray[np.float_]:
+        """Predict the response variable values.
+
+        Parameters
+        ----------
+        X: npt.NDArray[np.float_]
+            An array of shape `(n_obs, dimension)` containing the predictor
+            variable values.
+        grid: bool, default=True
+            If `True`, the predictions are computed on the grid defined by the
+            sorted unique values of each column of `X`. Otherwise, they are
+            computed at each row of `X`, see
+            :meth:`~pyspline.psplines.PSplines.predict`.
+        chunk_size: int, default=8192
+            If `grid=False`, the number of rows processed at once.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            An array containing the estimated response variable values, as
+            returned by :meth:`~pyspline.psplines.PSplines.predict`.
+
+        """
+        X = _check_X(X, self.dimension)
+        if not grid:
+            basis = [
+                self._basis(column, axis, "compact")
+                for axis, column in enumerate(X.T)
+            ]
+            return tensor_product_dot(basis, self.beta_hat, chunk_size)
+        if self.dimension == 1:
+            basis = self._basis(np.unique(X[:, 0]), 0, "compact")
+            return basis.dot(self.beta_hat)  # type: ignore
+        # The bases are dense, as the product of sparse bases needs SciPy.
+        basis_list = [
+            self._basis(np.unique(column), axis, "dense")
+            for axis, column in enumerate(X.T)
+        ]
+        return glam_contract([basis.T for basis in basis_list], self.beta_hat)
+
+    def derivative(
+        self, X: npt.NDArray[np.float_], order_derivative: int = 1
+    ) -> npt.NDArray[np.float_]:
+        """Estimate the derivative of a one-dimensional model.
+
+        Parameters
+        ----------
+        X: npt.NDArray[np.float_]
+            An array of shape `(n_obs, 1)` containing the predictor variable
+            values.
+        order_derivative: int, default=1
+            Order of the derivative to compute.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            The derivative at each row of `X`, as returned by
+            :meth:`~pyspline.psplines.PSplines.derivative`.
+
+        """
+        if self.dimension > 1:
+            raise NotImplementedError("Not implemented for dimension > 1.")
+        X = _check_X(X, 1)
+        width = (self.domains[0][1] - self.domains[0][0]) / self.n_segments[0]
+        beta_hat = (
+            np.diff(self.beta_hat, n=order_derivative, axis=0)
+            / width**order_derivative
+        )
+        basis = basis_bsplines(
+            argvals=X[:, 0],
+            n_functions=self.n_segments[0] + self.degree[0] - order_derivative,
+            degree=self.degree[0] - order_derivative,
+            domain_min=self.domains[0][0],
+            domain_max=self.domains[0][1],
+            format="compact",
+        )
+        return basis.dot(beta_hat)
+
+    def to_ppoly(self, extrapolate: bool = True) -> PPoly:
+        """Convert a one-dimensional model to a piecewise polynomial.
+
+        See :meth:`~pyspline.psplines.PSplines.to_ppoly`.
+
+        """
+        if self.dimension > 1:
+            raise NotImplementedError("Not implemented for dimension > 1.")
+        return bsplines_to_ppoly(
+            self.beta_hat,
+            degree=self.degree[0],
+            domain_min=self.domains[0][0],
+            domain_max=self.domains[0][1],
+            extrapolate=extrapolate,
+        )
+
+
+def load_model(
+    path: str | os.PathLike[str], mmap: bool = True
+) -> SplineModel:
+    """Load a saved model for inference, see :meth:`SplineModel.load`."""
+    return SplineModel.load(path, mmap=mmap)
@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Smoothing parameter selection
+-----------------------------
+
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+from typing import Any
+
+from scipy.linalg import cho_factor, cho_solve, eigh, lapack
+
+from .arrays import glam_contract
+from .banded import banded_cross_products, basis_bandwidth, from_banded
+from .basis import CompactBasis
+from .penalties import KroneckerSumPenalty, penalty_matrix
+from .psplines_inner import _as_matrix, n_dimensional_cross_products
+
+
+def demmler_reinsch(
+    bwb_mat: npt.NDArray[np.float_], pen_mat: npt.NDArray[np.float_]
+) -> tuple[npt.NDArray[np.float_], npt.NDArray[np.float_]]:
+    """Compute the Demmler-Reinsch basis of a penalized system.
+
+    The generalized eigenproblem `P u = s (B'WB + P) u` is solved once. The
+    eigenvectors `U` verify `U'(B'WB + P)U = I` and `U'PU = diag(s)`, such that
+    `U'(B'WB + lambda P)U = I + (lambda - 1) diag(s)` is diagonal for every
+    penalty `lambda`.
+
+    Parameters
+    ----------
+    bwb_mat: npt.NDArray[np.float_]
+        The matrix `B'WB` of shape `(n_basis, n_basis)`.
+    pen_mat: npt.NDArray[np.float_]
+        The penalty matrix `P` of shape `(n_basis, n_basis)`.
+
+    Returns
+    -------
+    tuple[npt.NDArray[np.float_], npt.NDArray[np.float_]]
+        The eigenvalues `s`, in `[0, 1]`, of shape `(n_basis,)` and the
+        eigenvectors `U` of shape `(n_basis, n_basis)`.
+
+    """
+    eigenvalues, eigenvectors = eigh(pen_mat, bwb_mat + pen_mat)
+    return np.clip(eigenvalues, 0, 1), eigenvectors
+
+
+def select_penalty(
+    data: npt.NDArray[np.float_],
+    basis: Any,
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    penalties: npt.NDArray[np.float_] | None = None,
+    order_penalty: int = 2,
+    criterion: str = "gcv",
+) -> dict[str, Any]:
+    """Select the penalty of a one-dimensional P-splines model.
+
+    The matrices `B'WB`, `B'Wy` and `y'Wy` are computed once and the system is
+    diagonalized with :func:`demmler_reinsch`. The GCV and AIC criteria then
+    cost `O(n_basis)` for each penalty of the grid. The leave-one-out
+    cross-validation needs the diagonal of the hat matrix and costs
+    `O(n_obs * n_basis)` for each penalty, and is only computed for the
+    criterion `"cv"`.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        A one-dimensional array of shape `(n_obs,)` containing the response
+        variable values.
+    basis: npt.NDArray[np.float_] | scipy.sparse.sparray | CompactBasis
+        A two-dimensional array of shape `(n_basis, n_obs)` containing the basis
+        matrix.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        A one-dimensional array of shape `(n_obs,)` containing the weights for
+        each observation. If not provided, all observations are assumed to have
+        equal weight.
+    penalties: npt.NDArray[np.float_] | None, default=None
+        The grid of penalties to evaluate. If not provided, the grid is
+        `10 ** np.arange(-4, 6.1, 0.1)`.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+    criterion: str, {"gcv", "aic", "cv"}, default="gcv"
+        The criterion to minimize.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the following keys:
+        - `penalty`: The penalty minimizing the criterion.
+        - `penalties`: The grid of penalties.
+        - `gcv`, `aic`, `cv`: The criteria evaluated on the grid. `cv` is
+        `None` unless `criterion="cv"`.
+        - `eff_dimension`: The effective dimensions evaluated on the grid.
+
+    Notes
+    -----
+    The criteria are defined as in [1]_, Section 3.1. If `n` is the number of
+    observations with non-zero weights, `ED` the effective dimension, `h` the
+    diagonal of the hat matrix and `r` the residuals, we have
+    `GCV = n * sum(w * r**2) / (n - ED)**2`,
+    `AIC = n * log(sum(w * r**2) / n) + 2 * ED` and
+    `CV = sqrt(sum(w * (r / (1 - h))**2) / sum(w))`.
+
+    References
+    ----------
+    .. [1] Eilers, P. H. C., Marx, B. D. (2021). Practical Smoothing: The Joys
+        of P-splines. Cambridge University Press, Cambridge.
+
+    """
+    if criterion not in ("gcv", "aic", "cv"):
+        raise ValueError(
+            f"`criterion` must be 'gcv', 'aic' or 'cv', got '{criterion}'."
+        )
+    if penalties is None:
+        penalties = 10 ** np.arange(-4, 6.1, 0.1)
+    penalties = np.atleast_1d(np.asarray(penalties, dtype=np.float_))
+
+    # Compute the quantities that do not depend on the penalty.
+    n_basis, n_obs = basis.shape
+    if sample_weights is None:
+        sample_weights = np.ones(n_obs)
+    bwb_band, bwy_mat = banded_cross_products(
+        basis, data, sample_weights, basis_bandwidth(basis)
+    )
+    eigenvalues, eigenvectors = demmler_reinsch(
+        from_banded(bwb_band), penalty_matrix(n_basis, order_penalty)
+    )
+    ywy = np.sum(sample_weights * data**2)
+    n_eff = np.sum(sample_weights > 0)
+
+    # Evaluate the criteria on the grid, all at once.
+    bwy_rotated = eigenvectors.T @ bwy_mat
+    shrinkage = 1 / (1 + np.outer(penalties - 1, eigenvalues))
+    alpha = bwy_rotated * shrinkage
+    eff_dimension = shrinkage @ (1 - eigenvalues)
+    rss = ywy - 2 * alpha @ bwy_rotated + alpha**2 @ (1 - eigenvalues)
+    rss = np.maximum(rss, 0)
+    gcv = n_eff * rss / (n_eff - eff_dimension) ** 2
+    aic = n_eff * np.log(rss / n_eff) + 2 * eff_dimension
+
+    # The leave-one-out cross-validation needs the hat matrix diagonal.
+    cv = None
+    if criterion == "cv":
+        if isinstance(basis, CompactBasis):
+            basis_rotated = basis.dot(eigenvectors)
+        else:
+            basis_rotated = basis.T @ eigenvectors
+        basis_squared = basis_rotated**2
+        cv = np.zeros_like(penalties)
+        for idx in range(len(penalties)):
+            y_hat = basis_rotated @ alpha[idx]
+            hat_matrix = sample_weights * (basis_squared @ shrinkage[idx])
+            residuals = (data - y_hat) / (1 - hat_matrix)
+            cv[idx] = np.sqrt(
+                np.sum(sample_weights * residuals**2) / np.sum(sample_weights)
+            )
+
+    criteria = {"gcv": gcv, "aic": aic, "cv": cv}
+    return {
+        "penalty": penalties[np.argmin(criteria[criterion])],
+        "penalties": penalties,
+        "gcv": gcv,
+        "aic": aic,
+        "cv": cv,
+        "eff_dimension": eff_dimension,
+    }
+
+
+def select_penalties_batch(
+    data: npt.NDArray[np.float_],
+    basis_list: list[Any],
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    penalties: npt.NDArray[np.float_] | None = None,
+    order_penalty: int = 2,
+    criterion: str = "gcv",
+) -> dict[str, Any]:
+    """Select a penalty for each of a batch of responses.
+
+    The responses share the design and the weights, such that `B'WB` and the
+    penalty are diagonalized once with :func:`demmler_reinsch`. The criterion
+    of every response for every penalty of the grid is then computed as a
+    product of a `(n_penalties, n_basis)` array with a
+    `(n_basis, n_outputs)` array, and the coefficients of each response are
+    computed for its own selected penalty. For multi-dimensional data, the
+    penalty is isotropic, `lambda * sum(P_j)`.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An array of shape `(n_obs, n_outputs)` in one dimension, or
+        `(n1, n2, ..., nk, n_outputs)` on a grid, containing the response
+        variable values. Without the outputs axis, a single response is
+        assumed.
+    basis_list: list[npt.NDArray[np.float_]]
+        A list of two-dimensional arrays of shape
+        `(m1, n1), (m2, n2), ..., (mk, nk)` containing the basis matrices for
+        each dimension. Sparse and compact bases are also accepted.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        An array of shape `(n_obs,)`, or `(n1, n2, ..., nk)`, containing the
+        weights for each observation, shared by all the responses. If not
+        provided, all observations are assumed to have equal weight.
+    penalties: npt.NDArray[np.float_] | None, default=None
+        The grid of penalties to evaluate. If not provided, the grid is
+        `10 ** np.arange(-4, 6.1, 0.1)`.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+    criterion: str, {"gcv", "reml"}, default="gcv"
+        The criterion to minimize.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the following keys:
+        - `penalty`: An array of shape `(n_outputs,)` containing the selected
+        penalty of each response.
+        - `penalties`: The grid of penalties.
+        - `criteria`: An array of shape `(n_penalties, n_outputs)` containing
+        the criterion evaluated on the grid.
+        - `eff_dimension`: An array of shape `(n_outputs,)` containing the
+        effective dimension of each selected model.
+        - `beta_hat`: An array of shape `(m1, ..., mk, n_outputs)` containing
+        the estimated coefficients.
+        - `y_hat`: An array of shape `(n_obs, n_outputs)`, or
+        `(n1, ..., nk, n_outputs)`, containing the fitted values.
+
+    Notes
+    -----
+    With the Demmler-Reinsch basis `U` and the eigenvalues `s`, the rotated
+    cross-product `z = U'B'Wy` and the shrinkage factors
+    `g = 1 / (1 + (lambda - 1) s)`, the penalized residual sum of squares is
+    `D = y'Wy - sum(g z**2)`, the residual sum of squares is
+    `RSS = D - lambda * sum(s g**2 z**2)` and the effective dimension is
+    `ED = sum(g (1 - s))`. The GCV is defined as in :func:`select_penalty`.
+    The REML criterion, profiled over the residual variance, is (see [1]_)
+
+    `(n - M) * log(D) + sum(log(1 + (lambda - 1) s)) - (m - M) * log(lambda)`,
+
+    up to a constant, where `M = order_penalty**k` is the dimension of the
+    null space of the penalty and `m` is the number of coefficients.
+
+    References
+    ----------
+    .. [1] Wood, S. N. (2011), Fast stable restricted maximum likelihood and
+        marginal likelihood estimation of semiparametric generalized linear
+        models. Journal of the Royal Statistical Society: Series B 73,
+        pp.3--36.
+
+    """
+    if criterion not in ("gcv", "reml"):
+        raise ValueError(
+            f"`criterion` must be 'gcv' or 'reml', got '{criterion}'."
+        )
+    if penalties is None:
+        penalties = 10 ** np.arange(-4, 6.1, 0.1)
+    penalties = np.atleast_1d(np.asarray(penalties, dtype=np.float_))
+    # Compute the quantities that do not depend on the penalty.
+    n_dimension = len(basis_list)
+    data = np.asarray(data, dtype=np.float_)
+    data = data.reshape(data.shape[:n_dimension] + (-1,))
+    if sample_weights is None:
+        sample_weights = np.ones(data.shape[:n_dimension])
+    n_basis = tuple(basis.shape[0] for basis in basis_list)
+    if n_dimension == 1:
+        bwb_band, bwy_mat = banded_cross_products(
+            basis_list[0],
+            data,
+            sample_weights,
+            basis_bandwidth(basis_list[0]),
+        )
+        bwb_mat = from_banded(bwb_band)
+    else:
+        basis_list = [_as_matrix(basis) for basis in basis_list]
+        bwb_mat, bwy_mat, _ = n_dimensional_cross_products(
+            data, basis_list, sample_weights
+        )
+    bwy_mat = bwy_mat.reshape(np.prod(n_basis), -1)
+    pen_mat = KroneckerSumPenalty.from_difference(
+        n_basis, order_penalty
+    ).toarray()
+    eigenvalues, eigenvectors = demmler_reinsch(bwb_mat, pen_mat)
+    weights = sample_weights.reshape(sample_weights.shape + (1,))
+    ywy = np.sum((weights * data**2).reshape(-1, data.shape[-1]), axis=0)
+    n_eff = np.sum(sample_weights > 0)
+
+    # Evaluate the criteria for all the responses and penalties at once.
+    bwy_squared = (eigenvectors.T @ bwy_mat) ** 2
+    shrinkage = 1 / (1 + np.outer(penalties - 1, eigenvalues))
+    eff_dimension = shrinkage @ (1 - eigenvalues)
+    if criterion == "gcv":
+        rss = (
+            ywy
+            - 2 * shrinkage @ bwy_squared
+            + (shrinkage**2 * (1 - eigenvalues)) @ bwy_squared
+        )
+        rss = np.maximum(rss, 0)
+        criteria = n_eff * rss / (n_eff - eff_dimension[:, np.newaxis]) ** 2
+    else:
+        n_null = order_penalty**n_dimension
+        pen_rss = np.maximum(ywy - shrinkage @ bwy_squared, 1e-300)
+        log_det = -np.sum(np.log(shrinkage), axis=1)
+        log_det = log_det - (len(eigenvalues) - n_null) * np.log(penalties)
+        criteria = (n_eff - n_null) * np.log(pen_rss) + log_det[:, np.newaxis]
+
+    # Compute the coefficients of each response for its own penalty.
+    best = np.argmin(criteria, axis=0)
+    alpha = (eigenvectors.T @ bwy_mat) * shrinkage[best].T
+    beta_hat = (eigenvectors @ alpha).reshape(n_basis + (-1,))
+    if n_dimension == 1:
+        basis = basis_list[0]
+        if isinstance(basis, CompactBasis):
+            y_hat = basis.dot(beta_hat)
+        else:
+            y_hat = basis.T @ beta_hat
+    else:
+        y_hat = glam_contract([basis.T for basis in basis_list], beta_hat)
+    return {
+        "penalty": penalties[best],
+        "penalties": penalties,
+        "criteria": criteria,
+        "eff_dimension": eff_dimension[best],
+        "beta_hat": beta_hat,
+        "y_hat": y_hat,
+    }
+
+
+def select_penalties_schall(
+    data: npt.NDArray[np.float_],
+    basis_list: list[Any],
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    penalties: tuple[float, ...] | None = None,
+    order_penalty: int = 2,
+    max_iter: int = 100,
+    tol: float = 1e-6,
+) -> dict[str, Any]:
+    """Estimate the penalties of an nD P-splines model as a mixed model.
+
+    The penalties of all the dimensions are updated jointly with the
+    generalized Fellner-Schall algorithm [2]_, an extension of the Schall
+    algorithm used in `JOPS` [1]_. Each iteration updates the penalty of the
+    dimension `j` as
+
+    `lambda_j <- sigma**2 * lambda_j * (tr(S^- P_j) - tr(H P_j)) / (b' P_j b)`,
+
+    where `S = sum(lambda_j P_j)`, `H = (B'WB + S)^{-1}`, `b` are the current
+    coefficients and `sigma**2` is the current residual variance. The matrices
+    `B'WB` and `B'Wy` are computed once with the array arithmetic of
+    :func:`~pyspline.psplines_inner.n_dimensional_cross_products` and reused at
+    each iteration, as are the dense penalty terms `P_j`. An iteration costs a
+    Cholesky decomposition of `B'WB + S` and the inversion of its factor for
+    the traces, both `O(M**3)` for `M` coefficients, and keeps `k + 3` dense
+    matrices of shape `(M, M)`. The pseudo-inverse `S^-` is computed from the
+    eigenvalues of the one-dimensional penalties.
+
+    Parameters
+    ----------
+    data: npt.NDArray[np.float_]
+        An nD array of shape `(n1, n2, ..., nk)` containing the response
+        variable values.
+    basis_list: list[npt.NDArray[np.float_]]
+        A list of two-dimensional arrays of shape
+        `(m1, n1), (m2, n2), ..., (mk, nk)` containing the basis matrices for
+        each dimension.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        An nD array of shape `(n1, n2, ..., nk)` containing the weights for each
+        observation. If not provided, all observations are assumed to have equal
+        weight.
+    penalties: tuple[float, ...] | None, default=None
+        The initial penalties for each dimension. If not provided, they are all
+        set to 1.
+    order_penalty: int, default=2
+        The order of the penalty difference matrix.
+    max_iter: int, default=100
+        The maximum number of iterations.
+    tol: float, default=1e-6
+        The tolerance on the relative change of the penalties.
+
+    Returns
+    -------
+    dict[str, Any]
+        A dictionary containing the following keys:
+        - `penalties`: The estimated penalties for each dimension.
+        - `beta_hat`: An nD array of shape `(m1, m2, ..., mk)` containing the
+        estimated coefficients.
+        - `y_hat`: An nD array of shape `(n1, n2, ..., nk)` containing the
+        fitted values.
+        - `eff_dimension`: The effective dimension of the model.
+        - `residuals_std`: The standard deviation of the residuals.
+        - `n_iter`: The number of iterations.
+        - `converged`: Whether the algorithm has converged.
+
+    References
+    ----------
+    .. [1] Eilers, P. H. C., Marx, B. D. (2021). Practical Smoothing: The Joys
+        of P-splines. Cambridge University Press, Cambridge.
+    .. [2] Wood, S. N., Fasiolo, M. (2017), A generalized Fellner-Schall method
+        for smoothing parameter optimization with application to Tweedie
+        location, scale and shape models. Biometrics 73, pp.1071--1081.
+
+    """
+    if sample_weights is None:
+        sample_weights = np.ones_like(data, dtype=np.float_)
+    if penalties is None:
+        penalties = len(basis_list) * (1.0,)
+    lambdas = np.asarray(penalties, dtype=np.float_)
+
+    # Compute the quantities that do not depend on the penalties.
+    basis_list = [_as_matrix(basis) for basis in basis_list]
+    n_basis = tuple(basis.shape[0] for basis in basis_list)
+    if len(basis_list) == 1:
+        bwb_band, bwy_mat = banded_cross_products(
+            basis_list[0], data, sample_weights, basis_bandwidth(basis_list[0])
+        )
+        bwb_mat = from_banded(bwb_band)
+    else:
+        bwb_mat, bwy_mat, _ = n_dimensional_cross_products(
+            data, basis_list, sample_weights
+        )
+    penalty = KroneckerSumPenalty.from_difference(n_basis, order_penalty)
+    pen_terms = [penalty.term(axis) for axis in range(len(n_basis))]
+    pen_mats = [pen_term.toarray() for pen_term in pen_terms]
+    ywy = np.sum(sample_weights * data**2)
+    n_eff = np.sum(sample_weights > 0)
+
+    # The eigenvalues of sum(lambda_j P_j) are sums of the eigenvalues of the
+    # one-dimensional penalties.
+    eigenvalues = []
+    for idx, n in enumerate(n_basis):
+        shape = [1] * len(n_basis)
+        shape[idx] = n
+        eigenvalues.append(
+            np.linalg.eigvalsh(penalty_matrix(n, order_penalty)).reshape(shape)
+        )
+
+    converged = False
+    for n_iter in range(1, max_iter + 1):
+        system = bwb_mat.copy()
+        for lamb, pen_mat in zip(lambdas, pen_mats):
+            system += lamb * pen_mat
+        factor = cho_factor(system, overwrite_a=True)
+        beta_hat = cho_solve(factor, bwy_mat)
+        # The inverse from the factor, which LAPACK only fills in the upper
+        # triangle.
+        inv_mat, _ = lapack.dpotri(*factor)
+        inv_mat = np.triu(inv_mat)
+        inv_mat += np.triu(inv_mat, 1).T
+
+        eff_dimension = np.sum(inv_mat * bwb_mat)
+        rss = ywy - 2 * beta_hat @ bwy_mat + beta_hat @ bwb_mat @ beta_hat
+        sigma2 = max(rss, 0) / (n_eff - eff_dimension)
+
+        pen_eigenvalues = np.zeros(n_basis)
+        for lamb, eig in zip(lambdas, eigenvalues):
+            pen_eigenvalues = pen_eigenvalues + lamb * eig
+        is_positive = pen_eigenvalues > 1e-10 * np.max(pen_eigenvalues)
+        new_lambdas = np.zeros_like(lambdas)
+        for idx, (lamb, pen_term) in enumerate(zip(lambdas, pen_terms)):
+            trace_pinv = np.sum(
+                np.broadcast_to(eigenvalues[idx], n_basis)[is_positive]
+                / pen_eigenvalues[is_positive]
+            )
+            ed_penalty = lamb * (trace_pinv - pen_term.trace_dot(inv_mat))
+            roughness = pen_term.quadratic_form(beta_hat)
+            new_lambdas[idx] = (
+                sigma2 * max(ed_penalty, 0) / max(roughness, 1e-300)
+            )
+        new_lambdas = np.clip(new_lambdas, 1e-10, 1e10)
+
+        if np.max(np.abs(np.log(new_lambdas / lambdas))) < tol:
+            converged = True
+            break
+        lambdas = new_lambdas
+
+    beta_hat = beta_hat.reshape(n_basis)
+    y_hat = glam_contract([basis.T for basis in basis_list], beta_hat)
+    return {
+        "penalties": tuple(float(lamb) for lamb in lambdas),
+        "beta_hat": beta_hat,
+        "y_hat": y_hat,
+        "eff_dimension": eff_dimension,
+        "residuals_std": np.sqrt(sigma2),
+        "n_iter": n_iter,
+        "converged": converged,
+    }
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*-coding:utf8 -*
+
+"""
+Sufficient statistics
+---------------------
+
+"""
+
+from __future__ import annotations
+
+import functools
+import operator
+import os
+
+import numpy as np
+import numpy.typing as npt
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any
+
+from .basis import basis_bsplines
+from .psplines_inner import (
+    fit_n_dimensional_statistics,
+    fit_one_dimensional_statistics,
+    n_dimensional_statistics,
+    one_dimensional_statistics,
+)
+
+
+class SplineStats:
+    """Sufficient statistics of a P-splines model.
+
+    The statistics are sums over the observations, such that the statistics
+    of a data set are the sums of the statistics of its shards, whatever the
+    order of the sums. They can thus be computed on separate processes or
+    machines, pickled, and merged with `+` before a single solve. The memory
+    does not depend on the number of observations.
+
+    Parameters
+    ----------
+    n_basis: tuple[int, ...]
+        The number of basis functions in each dimension.
+    statistics: dict[str, Any]
+        The statistics, see
+        :func:`~pyspline.psplines_inner.one_dimensional_statistics` and
+        :func:`~pyspline.psplines_inner.n_dimensional_statistics`.
+    sum_weights: float
+        The sum of the weights of the observations.
+
+    Attributes
+    ----------
+    n_obs: int
+        The number of observations.
+
+    Examples
+    --------
+    >>> x = np.linspace(0, 1, 100)
+    >>> shards = [
+    ...     SplineStats.from_data(
+    ...         np.sin(xx),
+    ...         [basis_bsplines(xx, 10, 3, 0, 1, format="compact")],
+    ...         bandwidth=3,
+    ...     )
+    ...     for xx in (x[:50], x[50:])
+    ... ]
+    >>> stats = sum(shards)
+    >>> stats.solve(penalties=(1.0,))["beta_hat"].shape
+    (10,)
+
+    """
+
+    def __init__(
+        self,
+        n_basis: tuple[int, ...],
+        statistics: dict[str, Any],
+        sum_weights: float,
+    ) -> None:
+        """Initialize SplineStats object."""
+        self.n_basis = tuple(int(n) for n in n_basis)
+        self.statistics = statistics
+        self.sum_weights = float(sum_weights)
+
+    @classmethod
+    def from_data(
+        cls,
+        data: npt.NDArray[np.float_],
+        basis_list: list[Any],
+        sample_weights: npt.NDArray[np.float_] | None = None,
+        bandwidth: int | None = None,
+    ) -> SplineStats:
+        """Compute the statistics of some observations.
+
+        Parameters
+        ----------
+        data: npt.NDArray[np.float_]
+            An array of shape `(n_obs,)` or `(n_obs, n_outputs)` containing
+            the response variable values.
+        basis_list: list[npt.NDArray[np.float_]]
+            A list of two-dimensional arrays of shape
+            `(m1, n_obs), ..., (mk, n_obs)` containing the basis matrices for
+            each dimension, evaluated at the same scattered points. Sparse and
+            compact bases are also accepted.
+        sample_weights: npt.NDArray[np.float_] | None, default=None
+            A one-dimensional array of shape `(n_obs,)` containing the weights
+            for each observation. If not provided, all observations are
+            assumed to have equal weight.
+        bandwidth: int | None, default=None
+            For one-dimensional data, the number of super-diagonals of the
+            banded matrices. It must be at least the order of the penalty
+            used in :meth:`solve`.
+
+        Returns
+        -------
+        SplineStats
+            The statistics.
+
+        """
+        data = np.asarray(data, dtype=np.float_)
+        n_basis = tuple(basis.shape[0] for basis in basis_list)
+        if len(basis_list) == 1:
+            statistics = one_dimensional_statistics(
+                data, basis_list[0], sample_weights, bandwidth
+            )
+        else:
+            statistics = n_dimensional_statistics(
+                data, basis_list, sample_weights
+            )
+        if sample_weights is None:
+            sum_weights = float(data.shape[0])
+        else:
+            sum_weights = float(np.sum(sample_weights))
+        return cls(n_basis, statistics, sum_weights)
+
+    @property
+    def n_obs(self) -> int:
+        """Number of observations."""
+        return int(self.statistics["n_obs"])
+
+    def merge(self, other: SplineStats) -> SplineStats:
+        """Merge the statistics of two disjoint sets of observations.
+
+        Parameters
+        ----------
+        other: SplineStats
+            The statistics of the other observations. They must have been
+            computed with the same bases and bandwidth.
+
+        Returns
+        -------
+        SplineStats
+            The statistics of the union of the observations.
+
+        """
+        if not isinstance(other, SplineStats):
+            raise TypeError(
+                f"Can not merge SplineStats with {type(other).__name__}."
+            )
+        if self.n_basis != other.n_basis or any(
+            np.shape(self.statistics[key]) != np.shape(other.statistics[key])
+            for key in self.statistics
+        ):
+            raise ValueError(
+                "The statistics must have been computed with the same bases, "
+                "bandwidth and number of outputs."
+            )
+        statistics = {
+            key: self.statistics[key] + other.statistics[key]
+            for key in self.statistics
+        }
+        return SplineStats(
+            self.n_basis, statistics, self.sum_weights + other.sum_weights
+        )
+
+    def __add__(self, other: SplineStats) -> SplineStats:
+        """Merge the statistics, see :meth:`merge`."""
+        return self.merge(other)
+
+    def __radd__(self, other: Any) -> SplineStats:
+        """Merge the statistics, such that `sum` can be used."""
+        if isinstance(other, int) and other == 0:
+            return self
+        return self.merge(other)
+
+    def solve(
+        self,
+        penalties: tuple[float, ...] | None = None,
+        order_penalty: int = 2,
+        compute_diagnostics: str = "edf",
+    ) -> dict[str, Any]:
+        """Fit the P-splines model from the statistics.
+
+        Parameters
+        ----------
+        penalties: tuple[float, ...] | None, default=None
+            A tuple of penalty parameters for each dimension. If not provided,
+            they are all equal to 1.
+        order_penalty: int, default=2
+            The order of the penalty difference matrix.
+        compute_diagnostics: str, {"none", "edf", "full"}, default="edf"
+            The diagnostics to compute. The hat matrix is never computed, as
+            the observations are not available.
+
+        Returns
+        -------
+        dict[str, Any]
+            The coefficients `beta_hat`, of shape `(m1, ..., mk)` with a
+            trailing outputs axis if any, the factorization `system` and the
+            diagnostics, see
+            :func:`~pyspline.psplines_inner.fit_one_dimensional_statistics`
+            and :func:`~pyspline.psplines_inner.fit_n_dimensional_statistics`.
+
+        """
+        if penalties is None:
+            penalties = len(self.n_basis) * (1.0,)
+        if len(self.n_basis) == 1:
+            return fit_one_dimensional_statistics(
+                self.statistics,
+                penalty=penalties[0],
+                order_penalty=order_penalty,
+                compute_diagnostics=compute_diagnostics,
+            )
+        return fit_n_dimensional_statistics(
+            self.statistics,
+            self.n_basis,
+            penalties=penalties,
+            order_penalty=order_penalty,
+            compute_diagnostics=compute_diagnostics,
+        )
+
+
+def spline_statistics(
+    X: npt.NDArray[np.float_],
+    y: npt.NDArray[np.float_],
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    *,
+    n_segments: tuple[int, ...],
+    degree: tuple[int, ...],
+    domains: list[tuple[float, float]],
+    order_penalty: int = 2,
+) -> SplineStats:
+    """Compute the statistics of a P-splines model from scattered data.
+
+    Parameters
+    ----------
+    X: npt.NDArray[np.float_], shape=(n_obs, n_dimension)
+        An array containing the predictor variable values.
+    y: npt.NDArray[np.float_], shape=(n_obs,) or (n_obs, n_outputs)
+        An array containing the response variable values.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        An array of shape `(n_obs,)` containing the weights for each
+        observation.
+    n_segments: tuple[int, ...]
+        The number of evenly spaced segments in each dimension.
+    degree: tuple[int, ...]
+        The degree of the basis in each dimension.
+    domains: list[tuple[float, float]]
+        The domain of the basis in each dimension. It must be the same for
+        all the shards.
+    order_penalty: int, default=2
+        The order of the difference penalty, used to set the bandwidth in one
+        dimension.
+
+    Returns
+    -------
+    SplineStats
+        The statistics.
+
+    """
+    X = np.asarray(X, dtype=np.float_).reshape(len(X), -1)
+    basis_list = [
+        basis_bsplines(
+            argvals=column,
+            n_functions=n + d,
+            degree=d,
+            domain_min=domain[0],
+            domain_max=domain[1],
+            format="compact",
+        )
+        for column, n, d, domain in zip(X.T, n_segments, degree, domains)
+    ]
+    return SplineStats.from_data(
+        y,
+        basis_list,
+        sample_weights,
+        bandwidth=max(degree[0], order_penalty),
+    )
+
+
+def _shard_statistics(args: tuple[Any, ...]) -> SplineStats:
+    """Compute the statistics of a shard, in a worker process."""
+    X, y, sample_weights, kwargs = args
+    return spline_statistics(X, y, sample_weights, **kwargs)
+
+
+def parallel_statistics(
+    X: npt.NDArray[np.float_],
+    y: npt.NDArray[np.float_],
+    sample_weights: npt.NDArray[np.float_] | None = None,
+    *,
+    n_segments: tuple[int, ...],
+    degree: tuple[int, ...],
+    domains: list[tuple[float, float]],
+    order_penalty: int = 2,
+    n_shards: int | None = None,
+    executor: Executor | None = None,
+) -> SplineStats:
+    """Compute the statistics of a P-splines model on several processes.
+
+    The observations are split into `n_shards` shards, whose statistics are
+    computed with :func:`spline_statistics` by the workers of `executor`, and
+    merged. The result is the same as with a single shard, up to rounding.
+
+    Parameters
+    ----------
+    X: npt.NDArray[np.float_], shape=(n_obs, n_dimension)
+        An array containing the predictor variable values.
+    y: npt.NDArray[np.float_], shape=(n_obs,) or (n_obs, n_outputs)
+        An array containing the response variable values.
+    sample_weights: npt.NDArray[np.float_] | None, default=None
+        An array of shape `(n_obs,)` containing the weights for each
+        observation.
+    n_segments: tuple[int, ...]
+        The number of evenly spaced segments in each dimension.
+    degree: tuple[int, ...]
+        The degree of the basis in each dimension.
+    domains: list[tuple[float, float]]
+        The domain of the basis in each dimension.
+    order_penalty: int, default=2
+        The order of the difference penalty.
+    n_shards: int | None, default=None
+        The number of shards. If not provided, it is the number of CPUs.
+    executor: concurrent.futures.Executor | None, default=None
+        The executor running the shards. If not provided, a
+        `ProcessPoolExecutor` with `n_shards` workers is created and shut
+        down.
+
+    Returns
+    -------
+    SplineStats
+        The statistics of all the observations.
+
+    """
+    if n_shards is None:
+        n_shards = os.cpu_count() or 1
+    kwargs = {
+        "n_segments": n_segments,
+        "degree": degree,
+        "domains": domains,
+        "order_penalty": order_penalty,
+    }
+    # The shards are contiguous views, not copies of the observations.
+    weights_shards = (
+        [None] * n_shards
+        if sample_weights is None
+        else np.array_split(sample_weights, n_shards)
+    )
+    tasks = [
+        (X_shard, y_shard, weights_shard, kwargs)
+        for X_shard, y_shard, weights_shard in zip(
+            np.array_split(X, n_shards),
+            np.array_split(y, n_shards),
+            weights_shards,
+        )
+        if len(X_shard) > 0
+    ]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=n_shards) as pool:
+            results = list(pool.map(_shard_statistics, tasks))
+    else:
+        results = list(executor.map(_shard_statistics, tasks))
+    return functools.reduce(operator.add, results)
@@ -5,11 +5,16 @@
 import numpy as np
 import pytest
 
+from scipy import sparse
+
 from pyspline.arrays import (
     row_tensor,
+    sparse_row_tensor,
     h_transform,
     rotate,
     rotated_h_transform,
+    GlamContraction,
+    glam_contract,
     create_permutation,
 )
 
@@ -52,6 +57,34 @@ def test_row_tensor_with_mismatched_shapes(data_wrong):
         row_tensor(data_wrong["x"], data_wrong["y"])
 
 
+def test_row_tensor_with_out(data):
+    out = np.zeros((2, 6))
+    result = row_tensor(data["x"], data["y"], out=out)
+    assert result is out
+    np.testing.assert_array_equal(out, row_tensor(data["x"], data["y"]))
+
+
+def test_row_tensor_with_wrong_out(data):
+    with pytest.raises(ValueError):
+        row_tensor(data["x"], data["y"], out=np.zeros((2, 5)))
+
+
+###############################################################################
+# Tests sparse_row_tensor
+def test_sparse_row_tensor(data):
+    x = sparse.csr_array(np.array([[1.0, 0.0], [0.0, 4.0]]))
+    y = sparse.csc_array(data["y"])
+    result = sparse_row_tensor(x, y)
+    assert sparse.issparse(result)
+    np.testing.assert_array_equal(
+        result.toarray(), row_tensor(x.toarray(), data["y"])
+    )
+    assert result.nnz == 6
+    np.testing.assert_array_equal(
+        row_tensor(x).toarray(), row_tensor(x.toarray())
+    )
+
+
 ###############################################################################
 # Tests h_transform
 def test_h_transform(data):
@@ -81,6 +114,67 @@ def test_rotated_h_transform(data):
     np.testing.assert_array_equal(result, expected_result)
 
 
+###############################################################################
+# Tests glam_contract
+@pytest.mark.parametrize("method", ["auto", "matmul", "einsum"])
+def test_glam_contract(method):
+    rng = np.random.default_rng(42)
+    tensor = rng.normal(size=(5, 4, 3))
+    matrices = [
+        rng.normal(size=(2, 5)),
+        rng.normal(size=(6, 4)),
+        rng.normal(size=(3, 3)),
+    ]
+    expected_result = tensor
+    for mat in matrices:
+        expected_result = rotated_h_transform(mat, expected_result)
+    result = glam_contract(matrices, tensor, method=method)
+    assert result.flags.c_contiguous
+    np.testing.assert_array_almost_equal(result, expected_result)
+
+
+def test_glam_contract_trailing_axes():
+    rng = np.random.default_rng(42)
+    tensor = rng.normal(size=(5, 4, 3))
+    matrices = [rng.normal(size=(2, 5)), rng.normal(size=(6, 4))]
+    expected_result = np.einsum("ai,bj,ijk->abk", *matrices, tensor)
+    result = glam_contract(matrices, tensor)
+    np.testing.assert_array_almost_equal(result, expected_result)
+
+
+def test_glam_contract_sparse(data):
+    matrices = [sparse.csr_array(data["x"]), np.eye(3)]
+    result = glam_contract(matrices, data["y"])
+    expected_result = h_transform(data["x"], data["y"])
+    np.testing.assert_array_almost_equal(result, expected_result)
+
+
+def test_glam_contraction_reuse():
+    rng = np.random.default_rng(42)
+    matrices = [rng.normal(size=(7, 3)), rng.normal(size=(8, 4))]
+    plan = GlamContraction(matrices, (3, 4))
+    out = np.zeros((7, 8))
+    for _ in range(2):
+        tensor = rng.normal(size=(3, 4))
+        result = plan(tensor, out=out)
+        assert result is out
+        np.testing.assert_array_almost_equal(
+            out, matrices[0] @ tensor @ matrices[1].T
+        )
+    with pytest.raises(ValueError):
+        plan(np.zeros((4, 3)))
+
+
+def test_glam_contract_wrong_shape(data):
+    with pytest.raises(ValueError):
+        glam_contract([data["y"]], data["y"])
+
+
+def test_glam_contract_wrong_method(data):
+    with pytest.raises(ValueError):
+        glam_contract([data["x"]], data["y"], method="tensordot")
+
+
 ###############################################################################
 # Tests create_permutation
 def test_create_permutation():
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of banded.py file."""
+
+import numpy as np
+import pytest
+
+from scipy import sparse
+
+from pyspline.banded import (
+    banded_cross_products,
+    banded_dot,
+    banded_quadratic_diagonal,
+    basis_bandwidth,
+    cholesky_solve_banded,
+    from_banded,
+    selected_inverse_banded,
+    sparse_to_banded,
+    to_banded,
+)
+from pyspline.basis import basis_bsplines
+
+
+@pytest.fixture
+def data():
+    x = np.linspace(0, 1, 21)
+    y = np.sin(2 * np.pi * x)
+    weights = np.linspace(0.5, 1.5, 21)
+    mat = np.array([[2.0, -1.0, 0.0], [-1.0, 2.0, -1.0], [0.0, -1.0, 2.0]])
+    return {"x": x, "y": y, "weights": weights, "mat": mat}
+
+
+###############################################################################
+# Tests to_banded / from_banded
+def test_to_banded(data):
+    expected_result = np.array([[0.0, -1.0, -1.0], [2.0, 2.0, 2.0]])
+    result = to_banded(data["mat"], 1)
+    np.testing.assert_array_equal(result, expected_result)
+
+
+def test_from_banded(data):
+    result = from_banded(to_banded(data["mat"], 2))
+    np.testing.assert_array_equal(result, data["mat"])
+
+
+def test_sparse_to_banded(data):
+    result = sparse_to_banded(sparse.csc_array(data["mat"]))
+    np.testing.assert_array_equal(result, to_banded(data["mat"], 1))
+    assert sparse_to_banded(sparse.eye(3, format="csr")).shape == (1, 3)
+
+
+###############################################################################
+# Tests basis_bandwidth
+@pytest.mark.parametrize("format", ["dense", "csr", "compact"])
+def test_basis_bandwidth(data, format):
+    basis = basis_bsplines(data["x"], 8, 2, format=format)
+    assert basis_bandwidth(basis) == 2
+
+
+###############################################################################
+# Tests banded_cross_products
+@pytest.mark.parametrize("format", ["dense", "csc", "compact"])
+def test_banded_cross_products(data, format):
+    basis = basis_bsplines(data["x"], 8, 3)
+    expected_bwb = to_banded((basis * data["weights"]) @ basis.T, 3)
+    expected_bwy = basis @ (data["weights"] * data["y"])
+
+    basis = basis_bsplines(data["x"], 8, 3, format=format)
+    bwb, bwy = banded_cross_products(basis, data["y"], data["weights"], 3)
+    np.testing.assert_array_almost_equal(bwb, expected_bwb)
+    np.testing.assert_array_almost_equal(bwy, expected_bwy)
+
+
+###############################################################################
+# Tests cholesky_solve_banded
+def test_cholesky_solve_banded(data):
+    rhs = np.array([1.0, 2.0, 3.0])
+    result, _ = cholesky_solve_banded(to_banded(data["mat"], 1), rhs)
+    np.testing.assert_array_almost_equal(data["mat"] @ result, rhs)
+
+
+###############################################################################
+# Tests selected_inverse_banded
+def test_selected_inverse_banded(data):
+    _, chol = cholesky_solve_banded(to_banded(data["mat"], 1), np.ones(3))
+    expected_result = np.linalg.inv(data["mat"]) * (data["mat"] != 0)
+    result = selected_inverse_banded(chol)
+    np.testing.assert_array_almost_equal(from_banded(result), expected_result)
+
+
+@pytest.mark.parametrize("bandwidth", [0, 5, 150])
+def test_selected_inverse_banded_blocks(bandwidth):
+    # A wide band, as the tensor products of the scattered 3D fits, over
+    # several blocks of columns.
+    rng = np.random.default_rng(42)
+    band = rng.normal(0, 0.1, (bandwidth + 1, 300))
+    band[-1] = 1 + bandwidth
+    mat = from_banded(band)
+    _, chol = cholesky_solve_banded(band, np.ones(300))
+    expected_result = to_banded(np.linalg.inv(mat), bandwidth)
+    result = selected_inverse_banded(chol, block_size=64)
+    np.testing.assert_array_almost_equal(result, expected_result)
+
+
+###############################################################################
+# Tests banded_quadratic_diagonal
+@pytest.mark.parametrize("format", ["dense", "csr", "compact"])
+def test_banded_quadratic_diagonal(data, format):
+    basis = basis_bsplines(data["x"], 3, 1)
+    expected_result = np.diag(basis.T @ data["mat"] @ basis)
+
+    basis = basis_bsplines(data["x"], 3, 1, format=format)
+    result = banded_quadratic_diagonal(basis, to_banded(data["mat"], 1))
+    np.testing.assert_array_almost_equal(result, expected_result)
+
+
+###############################################################################
+# Tests banded_dot
+def test_banded_dot():
+    rng = np.random.default_rng(42)
+    mat = from_banded(rng.normal(size=(3, 8)))
+    vec = rng.normal(size=(8, 2))
+    np.testing.assert_array_almost_equal(
+        banded_dot(to_banded(mat, 2), vec), mat @ vec
+    )
+    np.testing.assert_array_almost_equal(
+        banded_dot(to_banded(mat, 2), vec[:, 0]), mat @ vec[:, 0]
+    )
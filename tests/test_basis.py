@@ -5,7 +5,13 @@
 import numpy as np
 import pytest
 
-from pyspline.basis import tpower, basis_bsplines
+from pyspline.arrays import sparse_row_tensor
+from pyspline.basis import (
+    basis_bsplines,
+    tensor_product_dot,
+    tensor_product_gram,
+    tpower,
+)
 
 
 @pytest.fixture
@@ -81,3 +87,86 @@ def test_basis_bsplines_default(data):
     )
     result = basis_bsplines(data["x"], data["n_functions"], data["p"])
     np.testing.assert_almost_equal(result, expected_result)
+
+
+@pytest.mark.parametrize("format", ["csr", "csc", "compact"])
+def test_basis_bsplines_format(format):
+    x = np.linspace(-0.2, 1.2, 31)
+    expected_result = basis_bsplines(x, 8, 3, 0, 1)
+    result = basis_bsplines(x, 8, 3, 0, 1, format=format)
+    np.testing.assert_almost_equal(result.toarray(), expected_result)
+
+
+def test_basis_bsplines_compact():
+    x = np.linspace(0, 1, 21)
+    basis = basis_bsplines(x, 8, 3, format="compact")
+    coefs = np.arange(8.0)
+
+    assert basis.shape == (8, 21)
+    assert basis.values.shape == (21, 4)
+    np.testing.assert_almost_equal(basis.dot(coefs), coefs @ basis.toarray())
+
+
+def test_basis_bsplines_wrong_format(data):
+    with pytest.raises(ValueError):
+        basis_bsplines(data["x"], format="coo")
+
+
+###############################################################################
+# Tests tensor_product_dot
+@pytest.mark.parametrize("chunk_size", [1, 7, 8192])
+def test_tensor_product_dot(chunk_size):
+    rng = np.random.default_rng(42)
+    X = rng.uniform(size=(50, 3))
+    bases = [
+        basis_bsplines(X[:, idx], n_functions, degree, 0, 1, format="compact")
+        for idx, (n_functions, degree) in enumerate([(6, 3), (5, 2), (4, 1)])
+    ]
+    coefs = rng.normal(size=(6, 5, 4, 2))
+    results = tensor_product_dot(bases, coefs, chunk_size=chunk_size)
+
+    dense = [basis.toarray() for basis in bases]
+    expected = np.einsum("ik,jk,lk,ijlm->km", *dense, coefs)
+    np.testing.assert_array_almost_equal(results, expected)
+    np.testing.assert_array_almost_equal(
+        tensor_product_dot(bases, coefs[..., 0], chunk_size=chunk_size),
+        expected[:, 0],
+    )
+
+
+def test_tensor_product_dot_wrong_shape():
+    x = np.linspace(0, 1, 5)
+    bases = [basis_bsplines(x, 4, 2, format="compact")] * 2
+    with pytest.raises(ValueError):
+        tensor_product_dot(bases, np.ones((4, 5)))
+    short = bases[1]._replace(
+        values=bases[1].values[:3], starts=bases[1].starts[:3]
+    )
+    with pytest.raises(ValueError):
+        tensor_product_dot([bases[0], short], np.ones((4, 4)))
+    with pytest.raises(ValueError):
+        tensor_product_dot(bases, np.ones((4, 4)), chunk_size=0)
+
+
+###############################################################################
+# Tests tensor_product_gram
+@pytest.mark.parametrize("chunk_size", [1, 50, 8192])
+def test_tensor_product_gram(chunk_size):
+    rng = np.random.default_rng(42)
+    X = rng.uniform(0, 1, (200, 3))
+    weights = rng.uniform(0.5, 1.5, 200)
+    bases = [
+        basis_bsplines(X[:, 0], 6, 3, 0, 1, format="compact"),
+        basis_bsplines(X[:, 1], 5, 2, 0, 1, format="compact"),
+        basis_bsplines(X[:, 2], 4, 1, 0, 1, format="compact"),
+    ]
+    tensor = sparse_row_tensor(
+        sparse_row_tensor(bases[0].tosparse().T, bases[1].tosparse().T),
+        bases[2].tosparse().T,
+    ).toarray()
+    expected = tensor.T @ (weights[:, np.newaxis] * tensor)
+
+    gram = tensor_product_gram(bases, weights, chunk_size=chunk_size)
+    assert gram.shape == (120, 120)
+    np.testing.assert_array_almost_equal(gram.toarray(), expected)
+
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of cache.py file."""
+
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from pyspline.basis import basis_bsplines
+from pyspline.cache import BasisCache, basis_nbytes, fingerprint
+
+
+@pytest.fixture
+def basis():
+    return basis_bsplines(np.linspace(0, 1, 50), 8, 3)
+
+
+###############################################################################
+# Tests basis_nbytes
+@pytest.mark.parametrize("format", ["dense", "csr", "csc", "compact"])
+def test_basis_nbytes(format):
+    basis = basis_bsplines(np.linspace(0, 1, 50), 8, 3, format=format)
+    assert basis_nbytes(basis) > 0
+    if format == "dense":
+        assert basis_nbytes(basis) == 8 * 50 * 8
+
+
+###############################################################################
+# Tests fingerprint
+def test_fingerprint():
+    x = np.linspace(0, 1, 50)
+    assert fingerprint(x) == fingerprint(x.copy())
+    assert fingerprint(x) != fingerprint(x[:-1])
+    assert fingerprint(x) != fingerprint(x.astype(np.float32))
+    assert fingerprint(x[::2]) == fingerprint(x[::2].copy())
+
+
+###############################################################################
+# Tests BasisCache
+def test_get_or_compute(basis):
+    cache = BasisCache(max_bytes=10 * basis.nbytes)
+    first = cache.get_or_compute("key", lambda: basis)
+    second = cache.get_or_compute("key", lambda: None)
+
+    assert first is second
+    assert not first.flags.writeable
+    assert cache.info() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "n_entries": 1,
+        "current_bytes": basis.nbytes,
+        "max_bytes": 10 * basis.nbytes,
+    }
+
+
+def test_eviction(basis):
+    cache = BasisCache(max_bytes=2 * basis.nbytes)
+    cache.put("a", basis.copy())
+    cache.put("b", basis.copy())
+    cache.get("a")
+    cache.put("c", basis.copy())
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.info()["evictions"] == 1
+    assert cache.info()["current_bytes"] == 2 * basis.nbytes
+
+
+def test_too_large(basis):
+    cache = BasisCache(max_bytes=basis.nbytes - 1)
+    cache.put("a", basis)
+    assert len(cache) == 0
+    assert basis.flags.writeable
+
+
+def test_clear(basis):
+    cache = BasisCache(max_bytes=10 * basis.nbytes)
+    cache.get_or_compute("a", lambda: basis)
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.info()["misses"] == 0
+
+
+def test_pickle(basis):
+    cache = BasisCache(max_bytes=10 * basis.nbytes)
+    cache.put("a", basis)
+    cache = pickle.loads(pickle.dumps(cache))
+    np.testing.assert_array_equal(cache.get("a"), basis)
+
+
+def test_threads(basis):
+    cache = BasisCache(max_bytes=3 * basis.nbytes)
+
+    def query(i):
+        for j in range(100):
+            cache.get_or_compute((i + j) % 5, basis.copy)
+
+    threads = [threading.Thread(target=query, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    info = cache.info()
+    assert info["hits"] + info["misses"] == 800
+    assert info["current_bytes"] == len(cache) * basis.nbytes
+    assert info["current_bytes"] <= info["max_bytes"]
+
+
+def test_wrong_max_bytes():
+    with pytest.raises(ValueError):
+        BasisCache(max_bytes=-1)
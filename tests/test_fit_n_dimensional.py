@@ -2,10 +2,22 @@
 # -*-coding:utf8 -*
 """Module that contains unit tests for the psplines_inner.py file."""
 
+import functools
+
 import numpy as np
 import pytest
 
-from pyspline.psplines_inner import fit_n_dimensional
+from pyspline.basis import basis_bsplines
+from pyspline.formatter import format_X_y
+from pyspline.psplines_inner import (
+    conjugate_gradient,
+    fit_n_dimensional,
+    fit_n_dimensional_scattered,
+    n_dimensional_penalties,
+    n_dimensional_sparse_penalty,
+    sandwich_solve,
+    separable_weights,
+)
 
 
 @pytest.fixture
@@ -28,3 +40,281 @@ def test_fit_n_dimensional(data):
     np.testing.assert_array_almost_equal(
         result["hat_matrix"], expected_hat_matrix
     )
+
+
+@pytest.mark.parametrize("format", ["dense", "compact"])
+def test_fit_n_dimensional_cg(format):
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 20), np.linspace(0, 1, 15)
+    x3 = np.linspace(0, 1, 10)
+    data = rng.normal(size=(20, 15, 10))
+    sample_weights = rng.uniform(0.5, 1, size=(20, 15, 10))
+    basis = [
+        basis_bsplines(x1, 9, format=format),
+        basis_bsplines(x2, 7, format=format),
+        basis_bsplines(x3, 6, format=format),
+    ]
+    penalties = (1.0, 10.0, 0.1)
+
+    expected = fit_n_dimensional(data, basis, sample_weights, penalties)
+    result = fit_n_dimensional(
+        data, basis, sample_weights, penalties, solver="cg"
+    )
+    np.testing.assert_array_almost_equal(
+        result["beta_hat"], expected["beta_hat"]
+    )
+    np.testing.assert_array_almost_equal(result["y_hat"], expected["y_hat"])
+    assert result["hat_matrix"] is None
+
+
+def test_fit_n_dimensional_cg_not_converged():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 20), np.linspace(0, 1, 15)
+    data = rng.normal(size=(20, 15))
+    basis = [basis_bsplines(x1, 9), basis_bsplines(x2, 7)]
+    with pytest.warns(RuntimeWarning) as records:
+        fit_n_dimensional(data, basis, solver="cg", max_iter=1)
+    # The warning points at the caller, not at the internals.
+    assert records[0].filename == __file__
+
+
+def test_fit_n_dimensional_diagnostics():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 20), np.linspace(0, 1, 15)
+    data = rng.normal(size=(20, 15))
+    basis = [basis_bsplines(x1, 9), basis_bsplines(x2, 7)]
+    expected = fit_n_dimensional(data, basis)
+
+    result = fit_n_dimensional(data, basis, compute_diagnostics="none")
+    np.testing.assert_array_almost_equal(
+        result["beta_hat"], expected["beta_hat"]
+    )
+    assert result["hat_matrix"] is None
+
+    result = fit_n_dimensional(data, basis, compute_diagnostics="edf")
+    np.testing.assert_almost_equal(
+        result["eff_dimension"], expected["eff_dimension"]
+    )
+    np.testing.assert_almost_equal(
+        result["residuals_std"], expected["residuals_std"]
+    )
+
+
+def test_fit_n_dimensional_wrong_solver(data):
+    with pytest.raises(ValueError):
+        fit_n_dimensional(data["data"], data["basis"], solver="banded")
+
+
+def _sandwich_beta(data, basis_list, sample_weights, penalties):
+    """Solve the sandwich smoother normal equations with dense algebra."""
+    factors = functools.reduce(np.multiply.outer, sample_weights)
+    system, basis = np.ones((1, 1)), np.ones((1, 1))
+    for mat, weights, penalty in zip(basis_list, sample_weights, penalties):
+        mat = mat.toarray() if hasattr(mat, "toarray") else mat
+        diff_mat = np.diff(np.eye(mat.shape[0]), n=2, axis=0)
+        system = np.kron(
+            system, (mat * weights) @ mat.T + penalty * diff_mat.T @ diff_mat
+        )
+        basis = np.kron(basis, mat)
+    rhs = basis @ (factors * data).ravel()
+    n_basis = tuple(mat.shape[0] for mat in basis_list)
+    return np.linalg.solve(system, rhs).reshape(n_basis)
+
+
+@pytest.mark.parametrize("format", ["dense", "compact"])
+def test_fit_n_dimensional_sandwich(format):
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 20), np.linspace(0, 1, 15)
+    x3 = np.linspace(0, 1, 10)
+    data = rng.normal(size=(20, 15, 10, 2))
+    sample_weights = functools.reduce(
+        np.multiply.outer, [rng.uniform(0.5, 1, n) for n in (20, 15, 10)]
+    )
+    weights_list = separable_weights(sample_weights)
+    basis_list = [
+        basis_bsplines(x1, 8, 3, format=format),
+        basis_bsplines(x2, 6, 3, format=format),
+        basis_bsplines(x3, 5, 2, format=format),
+    ]
+    result = fit_n_dimensional(
+        data, basis_list, sample_weights, (1.0, 2.0, 0.5), solver="sandwich"
+    )
+
+    assert result["beta_hat"].shape == (8, 6, 5, 2)
+    for idx in range(2):
+        np.testing.assert_array_almost_equal(
+            result["beta_hat"][..., idx],
+            _sandwich_beta(
+                data[..., idx], basis_list, weights_list, (1.0, 2.0, 0.5)
+            ),
+        )
+    np.testing.assert_almost_equal(
+        np.sum(result["hat_matrix"]), result["eff_dimension"]
+    )
+    # The effective dimension is the product of the ones of each dimension.
+    expected_eff_dimension = np.prod(
+        [
+            np.sum(values / (values + penalty * (1 - values)))
+            for values, penalty in zip(
+                result["system"]["eigenvalues"], (1.0, 2.0, 0.5)
+            )
+        ]
+    )
+    np.testing.assert_almost_equal(
+        result["eff_dimension"], expected_eff_dimension
+    )
+
+    result_edf = fit_n_dimensional(
+        data,
+        basis_list,
+        sample_weights,
+        (1.0, 2.0, 0.5),
+        solver="sandwich",
+        compute_diagnostics="edf",
+    )
+    np.testing.assert_almost_equal(
+        result_edf["eff_dimension"], result["eff_dimension"]
+    )
+    np.testing.assert_array_almost_equal(
+        result_edf["residuals_std"], result["residuals_std"]
+    )
+
+
+def test_sandwich_solve():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 20), np.linspace(0, 1, 4)
+    data = rng.normal(size=(20, 4))
+    # More basis functions than points along the second axis.
+    basis_list = [basis_bsplines(x1, 8, 3), basis_bsplines(x2, 6, 3)]
+    result = fit_n_dimensional(
+        data, basis_list, penalties=(1.0, 1.0), solver="sandwich"
+    )
+    np.testing.assert_array_almost_equal(
+        sandwich_solve(result["system"], (10.0, 1.0)),
+        _sandwich_beta(data, basis_list, [np.ones(20), np.ones(4)], (10, 1)),
+    )
+
+
+def test_fit_n_dimensional_sandwich_not_separable(data):
+    with pytest.raises(ValueError):
+        fit_n_dimensional(
+            data["data"],
+            data["basis"],
+            sample_weights=np.array([[1.0, 0.0], [1.0, 1.0]]),
+            solver="sandwich",
+        )
+
+
+###############################################################################
+# Tests fit_n_dimensional_scattered
+@pytest.mark.parametrize("basis_format", ["compact", "csr"])
+@pytest.mark.parametrize("compute_diagnostics", ["none", "edf", "full"])
+def test_fit_n_dimensional_scattered(compute_diagnostics, basis_format):
+    rng = np.random.default_rng(42)
+    X = rng.uniform(0, 1, (300, 2))
+    data = np.column_stack(
+        [np.sin(3 * X[:, 0]) * X[:, 1], X[:, 0] ** 2]
+    ) + rng.normal(0, 0.1, (300, 2))
+    sample_weights = rng.uniform(0.5, 1.5, 300)
+    basis_list = [
+        basis_bsplines(column, 8, 3, 0, 1, format=basis_format)
+        for column in X.T
+    ]
+    result = fit_n_dimensional_scattered(
+        data,
+        basis_list,
+        sample_weights,
+        (1.0, 2.0),
+        compute_diagnostics=compute_diagnostics,
+    )
+
+    # The same model on the (mostly empty) grid of the unique values.
+    grid, data_grid, weights_grid = format_X_y(X, data, sample_weights)
+    expected = fit_n_dimensional(
+        data_grid,
+        [basis_bsplines(x, 8, 3, 0, 1) for x in grid],
+        weights_grid,
+        (1.0, 2.0),
+    )
+    assert result["y_hat"].shape == (300, 2)
+    np.testing.assert_array_almost_equal(
+        result["beta_hat"], expected["beta_hat"]
+    )
+    if compute_diagnostics == "none":
+        assert result["eff_dimension"] is None
+    else:
+        np.testing.assert_almost_equal(
+            result["eff_dimension"], expected["eff_dimension"]
+        )
+        np.testing.assert_array_almost_equal(
+            result["residuals_std"], expected["residuals_std"]
+        )
+    if compute_diagnostics == "full":
+        assert result["hat_matrix"].shape == (300,)
+        np.testing.assert_almost_equal(
+            np.sum(result["hat_matrix"]), expected["eff_dimension"]
+        )
+
+
+def test_n_dimensional_sparse_penalty():
+    penalty_mat = n_dimensional_sparse_penalty((5, 4, 3), (1.0, 2.0, 0.5))
+    expected = sum(
+        penalty * pen_mat
+        for penalty, pen_mat in zip(
+            (1.0, 2.0, 0.5), n_dimensional_penalties((5, 4, 3))
+        )
+    )
+    np.testing.assert_array_almost_equal(penalty_mat.toarray(), expected)
+
+
+###############################################################################
+# Tests separable_weights
+def test_separable_weights():
+    weights = np.multiply.outer([1.0, 2.0, 3.0], [0.5, 1.0])
+    factors = separable_weights(weights)
+    np.testing.assert_array_almost_equal(
+        np.multiply.outer(*factors), weights
+    )
+    assert separable_weights(np.array([[1.0, 0.0], [1.0, 1.0]])) is None
+    assert separable_weights(np.zeros((2, 2))) is None
+
+
+###############################################################################
+# Tests conjugate_gradient
+def test_conjugate_gradient():
+    mat = np.array([[4.0, 1.0], [1.0, 3.0]])
+    rhs = np.array([1.0, 2.0])
+    solution, n_iter, converged = conjugate_gradient(
+        lambda x: mat @ x, rhs, np.diag(mat)
+    )
+    assert converged
+    assert n_iter <= 2
+    np.testing.assert_array_almost_equal(solution, np.linalg.solve(mat, rhs))
+
+
+@pytest.mark.parametrize("solver", ["dense", "cg"])
+def test_fit_n_dimensional_multi_output(solver):
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 20), np.linspace(0, 1, 15)
+    data = rng.normal(size=(20, 15, 2))
+    sample_weights = rng.uniform(0.5, 1, size=(20, 15))
+    basis_list = [basis_bsplines(x1, 8, 3), basis_bsplines(x2, 6, 3)]
+    result = fit_n_dimensional(
+        data, basis_list, sample_weights, (1.0, 2.0), solver=solver
+    )
+
+    assert result["beta_hat"].shape == (8, 6, 2)
+    for idx in range(2):
+        expected = fit_n_dimensional(
+            data[..., idx], basis_list, sample_weights, (1.0, 2.0)
+        )
+        np.testing.assert_array_almost_equal(
+            result["beta_hat"][..., idx], expected["beta_hat"]
+        )
+        np.testing.assert_array_almost_equal(
+            result["y_hat"][..., idx], expected["y_hat"]
+        )
+        if solver == "dense":
+            np.testing.assert_array_almost_equal(
+                result["residuals_std"][idx], expected["residuals_std"]
+            )
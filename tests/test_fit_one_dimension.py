@@ -5,6 +5,8 @@
 import numpy as np
 import pytest
 
+from pyspline.banded import from_banded
+from pyspline.basis import basis_bsplines
 from pyspline.psplines_inner import fit_one_dimensional
 
 
@@ -32,3 +34,87 @@ def test_fit_one_dimensional(data):
     np.testing.assert_array_almost_equal(
         result["hat_matrix"], expected_hat_matrix
     )
+
+
+@pytest.mark.parametrize("format", ["dense", "compact"])
+def test_fit_one_dimensional_banded(format):
+    x = np.linspace(0, 1, 50)
+    y = np.cos(3 * x)
+    expected = fit_one_dimensional(y, basis_bsplines(x, 13), solver="dense")
+
+    basis = basis_bsplines(x, 13, format=format)
+    result = fit_one_dimensional(y, basis, solver="banded")
+    for key in ["y_hat", "beta_hat", "hat_matrix", "eff_dimension", "se_eta"]:
+        np.testing.assert_array_almost_equal(result[key], expected[key])
+    np.testing.assert_array_almost_equal(
+        np.diag(from_banded(result["inv_band"])), np.diag(expected["inv_mat"])
+    )
+
+
+@pytest.mark.parametrize("solver", ["dense", "banded"])
+def test_fit_one_dimensional_diagnostics(solver):
+    x = np.linspace(0, 1, 50)
+    y = np.cos(3 * x)
+    basis = basis_bsplines(x, 13)
+    expected = fit_one_dimensional(y, basis, solver=solver)
+
+    result = fit_one_dimensional(
+        y, basis, solver=solver, compute_diagnostics="none"
+    )
+    np.testing.assert_array_almost_equal(
+        result["beta_hat"], expected["beta_hat"]
+    )
+    assert result["hat_matrix"] is None
+    assert result["eff_dimension"] is None
+
+    result = fit_one_dimensional(
+        y, basis, solver=solver, compute_diagnostics="edf"
+    )
+    for key in ["eff_dimension", "roughness", "residuals_std"]:
+        np.testing.assert_almost_equal(result[key], expected[key])
+    assert result["hat_matrix"] is None
+
+
+def test_fit_one_dimensional_wrong_diagnostics(data):
+    with pytest.raises(ValueError):
+        fit_one_dimensional(
+            data["data"], data["basis"], compute_diagnostics="all"
+        )
+
+
+def test_fit_one_dimensional_wrong_solver(data):
+    with pytest.raises(ValueError):
+        fit_one_dimensional(data["data"], data["basis"], solver="qr")
+
+
+@pytest.mark.parametrize(
+    "format, solver",
+    [("dense", "dense"), ("csr", "dense"), ("dense", "banded"),
+     ("compact", "banded")],
+)
+def test_fit_one_dimensional_multi_output(format, solver):
+    rng = np.random.default_rng(42)
+    x = np.linspace(0, 1, 50)
+    data = rng.normal(size=(50, 3))
+    weights = rng.uniform(0.5, 1.5, size=50)
+    basis = basis_bsplines(x, 12, 3, format=format)
+    result = fit_one_dimensional(
+        data, basis, weights, penalty=0.5, solver=solver
+    )
+
+    assert result["beta_hat"].shape == (12, 3)
+    assert result["se_eta"].shape == (50, 3)
+    for idx in range(3):
+        expected = fit_one_dimensional(
+            data[:, idx], basis, weights, penalty=0.5, solver=solver
+        )
+        for key in ("y_hat", "beta_hat", "roughness", "residuals_std"):
+            np.testing.assert_array_almost_equal(
+                result[key][..., idx], expected[key]
+            )
+        np.testing.assert_array_almost_equal(
+            result["se_eta"][:, idx], expected["se_eta"]
+        )
+        np.testing.assert_array_almost_equal(
+            result["hat_matrix"], expected["hat_matrix"]
+        )
@@ -57,3 +57,49 @@ def test_format_X_y_2d(data_2d):
     np.testing.assert_array_almost_equal(new_X, expected_x)
     np.testing.assert_array_almost_equal(new_y, expected_y)
     np.testing.assert_array_almost_equal(weights, expected_weights)
+
+
+def test_format_X_y_duplicates():
+    X = np.array([[0.0, 0.0], [0.0, 0.0], [1.0, 1.0], [1.0, 0.0]])
+    y = np.array([1.0, 3.0, 0.0, 2.0])
+    weights = np.array([1.0, 3.0, 1.0, 2.0])
+    new_X, new_y, new_weights = format_X_y(X, y, weights)
+
+    expected_y = np.array([[2.5, 0.0], [2.0, 0.0]])
+    expected_weights = np.array([[4.0, 0.0], [2.0, 1.0]])
+
+    np.testing.assert_array_almost_equal(new_y, expected_y)
+    np.testing.assert_array_almost_equal(new_weights, expected_weights)
+
+
+def test_format_X_y_bins():
+    X = np.array([[0.0, 0.0], [0.1, 0.9], [0.45, 1.0], [1.0, 0.2]])
+    y = np.array([1.0, 2.0, 3.0, 4.0])
+    new_X, new_y, weights = format_X_y(X, y, bins=(3, 2))
+
+    expected_x = [np.array([0.0, 0.5, 1.0]), np.array([0.0, 1.0])]
+    expected_y = np.array([[1.0, 2.0], [0.0, 3.0], [4.0, 0.0]])
+    expected_weights = np.array([[1.0, 1.0], [0.0, 1.0], [1.0, 0.0]])
+
+    for x, expected in zip(new_X, expected_x):
+        np.testing.assert_array_almost_equal(x, expected)
+    np.testing.assert_array_almost_equal(new_y, expected_y)
+    np.testing.assert_array_almost_equal(weights, expected_weights)
+
+
+def test_format_X_y_wrong_weights(data_2d):
+    with pytest.raises(ValueError):
+        format_X_y(data_2d["x"], data_2d["y"], np.ones(3))
+
+
+def test_format_X_y_multi_output():
+    X = np.array([[0.0, 0.0], [0.0, 0.0], [1.0, 1.0], [1.0, 0.0]])
+    y = np.array([1.0, 3.0, 0.0, 2.0])
+    weights = np.array([1.0, 3.0, 1.0, 2.0])
+    _, new_y, new_weights = format_X_y(X, np.column_stack([y, -y]), weights)
+    _, expected_y, expected_weights = format_X_y(X, y, weights)
+
+    assert new_y.shape == (2, 2, 2)
+    np.testing.assert_array_almost_equal(new_y[..., 0], expected_y)
+    np.testing.assert_array_almost_equal(new_y[..., 1], -expected_y)
+    np.testing.assert_array_almost_equal(new_weights, expected_weights)
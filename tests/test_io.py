@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of io.py file."""
+
+import numpy as np
+import pytest
+
+from pyspline.io import load_arrays, save_arrays
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(42)
+    return {
+        "coefs": rng.normal(size=(12, 3)),
+        "fortran": np.asfortranarray(rng.normal(size=(4, 5))),
+        "integers": np.arange(6, dtype=np.int32),
+        "scalar": np.array(2.5),
+        "empty": np.zeros((0, 3)),
+    }
+
+
+###############################################################################
+# Tests save_arrays and load_arrays
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_arrays(tmp_path, arrays, mmap):
+    path = tmp_path / "model.npz"
+    save_arrays(path, arrays, {"name": "model", "shape": (2, np.int64(3))})
+    metadata, results = load_arrays(path, mmap=mmap)
+
+    assert metadata["name"] == "model"
+    assert metadata["shape"] == [2, 3]
+    assert set(results) == set(arrays)
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(results[name], array)
+        assert results[name].dtype == array.dtype
+    assert isinstance(results["coefs"], np.memmap) == mmap
+    assert isinstance(results["fortran"], np.memmap) == mmap
+    if mmap:
+        assert not results["coefs"].flags.writeable
+
+
+def test_load_arrays_names(tmp_path, arrays):
+    path = tmp_path / "model.npz"
+    save_arrays(path, arrays, {})
+    _, results = load_arrays(path, names=["coefs"])
+    assert list(results) == ["coefs"]
+
+
+def test_save_load_arrays_errors(tmp_path):
+    path = tmp_path / "model.npz"
+    with pytest.raises(ValueError):
+        save_arrays(path, {"metadata": np.ones(2)}, {})
+    with pytest.raises(ValueError):
+        save_arrays(path, {"objects": np.array([None, 1])}, {})
+    np.savez(path, coefs=np.ones(2))
+    with pytest.raises(ValueError):
+        load_arrays(path)
@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of penalties.py file."""
+
+import numpy as np
+import pytest
+
+from pyspline.banded import from_banded
+from pyspline.penalties import (
+    KroneckerSumPenalty,
+    combined_penalty,
+    difference_coefficients,
+    difference_matrix,
+    penalty_matrix,
+)
+
+
+def _difference(n_basis, order):
+    return np.diff(np.eye(n_basis), n=order, axis=0)
+
+
+###############################################################################
+# Tests difference_matrix
+@pytest.mark.parametrize("order", [0, 1, 2, 3, 4])
+def test_difference_matrix(order):
+    expected = _difference(12, order)
+    np.testing.assert_array_equal(difference_matrix(12, order), expected)
+    np.testing.assert_array_equal(
+        difference_matrix(12, order, format="sparse").toarray(), expected
+    )
+    np.testing.assert_array_equal(
+        difference_coefficients(order), expected[0, : order + 1]
+    )
+
+
+def test_difference_matrix_small():
+    # No differences when the number of basis functions is at most the order,
+    # as with `np.diff`.
+    assert difference_matrix(2, 2).shape == (0, 2)
+    assert difference_matrix(2, 3, format="sparse").shape == (0, 2)
+
+
+def test_difference_matrix_errors():
+    with pytest.raises(ValueError):
+        difference_matrix(10, 2, format="banded")
+    with pytest.raises(ValueError):
+        difference_matrix(10, -1)
+
+
+###############################################################################
+# Tests penalty_matrix
+@pytest.mark.parametrize("order", [0, 1, 2, 3, 4])
+def test_penalty_matrix(order):
+    diff_mat = _difference(12, order)
+    expected = diff_mat.T @ diff_mat
+    np.testing.assert_array_almost_equal(penalty_matrix(12, order), expected)
+    np.testing.assert_array_almost_equal(
+        penalty_matrix(12, order, format="sparse").toarray(), expected
+    )
+    band = penalty_matrix(12, order, format="banded")
+    assert band.shape == (order + 1, 12)
+    np.testing.assert_array_almost_equal(from_banded(band), expected)
+
+
+def test_penalty_matrix_small():
+    np.testing.assert_array_equal(penalty_matrix(2, 2), np.zeros((2, 2)))
+    np.testing.assert_array_equal(
+        penalty_matrix(2, 3, format="sparse").toarray(), np.zeros((2, 2))
+    )
+
+
+def test_penalty_matrix_cache():
+    pen_mat = penalty_matrix(10, 2)
+    assert penalty_matrix(10, 2) is pen_mat
+    assert penalty_matrix(10, 2, format="sparse") is not pen_mat
+    with pytest.raises(ValueError):
+        pen_mat[0, 0] = 1
+    with pytest.raises(ValueError):
+        penalty_matrix(10, 2, format="sparse").data[0] = 1
+
+
+def test_penalty_matrix_errors():
+    with pytest.raises(ValueError):
+        penalty_matrix(10, 2, format="csr")
+    with pytest.raises(ValueError):
+        penalty_matrix(10, -1)
+
+
+###############################################################################
+# Tests combined_penalty
+def test_combined_penalty():
+    rng = np.random.default_rng(42)
+    weights = rng.uniform(0.5, 2, 9)
+    diff_1, diff_3 = _difference(12, 1), _difference(12, 3)
+    expected = 0.5 * diff_1.T @ diff_1
+    expected += 2 * diff_3.T @ (weights[:, None] * diff_3)
+
+    terms = [(0.5, 1), (2.0, 3)]
+    results = combined_penalty(12, terms, weights=[None, weights])
+    np.testing.assert_array_almost_equal(results, expected)
+    results = combined_penalty(
+        12, terms, format="sparse", weights=[None, weights]
+    )
+    np.testing.assert_array_almost_equal(results.toarray(), expected)
+    band = combined_penalty(12, terms, format="banded", weights=[None, weights])
+    assert band.shape == (4, 12)
+    np.testing.assert_array_almost_equal(from_banded(band), expected)
+
+
+def test_combined_penalty_errors():
+    with pytest.raises(ValueError):
+        combined_penalty(10, [])
+    with pytest.raises(ValueError):
+        combined_penalty(10, [(1.0, 2)], weights=[None, None])
+    with pytest.raises(ValueError):
+        combined_penalty(10, [(1.0, 2)], weights=[np.ones(10)])
+
+
+###############################################################################
+# Tests KroneckerSumPenalty
+@pytest.fixture
+def kronecker_sum():
+    penalty = KroneckerSumPenalty.from_difference(
+        (5, 4, 3), 2, (1.0, 2.0, 0.5)
+    )
+    pen_mats = [penalty_matrix(n, 2) for n in (5, 4, 3)]
+    expected = (
+        np.kron(pen_mats[0], np.eye(12))
+        + 2.0 * np.kron(np.eye(5), np.kron(pen_mats[1], np.eye(3)))
+        + 0.5 * np.kron(np.eye(20), pen_mats[2])
+    )
+    return penalty, expected
+
+
+def test_kronecker_sum_matrices(kronecker_sum):
+    penalty, expected = kronecker_sum
+    assert penalty.shape == (60, 60)
+    np.testing.assert_array_almost_equal(penalty.toarray(), expected)
+    np.testing.assert_array_almost_equal(
+        penalty.tosparse(format="csr").toarray(), expected
+    )
+    np.testing.assert_array_almost_equal(penalty.diag(), np.diag(expected))
+
+
+def test_kronecker_sum_products(kronecker_sum):
+    penalty, expected = kronecker_sum
+    rng = np.random.default_rng(42)
+    coefs = rng.normal(size=(60, 2))
+
+    np.testing.assert_array_almost_equal(
+        penalty.matvec(coefs), expected @ coefs
+    )
+    np.testing.assert_array_almost_equal(
+        penalty.matvec(coefs[:, 0].reshape(5, 4, 3)).ravel(),
+        expected @ coefs[:, 0],
+    )
+    np.testing.assert_array_almost_equal(
+        penalty.aslinearoperator() @ coefs, expected @ coefs
+    )
+    np.testing.assert_array_almost_equal(
+        penalty.quadratic_form(coefs),
+        np.einsum("ij,ik,kj->j", coefs, expected, coefs),
+    )
+    mat = rng.normal(size=(60, 60))
+    np.testing.assert_almost_equal(
+        penalty.trace_dot(mat), np.sum(mat * expected)
+    )
+
+
+def test_kronecker_sum_terms(kronecker_sum):
+    penalty, expected = kronecker_sum
+    terms = [penalty.term(axis).toarray() for axis in range(3)]
+    np.testing.assert_array_almost_equal(
+        terms[0] + 2.0 * terms[1] + 0.5 * terms[2], expected
+    )
+    np.testing.assert_array_almost_equal(
+        penalty.with_penalties((1.0, 0.0, 0.0)).toarray(), terms[0]
+    )
+
+
+def test_kronecker_sum_errors():
+    with pytest.raises(ValueError):
+        KroneckerSumPenalty([np.ones((3, 2))])
+    with pytest.raises(ValueError):
+        KroneckerSumPenalty([np.eye(3)], (1.0, 2.0))
+    with pytest.raises(ValueError):
+        KroneckerSumPenalty([np.eye(3)]).matvec(np.ones(4))
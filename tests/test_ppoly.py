@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of ppoly.py file."""
+
+import numpy as np
+import pytest
+
+from pyspline.basis import basis_bsplines
+from pyspline.ppoly import PPoly, bsplines_to_ppoly
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(42)
+    x = np.linspace(-1, 2, 301)
+    coefs = rng.normal(size=(13, 2))
+    return {"x": x, "coefs": coefs}
+
+
+###############################################################################
+# Tests bsplines_to_ppoly
+@pytest.mark.parametrize("degree", [0, 1, 2, 3, 5])
+def test_bsplines_to_ppoly(data, degree):
+    x = data["x"][:-1]
+    coefs = data["coefs"][: 8 + degree]
+    ppoly = bsplines_to_ppoly(coefs, degree, -1, 2)
+    expected = basis_bsplines(x, 8 + degree, degree, -1, 2).T @ coefs
+
+    assert ppoly.n_segments == 8
+    assert ppoly.degree == degree
+    np.testing.assert_array_almost_equal(ppoly(x), expected)
+    np.testing.assert_array_almost_equal(
+        bsplines_to_ppoly(coefs[:, 0], degree, -1, 2)(x), expected[:, 0]
+    )
+
+
+def test_bsplines_to_ppoly_wrong_coefs():
+    with pytest.raises(ValueError):
+        bsplines_to_ppoly(np.ones(3), 3, 0, 1)
+
+
+###############################################################################
+# Tests PPoly
+def test_ppoly_derivative(data):
+    ppoly = bsplines_to_ppoly(data["coefs"], 3, -1, 2)
+    basis = basis_bsplines(data["x"][:-1], 12, 2, -1, 2)
+    expected = basis.T @ np.diff(data["coefs"], axis=0) / ppoly.width
+
+    np.testing.assert_array_almost_equal(
+        ppoly.derivative()(data["x"][:-1]), expected
+    )
+    np.testing.assert_array_almost_equal(
+        ppoly(data["x"], nu=2), ppoly.derivative(2)(data["x"])
+    )
+    np.testing.assert_array_equal(ppoly.derivative(4)(data["x"]), 0)
+    assert ppoly.derivative(5).degree == 0
+
+
+def test_ppoly_antiderivative(data):
+    ppoly = bsplines_to_ppoly(data["coefs"], 3, -1, 2)
+    antiderivative = ppoly.antiderivative()
+    x = np.linspace(-1, 2, 3001)
+    expected = np.trapz(ppoly(x), x, axis=0)
+
+    assert antiderivative.degree == 4
+    np.testing.assert_array_almost_equal(antiderivative(np.array(-1.0)), 0)
+    np.testing.assert_array_almost_equal(
+        antiderivative.derivative()(data["x"]), ppoly(data["x"])
+    )
+    np.testing.assert_array_almost_equal(ppoly.integrate(-1, 2), expected)
+    # The antiderivative is continuous at the breakpoints.
+    breakpoints = ppoly.breakpoints[1:-1]
+    np.testing.assert_array_almost_equal(
+        antiderivative(breakpoints - 1e-12), antiderivative(breakpoints)
+    )
+
+
+def test_ppoly_extrapolate():
+    ppoly = PPoly(np.array([[0.0, 1.0], [1.0, -1.0]]), 0.0, 2.0)
+    np.testing.assert_array_almost_equal(
+        ppoly(np.array([-1.0, 0.5, 3.0])), [-1.0, 0.5, -1.0]
+    )
+    ppoly = PPoly(ppoly.coefs, 0.0, 2.0, extrapolate=False)
+    np.testing.assert_array_equal(
+        ppoly(np.array([-1.0, 0.5, 3.0])), [np.nan, 0.5, np.nan]
+    )
+
+
+def test_ppoly_wrong_init():
+    with pytest.raises(ValueError):
+        PPoly(np.ones(3), 0.0, 1.0)
+    with pytest.raises(ValueError):
+        PPoly(np.ones((3, 2)), 1.0, 1.0)
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of profiling.py file."""
+
+import logging
+import tracemalloc
+
+import numpy as np
+
+from pyspline.profiling import Stage, profile, stage
+
+
+###############################################################################
+# Tests profile
+def test_profile_records():
+    with profile() as profiler:
+        with stage("fit", n_obs=100):
+            with stage("basis") as sizes:
+                basis = np.ones((10, 100_000))
+                sizes["basis"] = basis.shape
+            del basis
+            with stage("solve"):
+                pass
+    assert not tracemalloc.is_tracing()
+    assert [record["stage"] for record in profiler.records] == [
+        "fit/basis",
+        "fit/solve",
+        "fit",
+    ]
+    basis, _, fit = profiler.records
+    assert basis["depth"] == 1 and fit["depth"] == 0
+    assert basis["sizes"] == {"basis": (10, 100_000)}
+    assert fit["sizes"] == {"n_obs": 100}
+    # The peak of a stage includes the peaks of the inner stages.
+    assert basis["peak_bytes"] >= 8 * 10 * 100_000
+    assert fit["peak_bytes"] >= basis["peak_bytes"]
+    assert fit["allocated_bytes"] < 8 * 10 * 100_000
+
+
+def test_profile_disabled():
+    assert isinstance(stage("fit"), Stage)
+    with stage("fit") as sizes:
+        sizes["basis"] = (10, 100)
+    with profile(memory=False) as profiler:
+        with stage("fit"):
+            pass
+    assert profiler.records[0]["peak_bytes"] is None
+
+
+def test_profile_nested():
+    records = []
+    with profile(callback=records.append) as outer:
+        with stage("pipeline"):
+            with profile() as inner:
+                with stage("fit"):
+                    pass
+    assert [record["stage"] for record in inner.records] == ["pipeline/fit"]
+    assert [record["stage"] for record in outer.records] == [
+        "pipeline/fit",
+        "pipeline",
+    ]
+    assert records == outer.records
+
+
+def test_profile_logger(caplog):
+    logger = logging.getLogger("pyspline.test")
+    with caplog.at_level(logging.INFO, logger="pyspline.test"):
+        with profile(logger=logger, level=logging.INFO, memory=False):
+            with stage("fit", n_obs=100):
+                pass
+    assert caplog.records[0].getMessage().startswith("fit: ")
+    assert caplog.records[0].profile["sizes"] == {"n_obs": 100}
+
+
+###############################################################################
+# Tests Profiler.summary
+def test_profiler_summary():
+    with profile() as profiler:
+        for _ in range(3):
+            with stage("predict"):
+                with stage("basis", n_obs=10):
+                    pass
+    summary = profiler.summary()
+    assert list(summary) == ["predict/basis", "predict"]
+    assert summary["predict"]["calls"] == 3
+    assert summary["predict/basis"]["sizes"] == {"n_obs": 10}
+    assert summary["predict"]["wall_time"] == sum(
+        record["wall_time"]
+        for record in profiler.records
+        if record["stage"] == "predict"
+    )
@@ -5,7 +5,7 @@
 import numpy as np
 import pytest
 
-from pyspline.psplines import PSplines
+from pyspline.psplines import PSplines, PSplinesCV
 
 
 @pytest.fixture
@@ -131,3 +131,483 @@ def test_derivative_n_dimensional(data_2d):
     ps.fit(data_2d["x"], data_2d["y"])
     with pytest.raises(NotImplementedError):
         ps.derivative(X=data_2d["x"], order_derivative=1)
+
+
+@pytest.mark.parametrize("basis_format", ["csr", "compact"])
+def test_fit_one_dimensional_basis_format(data, basis_format):
+    ps = PSplines(n_segments=(5,), basis_format=basis_format)
+    ps.fit(data["x"].reshape(-1, 1), data["y"])
+    pred = ps.predict(np.array([2.5, 4.5]).reshape(-1, 1))
+
+    expected_beta = np.array([0.2, 1.0, 1.8, 2.6, 3.4, 4.2, 5.0, 5.8])
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected_beta)
+    np.testing.assert_array_almost_equal(pred, np.array([2.5, 4.5]))
+
+
+def test_fit_one_dimensional_solver(data):
+    ps_dense = PSplines(n_segments=(5,), solver="dense")
+    ps_dense.fit(data["x"].reshape(-1, 1), data["y"])
+    ps_banded = PSplines(n_segments=(5,), solver="banded")
+    ps_banded.fit(data["x"].reshape(-1, 1), data["y"])
+
+    np.testing.assert_array_almost_equal(
+        ps_banded.beta_hat_, ps_dense.beta_hat_
+    )
+    np.testing.assert_array_almost_equal(
+        ps_banded.diagnostics_["hat_matrix"],
+        ps_dense.diagnostics_["hat_matrix"],
+    )
+
+
+@pytest.mark.parametrize("solver", ["dense", "banded"])
+def test_psplines_lazy_diagnostics(data, solver):
+    X = data["x"].reshape(-1, 1)
+    expected = PSplines(n_segments=(5,), solver=solver).fit(X, data["y"])
+    ps = PSplines(n_segments=(5,), solver=solver, compute_diagnostics="none")
+    ps.fit(X, data["y"])
+
+    assert ps._diagnostics["hat_matrix"] is None
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+    np.testing.assert_array_almost_equal(
+        ps.diagnostics_["hat_matrix"], expected.diagnostics_["hat_matrix"]
+    )
+    assert ps.diagnostics_ is ps.diagnostics_
+    np.testing.assert_array_almost_equal(ps.errors(X), expected.errors(X))
+
+
+###############################################################################
+# Tests PSplinesCV
+def test_psplines_cv():
+    x = np.linspace(0, 1, 50)
+    y = np.sin(2 * np.pi * x)
+    penalties = np.array([0.1, 1.0, 10.0])
+    ps = PSplinesCV(penalties=penalties, criterion="aic")
+    ps.fit(x.reshape(-1, 1), y)
+
+    expected = PSplines(penalty=ps.penalty_).fit(x.reshape(-1, 1), y)
+    assert ps.penalty_ == (penalties[np.argmin(ps.cv_results_["aic"])],)
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+
+
+def test_psplines_cv_n_dimensional(data_2d):
+    with pytest.raises(NotImplementedError):
+        PSplinesCV().fit(data_2d["x"], data_2d["y"])
+
+
+def test_psplines_cv_schall():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 20), np.linspace(0, 1, 15))
+    X = np.column_stack([x1.ravel(), x2.ravel()])
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1] + rng.normal(0, 0.1, len(X))
+    ps = PSplinesCV(criterion="schall", n_segments=(8, 5), degree=(3, 3))
+    ps.fit(X, y)
+
+    expected = PSplines(
+        penalty=ps.penalty_, n_segments=(8, 5), degree=(3, 3)
+    ).fit(X, y)
+    assert len(ps.penalty_) == 2
+    assert ps.cv_results_["converged"]
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+
+    start = PSplinesCV(
+        np.array([10.0, 0.1]),
+        criterion="schall",
+        n_segments=(8, 5),
+        degree=(3, 3),
+    ).fit(X, y)
+    np.testing.assert_array_almost_equal(start.penalty_, ps.penalty_, 3)
+
+
+def test_psplines_cv_schall_penalties():
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 20), np.linspace(0, 1, 15))
+    X = np.column_stack([x1.ravel(), x2.ravel()])
+    ps = PSplinesCV(
+        10 ** np.arange(-4, 6.1, 0.1),
+        criterion="schall",
+        n_segments=(8, 5),
+        degree=(3, 3),
+    )
+    with pytest.raises(ValueError, match="each of the 2 dimensions"):
+        ps.fit(X, X[:, 0])
+
+
+def test_psplines_cg():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 20), np.linspace(0, 1, 15))
+    X = np.column_stack([x1.ravel(), x2.ravel()])
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1] + rng.normal(0, 0.1, len(X))
+    expected = PSplines(n_segments=(8, 5), degree=(3, 3), solver="dense")
+    expected.fit(X, y)
+    ps = PSplines(n_segments=(8, 5), degree=(3, 3), solver="cg")
+    ps.fit(X, y)
+
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+    np.testing.assert_array_almost_equal(ps.predict(X), expected.predict(X))
+    assert ps.diagnostics_["hat_matrix"] is None
+
+
+def test_psplines_auto_cg():
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 20), np.linspace(0, 1, 15))
+    X = np.column_stack([x1.ravel(), x2.ravel()])
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1]
+    # The conjugate gradient is only used without diagnostics.
+    ps = PSplines(
+        n_segments=(62, 62),
+        degree=(3, 3),
+        compute_diagnostics="none",
+        profile=True,
+    ).fit(X, y)
+    assert ps.fit_profile_["fit/solve"]["sizes"]["solver"] == "cg"
+
+
+def test_psplines_sandwich(data):
+    rng = np.random.default_rng(42)
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 20), np.linspace(0, 1, 15))
+    X = np.column_stack([x1.ravel(), x2.ravel()])
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1] + rng.normal(0, 0.1, len(X))
+    expected = PSplines(n_segments=(8, 5), degree=(3, 3), solver="sandwich")
+    expected.fit(X, y)
+    ps = PSplines(
+        n_segments=(8, 5),
+        degree=(3, 3),
+        solver="sandwich",
+        compute_diagnostics="none",
+    )
+    ps.fit(X, y)
+
+    assert ps._diagnostics["hat_matrix"] is None
+    np.testing.assert_array_almost_equal(
+        ps.diagnostics_["hat_matrix"], expected.diagnostics_["hat_matrix"]
+    )
+    # The sandwich smoother is the usual P-splines in one dimension.
+    X = data["x"].reshape(-1, 1)
+    ps = PSplines(n_segments=(5,), solver="sandwich").fit(X, data["y"])
+    expected = PSplines(n_segments=(5,)).fit(X, data["y"])
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+
+
+def test_psplines_scattered():
+    rng = np.random.default_rng(42)
+    X = rng.uniform(0, 1, (500, 2))
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1] + rng.normal(0, 0.1, 500)
+    expected = PSplines(n_segments=(6, 4), degree=(3, 3), solver="dense")
+    expected.fit(X, y)
+    ps = PSplines(
+        n_segments=(6, 4),
+        degree=(3, 3),
+        basis_format="compact",
+        solver="sparse",
+    )
+    ps.fit(X, y)
+
+    assert ps.y_hat_.shape == (500,)
+    # The default solver keeps the observations on the grid.
+    default = PSplines(n_segments=(6, 4), degree=(3, 3)).fit(X, y)
+    assert default.y_hat_.shape == (500, 500)
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+    np.testing.assert_array_almost_equal(
+        ps.predict(X[:10], grid=False), expected.predict(X[:10], grid=False)
+    )
+    np.testing.assert_almost_equal(
+        ps.diagnostics_["eff_dimension"],
+        expected.diagnostics_["eff_dimension"],
+    )
+
+
+@pytest.mark.parametrize("basis_format", ["dense", "csr", "compact"])
+def test_psplines_cache(basis_format):
+    x = np.linspace(0, 1, 50)
+    y = np.sin(2 * np.pi * x)
+    new_x = np.linspace(0, 1, 200).reshape(-1, 1)
+    expected = PSplines(basis_format=basis_format).fit(x.reshape(-1, 1), y)
+    ps = PSplines(basis_format=basis_format, cache_size=2**20)
+    ps.fit(x.reshape(-1, 1), y)
+
+    for _ in range(3):
+        np.testing.assert_array_almost_equal(
+            ps.predict(new_x), expected.predict(new_x)
+        )
+        np.testing.assert_array_almost_equal(
+            ps.errors(new_x), expected.errors(new_x)
+        )
+        np.testing.assert_array_almost_equal(
+            ps.derivative(new_x), expected.derivative(new_x)
+        )
+    info = ps.cache_info()
+    assert info["misses"] == 2
+    assert info["hits"] == 7
+    assert info["n_entries"] == 2
+
+    ps.clear_cache()
+    assert ps.cache_info()["n_entries"] == 0
+    assert expected.cache_info()["n_entries"] == 0
+
+
+def test_predict_scattered():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 20), np.linspace(0, 1, 15))
+    X = np.column_stack([x1.ravel(), x2.ravel()])
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1] + rng.normal(0, 0.1, len(X))
+    ps = PSplines(n_segments=(8, 5), degree=(3, 3)).fit(X, y)
+
+    new_X = rng.uniform(size=(100, 2))
+    pred = ps.predict(new_X, grid=False, chunk_size=16)
+    pred_grid = ps.predict(new_X)
+    rows = np.argsort(np.argsort(new_X, axis=0), axis=0)
+
+    assert pred.shape == (100,)
+    expected = pred_grid[rows[:, 0], rows[:, 1]]
+    np.testing.assert_array_almost_equal(pred, expected)
+
+    ps_1d = PSplines().fit(X[:, :1], y)
+    np.testing.assert_array_almost_equal(
+        ps_1d.predict(new_X[:, :1], grid=False),
+        ps_1d.predict(new_X[:, :1])[rows[:, 0]],
+    )
+    with pytest.raises(ValueError):
+        ps.predict(new_X[:, :1], grid=False)
+
+
+def test_to_ppoly():
+    x = np.linspace(0, 1, 50)
+    y = np.sin(2 * np.pi * x)
+    new_x = np.linspace(0, 1, 200).reshape(-1, 1)
+    ps = PSplines(n_segments=(12,)).fit(x.reshape(-1, 1), y)
+    ppoly = ps.to_ppoly()
+
+    np.testing.assert_array_almost_equal(
+        ppoly(new_x.ravel()), ps.predict(new_x)
+    )
+    np.testing.assert_array_almost_equal(
+        ppoly(new_x.ravel(), nu=2), ps.derivative(new_x, order_derivative=2)
+    )
+
+
+def test_psplines_multi_output():
+    rng = np.random.default_rng(42)
+    x = np.linspace(0, 1, 50)
+    Y = np.column_stack([np.sin(2 * np.pi * x), np.cos(2 * np.pi * x)])
+    Y = Y + rng.normal(0, 0.1, Y.shape)
+    new_x = np.linspace(0, 1, 20).reshape(-1, 1)
+    ps = PSplines(compute_diagnostics="none").fit(x.reshape(-1, 1), Y)
+
+    assert ps.beta_hat_.shape == (13, 2)
+    assert ps.predict(new_x).shape == (20, 2)
+    assert ps.diagnostics_["residuals_std"].shape == (2,)
+    for idx in range(2):
+        expected = PSplines().fit(x.reshape(-1, 1), Y[:, idx])
+        np.testing.assert_array_almost_equal(
+            ps.predict(new_x)[:, idx], expected.predict(new_x)
+        )
+        np.testing.assert_array_almost_equal(
+            ps.errors(new_x)[:, idx], expected.errors(new_x)
+        )
+        np.testing.assert_array_almost_equal(
+            ps.derivative(new_x)[:, idx], expected.derivative(new_x)
+        )
+        np.testing.assert_array_almost_equal(
+            ps.to_ppoly()(new_x.ravel())[:, idx], expected.predict(new_x)
+        )
+
+
+def test_psplines_multi_output_n_dimensional(data_2d):
+    Y = np.column_stack([data_2d["y"], -2 * data_2d["y"]])
+    ps = PSplines(n_segments=(3, 3), degree=(2, 2))
+    ps.fit(data_2d["x"], Y)
+    expected = PSplines(n_segments=(3, 3), degree=(2, 2))
+    expected.fit(data_2d["x"], data_2d["y"])
+
+    np.testing.assert_array_almost_equal(
+        ps.predict(data_2d["x"])[..., 1], -2 * expected.predict(data_2d["x"])
+    )
+    np.testing.assert_array_almost_equal(
+        ps.predict(data_2d["x"], grid=False)[:, 0],
+        expected.predict(data_2d["x"], grid=False),
+    )
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_partial_fit(weighted):
+    rng = np.random.default_rng(42)
+    x = rng.uniform(0, 1, 1000)
+    y = np.sin(2 * np.pi * x) + rng.normal(0, 0.1, 1000)
+    weights = rng.uniform(0.5, 1.5, 1000) if weighted else None
+    new_x = np.linspace(0, 1, 50).reshape(-1, 1)
+    expected = PSplines(n_segments=(20,)).fit(
+        x.reshape(-1, 1), y, sample_weights=weights, domains=(0, 1)
+    )
+
+    ps = PSplines(n_segments=(20,))
+    for chunk in np.array_split(np.arange(1000), 7):
+        ps.partial_fit(
+            x[chunk].reshape(-1, 1),
+            y[chunk],
+            sample_weights=None if weights is None else weights[chunk],
+            domains=(0, 1),
+        )
+    ps.finalize()
+
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+    for key in ("eff_dimension", "roughness", "residuals_std"):
+        np.testing.assert_almost_equal(
+            ps.diagnostics_[key], expected.diagnostics_[key]
+        )
+    np.testing.assert_array_almost_equal(
+        ps.errors(new_x), expected.errors(new_x)
+    )
+    assert ps.y_hat_ is None
+
+
+def test_partial_fit_after_fit():
+    rng = np.random.default_rng(42)
+    x = rng.uniform(0, 1, 1000).reshape(-1, 1)
+    y = np.sin(2 * np.pi * x[:, 0]) + rng.normal(0, 0.1, 1000)
+    expected = PSplines(n_segments=(20,)).fit(x[800:], y[800:], domains=(0, 1))
+
+    ps = PSplines(n_segments=(20,))
+    for chunk in np.array_split(np.arange(400), 2):
+        ps.partial_fit(x[chunk], y[chunk], domains=(0, 1))
+    ps.fit(x, y)
+    # The chunks accumulated before `fit` are discarded.
+    with pytest.raises(ValueError):
+        ps.finalize()
+    ps.partial_fit(x[800:], y[800:], domains=(0, 1)).finalize()
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+
+
+def test_partial_fit_n_dimensional():
+    rng = np.random.default_rng(42)
+    X = rng.uniform(0, 1, (500, 2))
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1] + rng.normal(0, 0.1, 500)
+    domains = [(0, 1), (0, 1)]
+
+    ps = PSplines(n_segments=(6, 4), degree=(3, 3))
+    for chunk in np.array_split(np.arange(500), 3):
+        ps.partial_fit(X[chunk], y[chunk], domains=domains)
+    ps.finalize()
+    expected = PSplines(n_segments=(6, 4), degree=(3, 3)).fit_parallel(
+        X, y, domains=domains, n_shards=1
+    )
+
+    assert ps.beta_hat_.shape == (9, 7)
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+    np.testing.assert_almost_equal(
+        ps.diagnostics_["eff_dimension"],
+        expected.diagnostics_["eff_dimension"],
+    )
+    np.testing.assert_array_almost_equal(
+        ps.predict(X[:10], grid=False), expected.predict(X[:10], grid=False)
+    )
+
+
+def test_fit_parallel():
+    rng = np.random.default_rng(42)
+    x = rng.uniform(0, 1, 1000)
+    y = np.sin(2 * np.pi * x) + rng.normal(0, 0.1, 1000)
+    expected = PSplines(n_segments=(20,)).fit(
+        x.reshape(-1, 1), y, domains=(0, 1)
+    )
+    ps = PSplines(n_segments=(20,)).fit_parallel(
+        x.reshape(-1, 1), y, domains=(0, 1), n_shards=2
+    )
+    np.testing.assert_array_almost_equal(ps.beta_hat_, expected.beta_hat_)
+
+
+def test_partial_fit_errors(data, data_2d):
+    ps = PSplines()
+    with pytest.raises(ValueError):
+        ps.finalize()
+    with pytest.raises(ValueError):
+        ps.partial_fit(data["x"].reshape(-1, 1), data["y"])
+    with pytest.raises(ValueError):
+        ps.partial_fit(data_2d["x"], data_2d["y"], domains=(0, 1))
+    ps.partial_fit(data["x"].reshape(-1, 1), data["y"], domains=(1, 5))
+    with pytest.raises(ValueError):
+        ps.partial_fit(data["x"].reshape(-1, 1), data["y"], domains=(0, 5))
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load(tmp_path, mmap):
+    x = np.linspace(0, 1, 50)
+    y = np.sin(2 * np.pi * x)
+    ps = PSplines(penalty=(0.5,), n_segments=(12,)).fit(x.reshape(-1, 1), y)
+    ps.save(tmp_path / "model.npz")
+    loaded = PSplines.load(tmp_path / "model.npz", mmap=mmap)
+
+    assert loaded.get_params() == ps.get_params()
+    assert loaded.basis_ is None
+    assert isinstance(loaded.beta_hat_, np.memmap) == mmap
+    X_new = np.linspace(0, 1, 23).reshape(-1, 1)
+    np.testing.assert_array_almost_equal(
+        loaded.predict(X_new), ps.predict(X_new)
+    )
+    np.testing.assert_array_almost_equal(
+        loaded.derivative(X_new), ps.derivative(X_new)
+    )
+    assert loaded.diagnostics_["inv_mat"] is None
+
+
+def test_save_load_diagnostics(tmp_path, data_2d):
+    ps = PSplines(penalty=(1, 1), n_segments=(4, 4), degree=(1, 1))
+    ps.fit(data_2d["x"], data_2d["y"])
+    ps.save(tmp_path / "model.npz", diagnostics=True)
+    loaded = PSplines.load(tmp_path / "model.npz")
+
+    np.testing.assert_array_almost_equal(
+        loaded.predict(data_2d["x"]), ps.predict(data_2d["x"])
+    )
+    np.testing.assert_almost_equal(
+        loaded.diagnostics_["eff_dimension"], ps.diagnostics_["eff_dimension"]
+    )
+    np.testing.assert_array_almost_equal(
+        loaded.diagnostics_["hat_matrix"], ps.diagnostics_["hat_matrix"]
+    )
+
+
+def test_save_load_cv(tmp_path):
+    x = np.linspace(0, 1, 50)
+    y = np.sin(2 * np.pi * x)
+    ps = PSplinesCV(penalties=np.array([0.1, 1.0]), criterion="gcv")
+    ps.fit(x.reshape(-1, 1), y)
+    ps.save(tmp_path / "model.npz")
+
+    loaded = PSplines.load(tmp_path / "model.npz")
+    assert isinstance(loaded, PSplinesCV)
+    assert loaded.penalty_ == ps.penalty_
+    PSplines(n_segments=(5,)).fit(x.reshape(-1, 1), y).save(
+        tmp_path / "other.npz"
+    )
+    with pytest.raises(ValueError):
+        PSplinesCV.load(tmp_path / "other.npz")
+
+
+@pytest.mark.parametrize("solver", ["banded", "dense"])
+def test_psplines_profile(data, solver):
+    ps = PSplines(n_segments=(5,), solver=solver, compute_diagnostics="none")
+    ps.fit(data["x"].reshape(-1, 1), data["y"])
+    assert not hasattr(ps, "fit_profile_")
+
+    ps.set_params(profile=True).fit(data["x"].reshape(-1, 1), data["y"])
+    profile = ps.fit_profile_
+    assert list(profile)[-1] == "fit"
+    assert profile["fit/basis"]["sizes"] == {"basis": (8, 5)}
+    assert profile["fit/solve/factorize"]["calls"] == 1
+    assert profile["fit"]["wall_time"] >= profile["fit/solve"]["wall_time"]
+    assert profile["fit"]["peak_bytes"] > 0
+
+    ps.errors(data["x"].reshape(-1, 1))
+    assert "errors/diagnostics/inverse" in ps.errors_profile_
+    ps.predict(data["x"].reshape(-1, 1))
+    assert "predict/contract" in ps.predict_profile_
+
+
+def test_psplines_profile_n_dimensional(data_2d):
+    ps = PSplinesCV(
+        n_segments=(4, 4), degree=(1, 1), criterion="schall", profile=True
+    )
+    ps.fit(data_2d["x"], data_2d["y"])
+    assert "fit/select" in ps.fit_profile_
+    assert "fit/solve/cross_products/row_tensor" in ps.fit_profile_
+    assert ps.fit_profile_["fit/solve/cross_products/glam_bwb"]["sizes"][
+        "bwb_mat"
+    ] == (25, 25)
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of runtime.py file."""
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from pyspline.psplines import PSplines
+from pyspline.runtime import SplineModel, load_model
+
+# The import time of `pyspline.runtime`, once NumPy is imported.
+IMPORT_BUDGET = 0.5
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(42)
+    x = rng.uniform(0, 1, 100)
+    y = np.sin(2 * np.pi * x) + rng.normal(0, 0.1, 100)
+    return {"x": x.reshape(-1, 1), "y": y}
+
+
+###############################################################################
+# Tests SplineModel
+def test_spline_model_one_dimensional(tmp_path, data):
+    ps = PSplines(n_segments=(15,)).fit(data["x"], data["y"])
+    ps.save(tmp_path / "model.npz")
+    model = load_model(tmp_path / "model.npz")
+
+    X_new = np.linspace(-0.1, 1.1, 31).reshape(-1, 1)
+    np.testing.assert_array_almost_equal(
+        model.predict(X_new), ps.predict(X_new)
+    )
+    np.testing.assert_array_almost_equal(
+        model.predict(X_new, grid=False), ps.predict(X_new, grid=False)
+    )
+    np.testing.assert_array_almost_equal(
+        model.derivative(X_new, 2), ps.derivative(X_new, 2)
+    )
+    np.testing.assert_array_almost_equal(
+        model.to_ppoly()(X_new[:, 0]), ps.to_ppoly()(X_new[:, 0])
+    )
+
+
+def test_spline_model_n_dimensional():
+    rng = np.random.default_rng(42)
+    X = rng.uniform(0, 1, (200, 2))
+    y = np.sin(2 * np.pi * X[:, 0]) * X[:, 1]
+    y = np.column_stack([y, y + rng.normal(0, 0.1, 200)])
+    ps = PSplines(
+        penalty=(1.0, 1.0), n_segments=(6, 4), degree=(3, 2), bins=10
+    ).fit(X, y)
+    model = SplineModel.from_estimator(ps)
+
+    X_new = rng.uniform(0, 1, (20, 2))
+    np.testing.assert_array_almost_equal(
+        model.predict(X_new), ps.predict(X_new)
+    )
+    np.testing.assert_array_almost_equal(
+        model.predict(X_new, grid=False), ps.predict(X_new, grid=False)
+    )
+    with pytest.raises(NotImplementedError):
+        model.derivative(X_new)
+
+
+def test_spline_model_errors():
+    model = SplineModel(np.arange(5.0), (2,), (3,), [(0.0, 1.0)])
+    with pytest.raises(ValueError):
+        model.predict(np.ones((3, 2)))
+    with pytest.raises(ValueError):
+        model.predict(np.array([[0.5], [np.nan]]))
+    with pytest.raises(ValueError):
+        SplineModel(np.arange(5.0), (), (3,), [(0.0, 1.0)])
+
+
+def test_runtime_import(tmp_path, data):
+    # The runtime neither imports scikit-learn nor SciPy, even to predict.
+    PSplines().fit(data["x"], data["y"]).save(tmp_path / "model.npz")
+    code = (
+        "import sys, time\n"
+        "import numpy as np\n"
+        "start = time.perf_counter()\n"
+        "from pyspline.runtime import load_model\n"
+        "print(time.perf_counter() - start)\n"
+        f"model = load_model({str(tmp_path / 'model.npz')!r})\n"
+        "model.predict(np.linspace(0, 1, 10).reshape(-1, 1))\n"
+        "model.derivative(np.linspace(0, 1, 10).reshape(-1, 1))\n"
+        "print(sorted({'scipy', 'sklearn'} & set(sys.modules)))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.splitlines()
+    assert float(output[0]) < IMPORT_BUDGET
+    assert output[1] == "[]"
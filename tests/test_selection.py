@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of selection.py file."""
+
+import numpy as np
+import pytest
+
+from pyspline.basis import basis_bsplines
+from pyspline.psplines_inner import fit_one_dimensional, fit_n_dimensional
+from pyspline.selection import (
+    demmler_reinsch,
+    select_penalties_batch,
+    select_penalty,
+    select_penalties_schall,
+)
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(42)
+    x = np.sort(rng.uniform(0, 1, 100))
+    y = np.sin(2 * np.pi * x) + rng.normal(0, 0.2, 100)
+    basis = basis_bsplines(x, 23, 3, format="compact")
+    return {"x": x, "y": y, "basis": basis}
+
+
+###############################################################################
+# Tests demmler_reinsch
+def test_demmler_reinsch():
+    bwb_mat = np.array([[2.0, 1.0], [1.0, 2.0]])
+    pen_mat = np.array([[1.0, -1.0], [-1.0, 1.0]])
+    eigenvalues, eigenvectors = demmler_reinsch(bwb_mat, pen_mat)
+
+    np.testing.assert_array_almost_equal(
+        eigenvectors.T @ (bwb_mat + pen_mat) @ eigenvectors, np.eye(2)
+    )
+    np.testing.assert_array_almost_equal(
+        eigenvectors.T @ pen_mat @ eigenvectors, np.diag(eigenvalues)
+    )
+
+
+###############################################################################
+# Tests select_penalty
+def test_select_penalty(data):
+    penalties = np.array([0.01, 1.0, 100.0])
+    result = select_penalty(data["y"], data["basis"], penalties=penalties)
+    result_cv = select_penalty(
+        data["y"], data["basis"], penalties=penalties, criterion="cv"
+    )
+
+    n_obs = len(data["y"])
+    for idx, penalty in enumerate(penalties):
+        fit = fit_one_dimensional(data["y"], data["basis"], penalty=penalty)
+        rss = np.sum((data["y"] - fit["y_hat"]) ** 2)
+        gcv = n_obs * rss / (n_obs - fit["eff_dimension"]) ** 2
+        residuals = (data["y"] - fit["y_hat"]) / (1 - fit["hat_matrix"])
+
+        np.testing.assert_almost_equal(
+            result["eff_dimension"][idx], fit["eff_dimension"]
+        )
+        np.testing.assert_almost_equal(result["gcv"][idx], gcv)
+        np.testing.assert_almost_equal(
+            result_cv["cv"][idx], np.sqrt(np.mean(residuals**2))
+        )
+    assert result["penalty"] == penalties[np.argmin(result["gcv"])]
+    assert result_cv["penalty"] == penalties[np.argmin(result_cv["cv"])]
+    # The leave-one-out cross-validation is only computed when selected.
+    assert result["cv"] is None
+
+
+def test_select_penalty_wrong_criterion(data):
+    with pytest.raises(ValueError):
+        select_penalty(data["y"], data["basis"], criterion="bic")
+
+
+###############################################################################
+# Tests select_penalties_schall
+def test_select_penalties_schall_one_dimensional(data):
+    result = select_penalties_schall(data["y"], [data["basis"]])
+    fit = fit_one_dimensional(
+        data["y"], data["basis"], penalty=result["penalties"][0]
+    )
+
+    assert result["converged"]
+    np.testing.assert_array_almost_equal(result["beta_hat"], fit["beta_hat"])
+    np.testing.assert_almost_equal(
+        result["eff_dimension"], fit["eff_dimension"]
+    )
+
+
+def test_select_penalties_schall_n_dimensional():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 30), np.linspace(0, 1, 20)
+    y = np.sin(2 * np.pi * x1)[:, np.newaxis] * x2[np.newaxis, :]
+    y = y + rng.normal(0, 0.1, (30, 20))
+    basis_list = [basis_bsplines(x1, 13, 3), basis_bsplines(x2, 8, 3)]
+
+    result = select_penalties_schall(y, basis_list)
+    fit = fit_n_dimensional(y, basis_list, penalties=result["penalties"])
+
+    assert result["converged"]
+    assert result["n_iter"] < 50
+    np.testing.assert_array_almost_equal(result["beta_hat"], fit["beta_hat"])
+    np.testing.assert_array_almost_equal(result["y_hat"], fit["y_hat"])
+
+
+###############################################################################
+# Tests select_penalties_batch
+def test_select_penalties_batch(data):
+    rng = np.random.default_rng(0)
+    Y = np.column_stack(
+        [
+            np.sin(2 * np.pi * freq * data["x"]) + rng.normal(0, 0.2, 100)
+            for freq in (0.5, 1, 3)
+        ]
+    )
+    penalties = 10 ** np.arange(-2, 4.1, 0.5)
+    result = select_penalties_batch(Y, [data["basis"]], penalties=penalties)
+
+    assert result["beta_hat"].shape == (23, 3)
+    for idx in range(3):
+        expected = select_penalty(Y[:, idx], data["basis"], penalties=penalties)
+        fit = fit_one_dimensional(
+            Y[:, idx], data["basis"], penalty=result["penalty"][idx]
+        )
+        np.testing.assert_array_almost_equal(
+            result["criteria"][:, idx], expected["gcv"]
+        )
+        assert result["penalty"][idx] == expected["penalty"]
+        np.testing.assert_array_almost_equal(
+            result["beta_hat"][:, idx], fit["beta_hat"]
+        )
+        np.testing.assert_array_almost_equal(
+            result["y_hat"][:, idx], fit["y_hat"]
+        )
+        np.testing.assert_almost_equal(
+            result["eff_dimension"][idx], fit["eff_dimension"]
+        )
+
+
+def test_select_penalties_batch_reml(data):
+    penalties = np.array([0.1, 1.0, 10.0])
+    result = select_penalties_batch(
+        data["y"], [data["basis"]], penalties=penalties, criterion="reml"
+    )
+
+    basis = data["basis"].toarray()
+    diff_mat = np.diff(np.eye(23), n=2, axis=0)
+    pen_mat = diff_mat.T @ diff_mat
+    reml = []
+    for penalty in penalties:
+        fit = fit_one_dimensional(data["y"], basis, penalty=penalty)
+        pen_rss = np.sum((data["y"] - fit["y_hat"]) ** 2) + penalty * (
+            fit["beta_hat"] @ pen_mat @ fit["beta_hat"]
+        )
+        log_det = np.linalg.slogdet(basis @ basis.T + penalty * pen_mat)[1]
+        reml.append(
+            98 * np.log(pen_rss) + log_det - 21 * np.log(penalty)
+        )
+    np.testing.assert_array_almost_equal(
+        np.diff(result["criteria"][:, 0]), np.diff(reml)
+    )
+    assert result["y_hat"].shape == (100, 1)
+
+
+def test_select_penalties_batch_n_dimensional():
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 30), np.linspace(0, 1, 20)
+    y = np.sin(2 * np.pi * x1)[:, np.newaxis] * x2[np.newaxis, :]
+    Y = y[..., np.newaxis] + rng.normal(0, [0.05, 0.5], (30, 20, 2))
+    basis_list = [basis_bsplines(x1, 13, 3), basis_bsplines(x2, 8, 3)]
+
+    result = select_penalties_batch(Y, basis_list, criterion="reml")
+    for idx in range(2):
+        penalty = result["penalty"][idx]
+        fit = fit_n_dimensional(Y[..., idx], basis_list, None, 2 * (penalty,))
+        np.testing.assert_array_almost_equal(
+            result["beta_hat"][..., idx], fit["beta_hat"]
+        )
+        np.testing.assert_array_almost_equal(
+            result["y_hat"][..., idx], fit["y_hat"]
+        )
+    assert result["penalty"][0] < result["penalty"][1]
+
+
+def test_select_penalties_batch_wrong_criterion(data):
+    with pytest.raises(ValueError):
+        select_penalties_batch(data["y"], [data["basis"]], criterion="aic")
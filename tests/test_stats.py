@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# -*-coding:utf8 -*
+"""Module that contains unit tests for the functions of stats.py file."""
+
+import pickle
+
+import numpy as np
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pyspline.basis import basis_bsplines
+from pyspline.psplines_inner import fit_one_dimensional, fit_n_dimensional
+from pyspline.stats import SplineStats, parallel_statistics, spline_statistics
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(42)
+    x = rng.uniform(0, 1, 200)
+    y = np.sin(2 * np.pi * x) + rng.normal(0, 0.2, 200)
+    weights = rng.uniform(0.5, 1.5, 200)
+    return {"x": x, "y": y, "weights": weights}
+
+
+def _stats(x, y, weights=None):
+    basis = basis_bsplines(x, 13, 3, 0, 1, format="compact")
+    return SplineStats.from_data(y, [basis], weights, bandwidth=3)
+
+
+###############################################################################
+# Tests SplineStats
+def test_merge(data):
+    expected = _stats(data["x"], data["y"], data["weights"])
+    merged = _stats(
+        data["x"][:70], data["y"][:70], data["weights"][:70]
+    ) + _stats(data["x"][70:], data["y"][70:], data["weights"][70:])
+
+    assert merged.n_obs == 200
+    np.testing.assert_almost_equal(
+        merged.sum_weights, np.sum(data["weights"])
+    )
+    for key, value in expected.statistics.items():
+        np.testing.assert_array_almost_equal(merged.statistics[key], value)
+
+
+def test_sum_and_pickle(data):
+    shards = [
+        _stats(data["x"][rows], data["y"][rows])
+        for rows in np.array_split(np.arange(200), 4)
+    ]
+    merged = pickle.loads(pickle.dumps(sum(shards)))
+    expected = _stats(data["x"], data["y"])
+    np.testing.assert_array_almost_equal(
+        merged.statistics["bwb_band"], expected.statistics["bwb_band"]
+    )
+
+
+def test_merge_errors(data):
+    stats = _stats(data["x"], data["y"])
+    with pytest.raises(TypeError):
+        stats.merge(1)
+    other = SplineStats.from_data(
+        data["y"],
+        [basis_bsplines(data["x"], 13, 3, 0, 1, format="compact")],
+        bandwidth=4,
+    )
+    with pytest.raises(ValueError):
+        stats + other
+
+
+def test_solve_one_dimensional(data):
+    basis = basis_bsplines(data["x"], 13, 3, 0, 1, format="compact")
+    expected = fit_one_dimensional(
+        data["y"], basis, data["weights"], penalty=0.5
+    )
+    results = _stats(data["x"], data["y"], data["weights"]).solve(
+        penalties=(0.5,)
+    )
+    np.testing.assert_array_almost_equal(
+        results["beta_hat"], expected["beta_hat"]
+    )
+    np.testing.assert_almost_equal(
+        results["eff_dimension"], expected["eff_dimension"]
+    )
+
+
+def test_solve_n_dimensional():
+    # The observations on a full grid, given as scattered points, have the
+    # same fit as the gridded observations.
+    rng = np.random.default_rng(42)
+    x1, x2 = np.linspace(0, 1, 30), np.linspace(0, 1, 20)
+    y = np.sin(2 * np.pi * x1)[:, None] * np.cos(x2)[None, :]
+    y = y + rng.normal(0, 0.1, y.shape)
+    expected = fit_n_dimensional(
+        y,
+        [basis_bsplines(x1, 8, 3), basis_bsplines(x2, 6, 3)],
+        penalties=(1.0, 2.0),
+    )
+
+    points = np.stack(
+        [np.repeat(x1, len(x2)), np.tile(x2, len(x1))], axis=1
+    )
+    stats = spline_statistics(
+        points,
+        y.ravel(),
+        n_segments=(5, 3),
+        degree=(3, 3),
+        domains=[(0, 1), (0, 1)],
+    )
+    results = stats.solve(penalties=(1.0, 2.0))
+    np.testing.assert_array_almost_equal(
+        results["beta_hat"], expected["beta_hat"]
+    )
+    np.testing.assert_almost_equal(
+        results["eff_dimension"], expected["eff_dimension"]
+    )
+
+
+###############################################################################
+# Tests parallel_statistics
+def test_parallel_statistics(data):
+    kwargs = {
+        "n_segments": (10,),
+        "degree": (3,),
+        "domains": [(0, 1)],
+    }
+    X = data["x"].reshape(-1, 1)
+    expected = spline_statistics(X, data["y"], data["weights"], **kwargs)
+    results = parallel_statistics(
+        X, data["y"], data["weights"], n_shards=2, **kwargs
+    )
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results_threads = parallel_statistics(
+            X, data["y"], data["weights"], executor=executor, n_shards=3,
+            **kwargs,
+        )
+    for key, value in expected.statistics.items():
+        np.testing.assert_array_almost_equal(results.statistics[key], value)
+        np.testing.assert_array_almost_equal(
+            results_threads.statistics[key], value
+        )